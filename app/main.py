@@ -1,19 +1,35 @@
 from flask import Flask, jsonify, request
 import os
 import importlib
+from app.utils.search_utils import VALID_METHODS, DEFAULT_INDEXING_METHOD
+from app.utils import (
+    admission_utils,
+    changefeed_utils,
+    profile_utils,
+    response_utils,
+    warmup_utils,
+)
 
 # Initialize Flask app
 app = Flask(__name__)
 
-# Get the indexing method from environment variable, default to 'basic'
-INDEXING_METHOD = os.environ.get("INDEXING_METHOD", "basic")
-valid_methods = ["basic", "btree", "postgis", "h3"]
+# Fast JSON serialization and response compression
+response_utils.init_app(app)
 
-if INDEXING_METHOD not in valid_methods:
+# Concurrency limits, overload shedding and query deadlines
+admission_utils.init_app(app)
+
+# cProfile a sample of requests, aggregated per route
+profile_utils.init_app(app)
+
+# Get the default indexing method from environment variable, default to 'basic'.
+# Requests can pick another method with ?method= or the X-Indexing-Method header.
+INDEXING_METHOD = DEFAULT_INDEXING_METHOD
+
+if os.environ.get("INDEXING_METHOD", "basic") not in VALID_METHODS:
     print(
-        f"Warning: Invalid indexing method '{INDEXING_METHOD}'. Using 'basic' instead."
+        f"Warning: Invalid indexing method '{os.environ.get('INDEXING_METHOD')}'. Using 'basic' instead."
     )
-    INDEXING_METHOD = "basic"
 
 print(f"Starting application with indexing method: {INDEXING_METHOD}")
 
@@ -22,18 +38,56 @@ from app.routes.restaurants import bp as restaurants_bp
 from app.routes.users import bp as users_bp
 from app.routes.search import bp as search_bp
 from app.routes.benchmark import bp as benchmark_bp
+from app.routes.tiles import bp as tiles_bp
+from app.routes.export import bp as export_bp
+from app.routes.debug import bp as debug_bp
 
 # Register blueprints
 app.register_blueprint(restaurants_bp)
 app.register_blueprint(users_bp)
 app.register_blueprint(search_bp)
 app.register_blueprint(benchmark_bp)
+app.register_blueprint(tiles_bp)
+app.register_blueprint(export_bp)
+app.register_blueprint(debug_bp)
+
+
+# Prewarm the database and caches in the background; the worker reports
+# ready once done
+warmup_utils.start_warmup(INDEXING_METHOD)
+
+# Keep the in-process caches current with the row changes published by the
+# database
+changefeed_utils.start_listener()
 
 
 @app.route("/health", methods=["GET"])
 def health_check():
-    """Simple health check endpoint."""
-    return jsonify({"status": "healthy", "indexing_method": INDEXING_METHOD})
+    """Health check endpoint: 503 with status 'starting' until warmed up."""
+    ready = warmup_utils.is_ready()
+    return jsonify(
+        {
+            "status": "healthy" if ready else "starting",
+            "live": True,
+            "ready": ready,
+            "warmup": warmup_utils.get_warmup_status(),
+            "indexing_method": INDEXING_METHOD,
+            "valid_methods": VALID_METHODS,
+        }
+    ), (200 if ready else 503)
+
+
+@app.route("/health/live", methods=["GET"])
+def liveness_check():
+    """Liveness probe: the process serves requests."""
+    return jsonify({"live": True})
+
+
+@app.route("/health/ready", methods=["GET"])
+def readiness_check():
+    """Readiness probe: 503 until the warm-up finished."""
+    ready = warmup_utils.is_ready()
+    return jsonify({"ready": ready}), 200 if ready else 503
 
 
 if __name__ == "__main__":
@@ -1,5 +1,22 @@
 from flask import Blueprint, jsonify, request
-from app.utils.benchmark_utils import benchmark_nearby_search
+from app.utils.admission_utils import (
+    get_admission_stats,
+    validate_radius,
+    validate_runs,
+)
+from app.utils.benchmark_utils import benchmark_nearby_search, benchmark_serialization
+from app.utils.search_utils import (
+    USER_METHODS,
+    VALID_METHODS,
+    resolve_indexing_method,
+)
+from app.utils.shadow_utils import get_shadow_stats
+from app.utils.replica_utils import get_replica_status
+from app.utils.auto_utils import get_auto_stats
+from app.utils.recall_utils import measure_recall
+from app.utils.coalesce_utils import get_coalescing_stats
+from app.utils.hedge_utils import get_hedge_stats
+from app.utils.changefeed_utils import get_change_feed_status
 
 # Create blueprint
 bp = Blueprint("benchmark", __name__, url_prefix="/api/benchmark")
@@ -7,7 +24,7 @@ bp = Blueprint("benchmark", __name__, url_prefix="/api/benchmark")
 
 @bp.route("/nearby", methods=["GET"])
 def benchmark_nearby():
-    """Benchmark nearby restaurant search with different methods."""
+    """Benchmark nearby restaurant or user search with different methods."""
     # Get query parameters
     lat = request.args.get("lat")
     lng = request.args.get("lng")
@@ -24,22 +41,125 @@ def benchmark_nearby():
         return jsonify({"error": "Invalid coordinates"}), 400
 
     # Get methods to benchmark
-    methods = request.args.get("methods", "basic,btree,postgis,h3").split(",")
-    num_runs = int(request.args.get("runs", 3))
+    methods = request.args.get("methods", ",".join(VALID_METHODS)).split(",")
+    num_runs = request.args.get("runs", default=3, type=int)
+
+    error = validate_radius(radius) or validate_runs(num_runs)
+    if error:
+        return jsonify({"error": error}), 400
+    include_partition_scans = request.args.get("partition_stats") == "1"
+
+    # Search restaurants near the point, or users near it
+    target = request.args.get("target", "restaurants")
+    if target not in ("restaurants", "users"):
+        return jsonify({"error": "target must be 'restaurants' or 'users'"}), 400
+    valid_methods = VALID_METHODS if target == "restaurants" else USER_METHODS
 
     # Run benchmarks
     results = {}
     for method in methods:
-        if method in ["basic", "btree", "postgis", "h3"]:
+        if method in valid_methods:
             results[method] = benchmark_nearby_search(
-                lat, lng, radius, method, num_runs
+                lat, lng, radius, method, num_runs, include_partition_scans, target
             )
 
     return jsonify(
         {
+            "target": target,
             "center": {"lat": lat, "lng": lng},
             "radius_km": radius,
             "num_runs": num_runs,
             "results": results,
         }
     )
+
+
+@bp.route("/shadow", methods=["GET"])
+def shadow_stats():
+    """Report latency and result differences recorded by shadow traffic."""
+    return jsonify(get_shadow_stats())
+
+
+@bp.route("/replicas", methods=["GET"])
+def replica_status():
+    """Report availability, lag and latency of the read replicas."""
+    return jsonify(get_replica_status())
+
+
+@bp.route("/hedging", methods=["GET"])
+def hedging_stats():
+    """Report the hedge rate and win rate of hedged reads."""
+    return jsonify(get_hedge_stats())
+
+
+@bp.route("/auto", methods=["GET"])
+def auto_stats():
+    """Report the latency estimates used by the auto indexing method."""
+    return jsonify(get_auto_stats())
+
+
+@bp.route("/admission", methods=["GET"])
+def admission_stats():
+    """Report concurrency limits, current load and shed requests."""
+    return jsonify(get_admission_stats())
+
+
+@bp.route("/coalescing", methods=["GET"])
+def coalescing_stats():
+    """Report how many concurrent identical searches shared one execution."""
+    return jsonify(get_coalescing_stats())
+
+
+@bp.route("/changefeed", methods=["GET"])
+def changefeed_status():
+    """Report the change feed listener and the changes it applied."""
+    return jsonify(get_change_feed_status())
+
+
+@bp.route("/recall", methods=["GET"])
+def recall():
+    """Measure recall, precision and latency of each method against brute force."""
+    num_queries = request.args.get("queries", default=50, type=int)
+    seed = request.args.get("seed", default=0, type=int)
+
+    # Every query runs each method, so they share the cap on runs
+    error = validate_runs(num_queries, "queries")
+    if error:
+        return jsonify({"error": error}), 400
+
+    methods = None
+    if request.args.get("methods"):
+        methods = request.args.get("methods").split(",")
+        invalid = [method for method in methods if method not in VALID_METHODS]
+        if invalid:
+            return jsonify({"error": f"Invalid methods: {', '.join(invalid)}"}), 400
+
+    return jsonify(measure_recall(methods, num_queries, seed))
+
+
+@bp.route("/serialization", methods=["GET"])
+def benchmark_serialization_route():
+    """Benchmark serialization and compression of a nearby search response."""
+    lat = request.args.get("lat", type=float)
+    lng = request.args.get("lng", type=float)
+    radius = request.args.get("radius", default=5.0, type=float)
+    num_runs = request.args.get("runs", default=5, type=int)
+
+    if lat is None or lng is None:
+        return jsonify({"error": "Latitude and longitude are required"}), 400
+
+    error = validate_radius(radius) or validate_runs(num_runs)
+    if error:
+        return jsonify({"error": error}), 400
+
+    target = request.args.get("target", "restaurants")
+    if target not in ("restaurants", "users"):
+        return jsonify({"error": "target must be 'restaurants' or 'users'"}), 400
+
+    method, error = resolve_indexing_method(request)
+    if error:
+        return jsonify({"error": error}), 400
+    if target == "users" and method not in USER_METHODS:
+        return jsonify({"error": f"Indexing method '{method}' can't search users"}), 400
+
+    return jsonify(benchmark_serialization(lat, lng, radius, method, num_runs, target))
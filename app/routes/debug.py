@@ -0,0 +1,68 @@
+from flask import Blueprint, Response, abort, jsonify, request
+from app.utils.profile_utils import (
+    PROFILE_MAX_SECONDS,
+    dump_route_profile,
+    format_collapsed,
+    get_route_profiles,
+    is_authorized,
+    reset_route_profiles,
+    sample_stacks,
+)
+
+# Create blueprint
+bp = Blueprint("debug", __name__, url_prefix="/debug")
+
+
+@bp.before_request
+def require_token():
+    """Hide the debug endpoints from requests without the profiling token."""
+    if not is_authorized(request):
+        abort(404)
+
+
+@bp.route("/profile", methods=["GET"])
+def profile():
+    """Sample the stacks of the live process as collapsed stacks."""
+    seconds = request.args.get("seconds", default=10.0, type=float)
+    if seconds is None or not 0 < seconds <= PROFILE_MAX_SECONDS:
+        return (
+            jsonify(
+                {"error": f"seconds must be between 0 and {PROFILE_MAX_SECONDS:g}"}
+            ),
+            400,
+        )
+
+    counts = sample_stacks(seconds, include_idle=request.args.get("idle") == "1")
+    if counts is None:
+        return jsonify({"error": "Another profile is running"}), 409
+
+    if request.args.get("format") == "json":
+        return jsonify(
+            {"seconds": seconds, "samples": sum(counts.values()), "stacks": counts}
+        )
+
+    return Response(format_collapsed(counts), mimetype="text/plain")
+
+
+@bp.route("/profile/routes", methods=["GET"])
+def route_profiles():
+    """Report the aggregated cProfile stats of the sampled requests per route."""
+    endpoint = request.args.get("endpoint")
+    if endpoint:
+        data = dump_route_profile(endpoint)
+        if data is None:
+            return jsonify({"error": f"No profiles of '{endpoint}'"}), 404
+        return Response(
+            data,
+            mimetype="application/octet-stream",
+            headers={"Content-Disposition": f"attachment; filename={endpoint}.pstats"},
+        )
+
+    return jsonify(get_route_profiles(request.args.get("limit", default=20, type=int)))
+
+
+@bp.route("/profile/routes", methods=["DELETE"])
+def reset_profiles():
+    """Forget the aggregated stats of every route."""
+    reset_route_profiles()
+    return jsonify({"status": "reset"})
@@ -0,0 +1,77 @@
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from app.utils.admission_utils import validate_radius
+from app.utils.search_utils import find_nearby_restaurants, resolve_indexing_method
+from app.utils.export_utils import (
+    EXPORT_FORMATS,
+    EXPORT_TABLES,
+    get_available_formats,
+    iter_row_batches,
+    iter_table_batches,
+    stream_export,
+)
+
+# Create blueprint
+bp = Blueprint("export", __name__, url_prefix="/api/export")
+
+
+def _resolve_format():
+    """Read the export format of the request; returns (format, error)."""
+    export_format = request.args.get("format", "arrow")
+    if export_format not in EXPORT_FORMATS:
+        return None, f"format must be one of: {', '.join(EXPORT_FORMATS)}"
+    if export_format not in get_available_formats():
+        return None, f"The '{export_format}' format is not installed on this server"
+    return export_format, None
+
+
+def _export_response(batches, export_format, filename):
+    """Stream export batches as the response body."""
+    return Response(
+        stream_with_context(stream_export(batches, export_format)),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}.{export_format}"
+        },
+    )
+
+
+@bp.route("/nearby", methods=["GET"])
+def export_nearby():
+    """Export the restaurants near a location."""
+    lat = request.args.get("lat", type=float)
+    lng = request.args.get("lng", type=float)
+    radius = request.args.get("radius", default=5.0, type=float)
+
+    if lat is None or lng is None:
+        return jsonify({"error": "Latitude and longitude are required"}), 400
+
+    error = validate_radius(radius)
+    if error:
+        return jsonify({"error": error}), 400
+
+    export_format, error = _resolve_format()
+    if error:
+        return jsonify({"error": error}), 400
+
+    method, error = resolve_indexing_method(request)
+    if error:
+        return jsonify({"error": error}), 400
+
+    restaurants = find_nearby_restaurants(lat, lng, radius, method)
+    return _export_response(iter_row_batches(restaurants), export_format, "nearby")
+
+
+@bp.route("/<table_name>", methods=["GET"])
+def export_table(table_name):
+    """Export a whole table."""
+    if table_name not in EXPORT_TABLES:
+        return (
+            jsonify({"error": f"table must be one of: {', '.join(EXPORT_TABLES)}"}),
+            404,
+        )
+
+    export_format, error = _resolve_format()
+    if error:
+        return jsonify({"error": error}), 400
+
+    return _export_response(iter_table_batches(table_name), export_format, table_name)
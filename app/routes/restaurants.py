@@ -1,9 +1,24 @@
 from flask import Blueprint, jsonify, request
-from app.utils.db_utils import execute_query
-import os
-
-# Determine which indexing method to use
-INDEXING_METHOD = os.environ.get("INDEXING_METHOD", "basic")
+from app.utils.db_utils import execute_query, get_select_list
+from app.utils.admission_utils import validate_radius
+from app.utils.rating_utils import get_rating_summary
+from app.utils.hours_utils import resolve_open_slot
+from app.utils.facet_utils import count_facets, resolve_facets
+from app.utils.search_utils import (
+    USER_METHODS,
+    find_nearby_restaurants,
+    find_nearby_users,
+    get_search_plan,
+    resolve_approximate,
+    resolve_indexing_method,
+)
+from app.utils.shadow_utils import resolve_shadow_method
+from app.utils.viewport_utils import (
+    VIEWPORT_CLUSTER_MAX_ZOOM,
+    parse_bbox,
+    get_viewport_clusters,
+    get_viewport_restaurants,
+)
 
 # Create blueprint
 bp = Blueprint("restaurants", __name__, url_prefix="/api/restaurants")
@@ -18,7 +33,7 @@ def get_restaurants():
     city = request.args.get("city")
 
     # Build query
-    query = "SELECT * FROM restaurants WHERE 1=1"
+    query = f"SELECT {get_select_list('restaurants')} FROM restaurants WHERE 1=1"
     params = []
 
     # Add filters
@@ -42,7 +57,7 @@ def get_restaurants():
     params.extend([limit, offset])
 
     # Execute query
-    restaurants = execute_query(query, params)
+    restaurants = execute_query(query, params, read_only=True)
 
     return jsonify(restaurants)
 
@@ -50,26 +65,22 @@ def get_restaurants():
 @bp.route("/<int:restaurant_id>", methods=["GET"])
 def get_restaurant(restaurant_id):
     """Get a specific restaurant by ID."""
-    query = "SELECT * FROM restaurants WHERE restaurant_id = %s"
-    restaurant = execute_query(query, (restaurant_id,), fetch_all=False)
+    query = (
+        f"SELECT {get_select_list('restaurants')} FROM restaurants "
+        "WHERE restaurant_id = %s"
+    )
+    restaurant = execute_query(
+        query, (restaurant_id,), fetch_all=False, read_only=True
+    )
 
     if restaurant:
-        # Get ratings for this restaurant
-        ratings_query = """
-        SELECT AVG(rating) as avg_rating, COUNT(*) as rating_count
-        FROM ratings
-        WHERE place_id = %s
-        """
-
-        ratings = execute_query(ratings_query, (restaurant_id,), fetch_all=False)
+        # Get ratings for this restaurant, kept current by the change feed
+        ratings = get_rating_summary(restaurant_id)
 
         # Add ratings to restaurant data
         restaurant_data = dict(restaurant)
-        if ratings:
-            restaurant_data["avg_rating"] = (
-                float(ratings["avg_rating"]) if ratings["avg_rating"] else None
-            )
-            restaurant_data["rating_count"] = ratings["rating_count"]
+        restaurant_data["avg_rating"] = ratings["avg_rating"]
+        restaurant_data["rating_count"] = ratings["rating_count"]
 
         return jsonify(restaurant_data)
     else:
@@ -94,40 +105,139 @@ def get_nearby_restaurants():
     except ValueError:
         return jsonify({"error": "Invalid coordinates"}), 400
 
-    # Use the appropriate method based on the indexing strategy
-    if INDEXING_METHOD == "h3":
-        from app.utils.h3_utils import find_nearby_restaurants_h3
+    error = validate_radius(radius)
+    if error:
+        return jsonify({"error": error}), 400
+
+    # Use the indexing method picked by the request, or the default one
+    method, error = resolve_indexing_method(request)
+    if error:
+        return jsonify({"error": error}), 400
+
+    # Optional opening hours filter, ?open_at= or ?open_now=1
+    open_slot, error = resolve_open_slot(request)
+    if error:
+        return jsonify({"error": error}), 400
+
+    # Optional value counts of the results, ?facets=Cuisine,Price or all
+    facets, error = resolve_facets(request)
+    if error:
+        return jsonify({"error": error}), 400
+
+    approximate = resolve_approximate(request, method)
+    restaurants = find_nearby_restaurants(
+        lat,
+        lng,
+        radius,
+        method,
+        resolve_shadow_method(request, method),
+        approximate,
+        open_slot,
+    )
 
-        restaurants = find_nearby_restaurants_h3(lat, lng, radius)
-    elif INDEXING_METHOD == "btree":
-        from app.utils.btree_utils import find_nearby_restaurants_btree
+    # Add method used to the response
+    response = {
+        "indexing_method": method,
+        "approximate": approximate,
+        "center": {"lat": lat, "lng": lng},
+        "radius_km": radius,
+        "count": len(restaurants),
+        "restaurants": restaurants,
+    }
+    if facets:
+        response["facets"] = count_facets(restaurants, facets)
+
+    # Expose the plan of methods that choose one, such as the H3 resolution
+    plan = get_search_plan(method, lat, lng, radius, approximate=approximate)
+    if plan:
+        response["search_plan"] = plan
+
+    return jsonify(response)
+
+
+@bp.route("/<int:restaurant_id>/nearby-users", methods=["GET"])
+def get_nearby_users(restaurant_id):
+    """Find users near a restaurant, e.g. to target a promotion."""
+    radius = request.args.get("radius", default=5.0, type=float)
 
-        restaurants = find_nearby_restaurants_btree(lat, lng, radius)
-    elif INDEXING_METHOD == "postgis":
-        from app.utils.postgis_utils import find_nearby_restaurants_postgis
+    error = validate_radius(radius)
+    if error:
+        return jsonify({"error": error}), 400
+
+    method, error = resolve_indexing_method(request)
+    if error:
+        return jsonify({"error": error}), 400
+    if method not in USER_METHODS:
+        return jsonify({"error": f"Indexing method '{method}' can't search users"}), 400
+
+    query = """
+    SELECT "Latitude", "Longitude"
+    FROM restaurants
+    WHERE "Restaurantid" = %s
+    """
+    restaurant = execute_query(
+        query, (restaurant_id,), fetch_all=False, read_only=True
+    )
 
-        restaurants = find_nearby_restaurants_postgis(lat, lng, radius)
-    else:
-        # Basic approach with Haversine formula
-        query = """
-        SELECT *, 
-            (6371 * acos(cos(radians(%s)) * cos(radians(latitude)) * cos(radians(longitude) - 
-            radians(%s)) + sin(radians(%s)) * sin(radians(latitude)))) AS distance 
-        FROM restaurants 
-        WHERE (6371 * acos(cos(radians(%s)) * cos(radians(latitude)) * cos(radians(longitude) - 
-            radians(%s)) + sin(radians(%s)) * sin(radians(latitude)))) < %s 
-        ORDER BY distance;
-        """
-
-        restaurants = execute_query(query, (lat, lng, lat, lat, lng, lat, radius))
+    if not restaurant or restaurant["Latitude"] is None:
+        return jsonify({"error": "Restaurant not found"}), 404
 
-    # Add method used to the response
-    return jsonify(
-        {
-            "indexing_method": INDEXING_METHOD,
-            "center": {"lat": lat, "lng": lng},
-            "radius_km": radius,
-            "count": len(restaurants),
-            "restaurants": restaurants,
-        }
-    )
+    lat = float(restaurant["Latitude"])
+    lng = float(restaurant["Longitude"])
+    users = find_nearby_users(lat, lng, radius, method)
+
+    response = {
+        "indexing_method": method,
+        "restaurant_id": restaurant_id,
+        "center": {"lat": lat, "lng": lng},
+        "radius_km": radius,
+        "count": len(users),
+        "users": users,
+    }
+
+    plan = get_search_plan(method, lat, lng, radius, "users")
+    if plan:
+        response["search_plan"] = plan
+
+    return jsonify(response)
+
+
+@bp.route("/viewport", methods=["GET"])
+def get_viewport():
+    """Get the restaurants or restaurant clusters inside a map viewport."""
+    bbox = request.args.get("bbox")
+    zoom = request.args.get("zoom", type=int)
+
+    if not bbox or zoom is None:
+        return jsonify({"error": "bbox and zoom are required"}), 400
+
+    try:
+        bbox = parse_bbox(bbox)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid bbox: {e}"}), 400
+
+    response = {"bbox": list(bbox), "zoom": zoom}
+
+    if zoom >= VIEWPORT_CLUSTER_MAX_ZOOM:
+        restaurants, truncated = get_viewport_restaurants(bbox)
+        response.update(
+            {
+                "mode": "restaurants",
+                "count": len(restaurants),
+                "truncated": truncated,
+                "restaurants": restaurants,
+            }
+        )
+    else:
+        clusters, resolution, source = get_viewport_clusters(bbox, zoom)
+        response.update(
+            {
+                "mode": "clusters",
+                "resolution": resolution,
+                "source": source,
+                "count": sum(cluster["count"] for cluster in clusters),
+                "clusters": clusters,
+            }
+        )
+
+    return jsonify(response)
@@ -1,9 +1,15 @@
 from flask import Blueprint, jsonify, request
-from app.utils.db_utils import execute_query, get_db_connection
-import os
-
-# Determine which indexing method to use
-INDEXING_METHOD = os.environ.get("INDEXING_METHOD", "basic")
+from app.utils.db_utils import execute_query, get_db_connection, get_select_list
+from app.utils.admission_utils import validate_radius
+from app.utils.search_utils import (
+    find_nearby_restaurants,
+    get_search_plan,
+    resolve_approximate,
+    resolve_indexing_method,
+)
+from app.utils.shadow_utils import resolve_shadow_method
+from app.utils.hours_utils import resolve_open_slot
+from app.utils.facet_utils import count_facets, resolve_facets
 
 # Create blueprint
 bp = Blueprint("search", __name__, url_prefix="/api/search")
@@ -20,8 +26,8 @@ def search_restaurants():
 
     # Text search
     if q:
-        query = """
-        SELECT * FROM restaurants
+        query = f"""
+        SELECT {get_select_list("restaurants")} FROM restaurants
         WHERE name ILIKE %s 
         OR cuisine ILIKE %s
         OR city ILIKE %s
@@ -29,7 +35,9 @@ def search_restaurants():
         """
 
         search_term = f"%{q}%"
-        results = execute_query(query, (search_term, search_term, search_term))
+        results = execute_query(
+            query, (search_term, search_term, search_term), read_only=True
+        )
 
         return jsonify(results)
 
@@ -40,32 +48,27 @@ def search_restaurants():
         except ValueError:
             return jsonify({"error": "Invalid coordinates"}), 400
 
-        # Use appropriate indexing method based on environment variable
-        if INDEXING_METHOD == "h3":
-            from app.utils.h3_utils import find_nearby_restaurants_h3
-
-            results = find_nearby_restaurants_h3(lat, lng, radius)
-        elif INDEXING_METHOD == "btree":
-            from app.utils.btree_utils import find_nearby_restaurants_btree
-
-            results = find_nearby_restaurants_btree(lat, lng, radius)
-        elif INDEXING_METHOD == "postgis":
-            from app.utils.postgis_utils import find_nearby_restaurants_postgis
-
-            results = find_nearby_restaurants_postgis(lat, lng, radius)
-        else:
-            # Basic approach with Haversine formula
-            query = """
-            SELECT *, 
-                (6371 * acos(cos(radians(%s)) * cos(radians(latitude)) * cos(radians(longitude) - 
-                radians(%s)) + sin(radians(%s)) * sin(radians(latitude)))) AS distance 
-            FROM restaurants 
-            WHERE (6371 * acos(cos(radians(%s)) * cos(radians(latitude)) * cos(radians(longitude) - 
-                radians(%s)) + sin(radians(%s)) * sin(radians(latitude)))) < %s 
-            ORDER BY distance;
-            """
-
-            results = execute_query(query, (lat, lng, lat, lat, lng, lat, radius))
+        error = validate_radius(radius)
+        if error:
+            return jsonify({"error": error}), 400
+
+        # Use the indexing method picked by the request, or the default one
+        method, error = resolve_indexing_method(request)
+        if error:
+            return jsonify({"error": error}), 400
+
+        open_slot, error = resolve_open_slot(request)
+        if error:
+            return jsonify({"error": error}), 400
+
+        results = find_nearby_restaurants(
+            lat,
+            lng,
+            radius,
+            method,
+            resolve_shadow_method(request, method),
+            open_slot=open_slot,
+        )
 
         return jsonify(results)
 
@@ -91,37 +94,48 @@ def nearby_restaurants():
     except ValueError:
         return jsonify({"error": "Invalid coordinates"}), 400
 
-    # Use appropriate indexing method based on environment variable
-    if INDEXING_METHOD == "h3":
-        from app.utils.h3_utils import find_nearby_restaurants_h3
-
-        results = find_nearby_restaurants_h3(lat, lng, radius)
-    elif INDEXING_METHOD == "btree":
-        from app.utils.btree_utils import find_nearby_restaurants_btree
-
-        results = find_nearby_restaurants_btree(lat, lng, radius)
-    elif INDEXING_METHOD == "postgis":
-        from app.utils.postgis_utils import find_nearby_restaurants_postgis
-
-        results = find_nearby_restaurants_postgis(lat, lng, radius)
-    else:
-        # Basic approach with Haversine formula
-        query = """
-        SELECT *, 
-            (6371 * acos(cos(radians(%s)) * cos(radians(latitude)) * cos(radians(longitude) - 
-            radians(%s)) + sin(radians(%s)) * sin(radians(latitude)))) AS distance 
-        FROM restaurants 
-        WHERE (6371 * acos(cos(radians(%s)) * cos(radians(latitude)) * cos(radians(longitude) - 
-            radians(%s)) + sin(radians(%s)) * sin(radians(latitude)))) < %s 
-        ORDER BY distance;
-        """
-
-        results = execute_query(query, (lat, lng, lat, lat, lng, lat, radius))
-
-    return jsonify(
-        {
-            "indexing_method": INDEXING_METHOD,
-            "count": len(results),
-            "restaurants": results,
-        }
+    error = validate_radius(radius)
+    if error:
+        return jsonify({"error": error}), 400
+
+    # Use the indexing method picked by the request, or the default one
+    method, error = resolve_indexing_method(request)
+    if error:
+        return jsonify({"error": error}), 400
+
+    # Optional opening hours filter, ?open_at= or ?open_now=1
+    open_slot, error = resolve_open_slot(request)
+    if error:
+        return jsonify({"error": error}), 400
+
+    # Optional value counts of the results, ?facets=Cuisine,Price or all
+    facets, error = resolve_facets(request)
+    if error:
+        return jsonify({"error": error}), 400
+
+    approximate = resolve_approximate(request, method)
+    results = find_nearby_restaurants(
+        lat,
+        lng,
+        radius,
+        method,
+        resolve_shadow_method(request, method),
+        approximate,
+        open_slot,
     )
+
+    response = {
+        "indexing_method": method,
+        "approximate": approximate,
+        "count": len(results),
+        "restaurants": results,
+    }
+    if facets:
+        response["facets"] = count_facets(results, facets)
+
+    # Expose the plan of methods that choose one, such as the H3 resolution
+    plan = get_search_plan(method, lat, lng, radius, approximate=approximate)
+    if plan:
+        response["search_plan"] = plan
+
+    return jsonify(response)
@@ -0,0 +1,45 @@
+from flask import Blueprint, Response, jsonify, request
+from app.utils.search_utils import resolve_indexing_method
+from app.utils.tile_utils import (
+    TILE_CACHE_MAX_AGE,
+    is_valid_tile,
+    get_data_version,
+    get_tile,
+    get_tile_encoder,
+    get_tile_etag,
+)
+
+# Create blueprint
+bp = Blueprint("tiles", __name__, url_prefix="/tiles")
+
+
+@bp.route("/<int:z>/<int:x>/<int:y>.mvt", methods=["GET"])
+def get_restaurant_tile(z, x, y):
+    """Get the restaurants of one map tile as a Mapbox Vector Tile."""
+    if not is_valid_tile(z, x, y):
+        return jsonify({"error": "Invalid tile coordinates"}), 400
+
+    # PostGIS deployments build tiles in the database, others in Python
+    method, error = resolve_indexing_method(request)
+    if error:
+        return jsonify({"error": error}), 400
+
+    encoder = get_tile_encoder(method)
+    version = get_data_version()
+    tile, cache_status = get_tile(z, x, y, encoder, version)
+    etag = get_tile_etag(tile)
+
+    headers = {
+        "ETag": f'"{etag}"',
+        "Cache-Control": f"public, max-age={TILE_CACHE_MAX_AGE}",
+        "X-Tile-Cache": cache_status,
+    }
+
+    # Unchanged tiles are revalidated without sending them again. The
+    # comparison is weak since compressed tiles carry a weak ETag.
+    if request.if_none_match.contains_weak(etag):
+        return Response(status=304, headers=headers)
+
+    return Response(
+        tile, mimetype="application/vnd.mapbox-vector-tile", headers=headers
+    )
@@ -1,5 +1,7 @@
+import psycopg2.errors
 from flask import Blueprint, jsonify, request
-from app.utils.db_utils import execute_query
+from app.utils.db_utils import execute_query, get_select_list
+from app.utils.spatial_join_utils import JOIN_RADII_KM, JOIN_TABLE
 
 # Create blueprint
 bp = Blueprint("users", __name__, url_prefix="/api/users")
@@ -33,7 +35,7 @@ def get_users():
     params.extend([limit, offset])
 
     # Execute query
-    users = execute_query(query, params)
+    users = execute_query(query, params, read_only=True)
 
     return jsonify(users)
 
@@ -42,7 +44,7 @@ def get_users():
 def get_user(user_id):
     """Get a specific user by ID."""
     query = "SELECT * FROM users WHERE user_id = %s"
-    user = execute_query(query, (user_id,), fetch_all=False)
+    user = execute_query(query, (user_id,), fetch_all=False, read_only=True)
 
     if user:
         # Get ratings from this user
@@ -54,7 +56,7 @@ def get_user(user_id):
         ORDER BY r.rating DESC
         """
 
-        ratings = execute_query(ratings_query, (user_id,))
+        ratings = execute_query(ratings_query, (user_id,), read_only=True)
 
         # Add ratings to user data
         user_data = dict(user)
@@ -63,3 +65,52 @@ def get_user(user_id):
         return jsonify(user_data)
     else:
         return jsonify({"error": "User not found"}), 404
+
+
+@bp.route("/<user_id>/nearby-restaurants", methods=["GET"])
+def get_user_nearby_restaurants(user_id):
+    """Get the restaurants near a user, precomputed by the spatial join job."""
+    radius = request.args.get("radius", default=JOIN_RADII_KM[-1], type=float)
+    limit = request.args.get("limit", default=20, type=int)
+
+    if radius > JOIN_RADII_KM[-1]:
+        return (
+            jsonify(
+                {
+                    "error": f"Radius is limited to {JOIN_RADII_KM[-1]:g} km, "
+                    f"the largest radius joined"
+                }
+            ),
+            400,
+        )
+
+    query = f"""
+    SELECT {get_select_list("restaurants", "r")}, n.distance_km AS distance, n.rank
+    FROM {JOIN_TABLE} n
+    JOIN restaurants r ON r."Restaurantid" = n.restaurant_id
+    WHERE n.user_id = %s AND n.distance_km <= %s
+    ORDER BY n.rank
+    LIMIT %s
+    """
+
+    try:
+        restaurants = execute_query(query, (user_id, radius, limit), read_only=True)
+    except psycopg2.errors.UndefinedTable:
+        return (
+            jsonify(
+                {
+                    "error": "Nearby restaurants have not been computed, run "
+                    "scripts/join_users_restaurants.py"
+                }
+            ),
+            503,
+        )
+
+    return jsonify(
+        {
+            "user_id": user_id,
+            "radius_km": radius,
+            "count": len(restaurants),
+            "restaurants": restaurants,
+        }
+    )
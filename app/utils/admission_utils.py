@@ -0,0 +1,239 @@
+import os
+import time
+import threading
+import psycopg2.errors
+from flask import g, jsonify, request
+from app.utils.db_utils import QueryDeadlineExceeded, set_query_deadline
+
+
+def _parse_limits(value):
+    """Parse 'key=number,key=number' settings into a dict of floats."""
+    limits = {}
+    for item in value.split(","):
+        if "=" in item:
+            key, number = item.split("=", 1)
+            limits[key.strip()] = float(number)
+    return limits
+
+
+# Requests served at the same time per endpoint, blueprint or by default.
+# Keys are endpoint names ('restaurants.get_nearby_restaurants'), blueprint
+# names ('benchmark') or 'default'; the most specific one applies.
+ADMISSION_LIMITS = _parse_limits(
+    os.environ.get("ADMISSION_LIMITS", "default=32,benchmark=2,export=2,debug=1")
+)
+
+# Requests that may wait for a slot of each limit; beyond that, requests are
+# rejected right away with 503
+ADMISSION_QUEUE_SIZE = int(os.environ.get("ADMISSION_QUEUE_SIZE", 16))
+
+# Longest time a request waits in the queue before it is rejected
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", 1.0))
+
+# Time budget of a request, from its arrival, in seconds; keyed like
+# ADMISSION_LIMITS, 0 for no deadline. Queries get the remaining budget as
+# statement_timeout. Clients may ask for less with an X-Request-Timeout
+# header, in seconds.
+REQUEST_DEADLINES = _parse_limits(
+    os.environ.get("REQUEST_DEADLINES", "default=10,benchmark=120,export=0,debug=0")
+)
+REQUEST_TIMEOUT_HEADER = "X-Request-Timeout"
+
+# Largest search radius accepted, in kilometers, and the most runs or
+# queries a benchmark request may ask for
+MAX_SEARCH_RADIUS_KM = float(os.environ.get("MAX_SEARCH_RADIUS_KM", 1000))
+MAX_BENCHMARK_RUNS = int(os.environ.get("MAX_BENCHMARK_RUNS", 50))
+
+# Endpoints never limited, so health checks pass under overload
+EXEMPT_ENDPOINTS = {"health_check", "liveness_check", "readiness_check"}
+
+# Seconds clients are asked to wait before retrying a rejected request
+RETRY_AFTER_SECONDS = 1
+
+_lock = threading.Lock()
+_slots = {}
+_stats = {}
+
+
+def _setting(settings, endpoint, blueprint):
+    """Look up the most specific setting of an endpoint."""
+    for key in (endpoint, blueprint, "default"):
+        if key in settings:
+            return settings[key]
+    return None
+
+
+def _slot(key, limit):
+    """Get the concurrency state of a limit key. Needs _lock."""
+    if key not in _slots:
+        _slots[key] = {
+            "limit": int(limit),
+            "active": 0,
+            "waiting": 0,
+            "available": threading.Condition(_lock),
+        }
+        _stats[key] = {"admitted": 0, "queued": 0, "rejected": 0, "timed_out": 0}
+    return _slots[key]
+
+
+def _limit_key(endpoint, blueprint):
+    """Get the key requests of an endpoint share their limit under."""
+    for key in (endpoint, blueprint):
+        if key in ADMISSION_LIMITS:
+            return key
+    return "default"
+
+
+def acquire_slot(key, limit, timeout):
+    """
+    Wait for a free slot of a limit key.
+
+    Returns:
+        str: None once admitted, or why the request was rejected
+    """
+    with _lock:
+        slot = _slot(key, limit)
+        stats = _stats[key]
+
+        if slot["active"] < slot["limit"]:
+            slot["active"] += 1
+            stats["admitted"] += 1
+            return None
+
+        if slot["waiting"] >= ADMISSION_QUEUE_SIZE:
+            stats["rejected"] += 1
+            return "Server is overloaded, retry later"
+
+        slot["waiting"] += 1
+        stats["queued"] += 1
+        deadline = time.monotonic() + timeout
+        try:
+            while slot["active"] >= slot["limit"]:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    stats["timed_out"] += 1
+                    return "Timed out waiting for a free slot, retry later"
+                slot["available"].wait(remaining)
+        finally:
+            slot["waiting"] -= 1
+
+        slot["active"] += 1
+        stats["admitted"] += 1
+        return None
+
+
+def release_slot(key):
+    """Free a slot of a limit key and wake one waiting request."""
+    with _lock:
+        slot = _slots[key]
+        slot["active"] -= 1
+        slot["available"].notify()
+
+
+def _overloaded(message):
+    response = jsonify({"error": message})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(RETRY_AFTER_SECONDS)
+    return response
+
+
+def _request_deadline(endpoint, blueprint, arrival):
+    """Get the monotonic deadline of the current request, or None."""
+    budget = _setting(REQUEST_DEADLINES, endpoint, blueprint) or None
+    requested = request.headers.get(REQUEST_TIMEOUT_HEADER, type=float)
+    if requested is not None and requested > 0:
+        budget = min(budget, requested) if budget else requested
+    return arrival + budget if budget else None
+
+
+def admit_request():
+    """
+    Admit the current request or reject it with 503.
+
+    Sets the request's deadline, which bounds both its wait for a slot and
+    the statement_timeout of its queries.
+    """
+    if request.endpoint is None or request.endpoint in EXEMPT_ENDPOINTS:
+        return None
+
+    arrival = time.monotonic()
+    deadline = _request_deadline(request.endpoint, request.blueprint, arrival)
+    timeout = ADMISSION_QUEUE_TIMEOUT
+    if deadline is not None:
+        timeout = min(timeout, deadline - arrival)
+
+    limit = _setting(ADMISSION_LIMITS, request.endpoint, request.blueprint)
+    if limit is not None:
+        key = _limit_key(request.endpoint, request.blueprint)
+        error = acquire_slot(key, limit, timeout)
+        if error:
+            return _overloaded(error)
+        g.admission_key = key
+
+    set_query_deadline(deadline)
+    return None
+
+
+def finish_request(exception=None):
+    """Release the slot and deadline of the current request."""
+    set_query_deadline(None)
+    key = g.pop("admission_key", None)
+    if key is not None:
+        release_slot(key)
+
+
+def validate_radius(radius_km):
+    """
+    Check a search radius against MAX_SEARCH_RADIUS_KM.
+
+    Returns:
+        str: Error message, or None if the radius is acceptable
+    """
+    if radius_km is None or not 0 < radius_km <= MAX_SEARCH_RADIUS_KM:
+        return f"radius must be greater than 0 and at most {MAX_SEARCH_RADIUS_KM:g} km"
+    return None
+
+
+def validate_runs(num_runs, name="runs"):
+    """
+    Check the number of runs or queries of a benchmark request.
+
+    Args:
+        num_runs (int): Number asked for
+        name (str): Query parameter it came from, for the error message
+
+    Returns:
+        str: Error message, or None if the number is acceptable
+    """
+    if num_runs is None or not 0 < num_runs <= MAX_BENCHMARK_RUNS:
+        return f"{name} must be between 1 and {MAX_BENCHMARK_RUNS}"
+    return None
+
+
+def get_admission_stats():
+    """Report the limits, current load and rejections of each limit key."""
+    with _lock:
+        return {
+            "queue_size": ADMISSION_QUEUE_SIZE,
+            "queue_timeout_seconds": ADMISSION_QUEUE_TIMEOUT,
+            "limits": {
+                key: {
+                    "limit": slot["limit"],
+                    "active": slot["active"],
+                    "waiting": slot["waiting"],
+                    **_stats[key],
+                }
+                for key, slot in sorted(_slots.items())
+            },
+        }
+
+
+def init_app(app):
+    """Limit concurrent requests and bound the time their queries may take."""
+    app.before_request(admit_request)
+    app.teardown_request(finish_request)
+
+    @app.errorhandler(QueryDeadlineExceeded)
+    @app.errorhandler(psycopg2.errors.QueryCanceled)
+    def deadline_exceeded(e):
+        return _overloaded("Request deadline exceeded")
@@ -0,0 +1,304 @@
+import os
+import time
+import bisect
+import random
+import threading
+import h3
+import psycopg2.errors
+from app.utils.db_utils import QueryDeadlineExceeded
+
+# Backends the auto mode chooses from
+AUTO_CANDIDATE_METHODS = [
+    method.strip()
+    for method in os.environ.get(
+        "AUTO_CANDIDATE_METHODS", "basic,btree,postgis,h3"
+    ).split(",")
+    if method.strip() and method.strip() != "auto"
+]
+
+# Fraction of queries routed to a random candidate to keep estimates fresh
+AUTO_EXPLORE_RATE = float(os.environ.get("AUTO_EXPLORE_RATE", 0.05))
+
+# Candidates with fewer samples in a bucket are preferred when exploring
+AUTO_MIN_SAMPLES = int(os.environ.get("AUTO_MIN_SAMPLES", 3))
+
+# How long a candidate that failed is left out of the selection
+AUTO_RETRY_SECONDS = float(os.environ.get("AUTO_RETRY_SECONDS", 60))
+
+# Weight of the newest sample in the latency moving average
+LATENCY_SMOOTHING = 0.2
+
+# Upper bounds of the radius buckets, in kilometers
+RADIUS_BUCKETS = [0.5, 1, 2, 5, 10, 25, 50, 100]
+
+# Upper bounds of the density buckets, in restaurants per resolution 6 cell
+DENSITY_BUCKETS = [0, 10, 100, 1000]
+DENSITY_RESOLUTION = 6
+
+# Used for buckets without measurements: bounding boxes for tiny radii,
+# PostGIS for medium ones and a scan of coarse cells for huge ones
+DEFAULT_PREFERENCES = [
+    (1, ["btree", "postgis", "h3", "basic"]),
+    (50, ["postgis", "btree", "h3", "basic"]),
+    (float("inf"), ["h3", "basic", "postgis", "btree"]),
+]
+
+_lock = threading.Lock()
+_stats = {}
+_down_until = {}
+_selections = 0
+_explorations = 0
+_last_selection = threading.local()
+
+
+def _bucket_label(bounds, value, unit=""):
+    """Label of the bucket a value falls into."""
+    index = bisect.bisect_left(bounds, value)
+    if index == len(bounds):
+        return f">{bounds[-1]}{unit}"
+    return f"<={bounds[index]}{unit}"
+
+
+def get_query_bucket(lat, lng, radius_km, target="restaurants"):
+    """
+    Get the radius and density bucket of a nearby search.
+
+    Density is the number of restaurants in the resolution 6 H3 cell of the
+    center, taken from the precomputed cluster aggregates. User searches have
+    no density aggregates and are bucketed by radius only.
+
+    Returns:
+        tuple: (radius bucket, density bucket)
+    """
+    from app.utils.h3_utils import get_cell_counts
+
+    radius_bucket = _bucket_label(RADIUS_BUCKETS, radius_km, "km")
+    if target != "restaurants":
+        return radius_bucket, "unknown"
+
+    counts = get_cell_counts()
+    if not counts:
+        return radius_bucket, "unknown"
+
+    cell = h3.geo_to_h3(lat, lng, DENSITY_RESOLUTION)
+    density = counts.get(DENSITY_RESOLUTION, {}).get(cell, 0)
+    return radius_bucket, _bucket_label(DENSITY_BUCKETS, density)
+
+
+def record_search_latency(
+    method, lat, lng, radius_km, seconds, bucket=None, target="restaurants"
+):
+    """
+    Feed the latency of a search into the estimates of its backend.
+
+    Called for live traffic, shadow searches and benchmark runs alike.
+    Restaurant and user searches are estimated separately.
+    """
+    if method not in AUTO_CANDIDATE_METHODS:
+        return
+
+    bucket = bucket or get_query_bucket(lat, lng, radius_km, target)
+    with _lock:
+        stats = _stats.setdefault(
+            (target, method, bucket), {"samples": 0, "latency_ewma": None}
+        )
+        stats["samples"] += 1
+        if stats["latency_ewma"] is None:
+            stats["latency_ewma"] = seconds
+        else:
+            stats["latency_ewma"] += LATENCY_SMOOTHING * (
+                seconds - stats["latency_ewma"]
+            )
+
+
+def _target_candidates(target):
+    """Candidates that can search a target table."""
+    if target == "restaurants":
+        return AUTO_CANDIDATE_METHODS
+
+    from app.utils.search_utils import USER_METHODS
+
+    return [method for method in AUTO_CANDIDATE_METHODS if method in USER_METHODS]
+
+
+def _available_candidates(target="restaurants"):
+    """Candidates that have not failed recently."""
+    now = time.time()
+    with _lock:
+        return [
+            method
+            for method in _target_candidates(target)
+            if _down_until.get(method, 0) <= now
+        ]
+
+
+def select_method(lat, lng, radius_km, exclude=(), target="restaurants"):
+    """
+    Pick the backend expected to answer a nearby search fastest.
+
+    Args:
+        lat (float): Latitude of center point
+        lng (float): Longitude of center point
+        radius_km (float): Search radius in kilometers
+        exclude (tuple): Methods not to pick, e.g. ones that just failed
+        target (str): Table searched, 'restaurants' or 'users'
+
+    Returns:
+        dict: Selected method, bucket, whether it was an exploration, and the
+            latency estimates it was chosen from
+    """
+    global _selections, _explorations
+
+    bucket = get_query_bucket(lat, lng, radius_km, target)
+    candidates = [m for m in _available_candidates(target) if m not in exclude]
+    if not candidates:
+        # Every candidate failed recently, try them again rather than fail
+        candidates = [m for m in _target_candidates(target) if m not in exclude]
+
+    with _lock:
+        estimates = {
+            method: dict(_stats.get((target, method, bucket), {}))
+            for method in candidates
+        }
+        _selections += 1
+
+        explored = random.random() < AUTO_EXPLORE_RATE
+        measured = [
+            method
+            for method in candidates
+            if estimates[method].get("samples", 0) >= AUTO_MIN_SAMPLES
+        ]
+
+        if explored:
+            _explorations += 1
+            # Spend the exploration budget on the least measured candidates
+            fewest = min(estimates[m].get("samples", 0) for m in candidates)
+            method = random.choice(
+                [m for m in candidates if estimates[m].get("samples", 0) == fewest]
+            )
+        elif measured:
+            method = min(measured, key=lambda m: estimates[m]["latency_ewma"])
+        else:
+            preferences = next(
+                order for bound, order in DEFAULT_PREFERENCES if radius_km <= bound
+            )
+            method = next((m for m in preferences if m in candidates), candidates[0])
+
+    return {
+        "selected_method": method,
+        "explored": explored,
+        "radius_bucket": bucket[0],
+        "density_bucket": bucket[1],
+        "latency_estimates": {m: estimates[m].get("latency_ewma") for m in candidates},
+    }
+
+
+def find_nearby_auto(target, lat, lng, radius_km, open_slot=None):
+    """
+    Search a table with the backend expected to be fastest for the query.
+
+    A backend that fails is left out for AUTO_RETRY_SECONDS and the query is
+    retried on the next best one.
+
+    Args:
+        target (str): Table searched, 'restaurants' or 'users'
+        lat (float): Latitude of center point
+        lng (float): Longitude of center point
+        radius_km (float): Search radius in kilometers
+        open_slot (int): Keep only restaurants open in this slot of the week
+
+    Returns:
+        list: Rows within the radius, ordered by distance
+    """
+    from app.utils.search_utils import run_search
+
+    failed = []
+    while True:
+        selection = select_method(
+            lat, lng, radius_km, exclude=tuple(failed), target=target
+        )
+        method = selection["selected_method"]
+
+        try:
+            start_time = time.time()
+            results, executed = run_search(
+                method, lat, lng, radius_km, target, open_slot=open_slot
+            )
+            elapsed = time.time() - start_time
+        except (QueryDeadlineExceeded, psycopg2.errors.QueryCanceled):
+            # Out of time, not a broken backend; another one wouldn't help
+            raise
+        except Exception as e:
+            print(f"Auto mode: {method} failed, trying another backend: {e}")
+            with _lock:
+                _down_until[method] = time.time() + AUTO_RETRY_SECONDS
+            failed.append(method)
+            if len(failed) >= len(_target_candidates(target)):
+                raise
+            continue
+
+        if executed:
+            record_search_latency(
+                method,
+                lat,
+                lng,
+                radius_km,
+                elapsed,
+                (selection["radius_bucket"], selection["density_bucket"]),
+                target,
+            )
+        selection["failed_methods"] = failed
+        _last_selection.value = selection
+        return results
+
+
+def find_nearby_restaurants_auto(lat, lng, radius_km, open_slot=None):
+    """
+    Find restaurants with the backend expected to be fastest for the query.
+
+    Args:
+        lat (float): Latitude of center point
+        lng (float): Longitude of center point
+        radius_km (float): Search radius in kilometers
+        open_slot (int): Keep only restaurants open in this slot of the week
+
+    Returns:
+        list: Restaurants within the radius, ordered by distance
+    """
+    return find_nearby_auto("restaurants", lat, lng, radius_km, open_slot)
+
+
+def find_nearby_users_auto(lat, lng, radius_km):
+    """Find users with the backend expected to be fastest for the query."""
+    return find_nearby_auto("users", lat, lng, radius_km)
+
+
+def get_last_selection():
+    """Get the backend selection of the last auto search in this thread."""
+    return getattr(_last_selection, "value", None)
+
+
+def get_auto_stats():
+    """Report the latency estimates of every backend and bucket."""
+    now = time.time()
+    with _lock:
+        return {
+            "candidates": AUTO_CANDIDATE_METHODS,
+            "explore_rate": AUTO_EXPLORE_RATE,
+            "selections": _selections,
+            "explorations": _explorations,
+            "unavailable": sorted(
+                method for method, until in _down_until.items() if until > now
+            ),
+            "buckets": [
+                {
+                    "target": target,
+                    "method": method,
+                    "radius_bucket": bucket[0],
+                    "density_bucket": bucket[1],
+                    "samples": stats["samples"],
+                    "latency_ewma_seconds": stats["latency_ewma"],
+                }
+                for (target, method, bucket), stats in sorted(_stats.items())
+            ],
+        }
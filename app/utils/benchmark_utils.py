@@ -1,9 +1,30 @@
+import json
 import time
 import statistics
-from app.utils.db_utils import get_db_connection
+from flask.json.provider import DefaultJSONProvider
+from app.utils.search_utils import get_search_function, get_search_plan
+from app.utils.partition_utils import get_partition_scan_counts
+from app.utils.auto_utils import record_search_latency
+from app.utils.response_utils import (
+    SERIALIZERS,
+    compress,
+    dumps_json,
+    get_available_encodings,
+)
 
+# The statistics collector publishes table counters at most every 500 ms
+PARTITION_STATS_DELAY = 0.6
 
-def benchmark_nearby_search(lat, lng, radius_km, method, num_runs=5):
+
+def benchmark_nearby_search(
+    lat,
+    lng,
+    radius_km,
+    method,
+    num_runs=5,
+    include_partition_scans=False,
+    target="restaurants",
+):
     """
     Benchmark the performance of a nearby search method.
 
@@ -11,52 +32,22 @@ def benchmark_nearby_search(lat, lng, radius_km, method, num_runs=5):
         lat (float): Latitude of center point
         lng (float): Longitude of center point
         radius_km (float): Search radius in kilometers
-        method (str): Indexing method to benchmark ('basic', 'btree', 'postgis', 'h3')
+        method (str): Indexing method to benchmark ('basic', 'btree', 'postgis',
+            'h3', 'snapshot', 'auto')
         num_runs (int): Number of runs to average over
+        include_partition_scans (bool): Report how often each restaurant
+            partition was scanned during the runs
+        target (str): Table searched, 'restaurants' or 'users'
 
     Returns:
         dict: Benchmark results including timing and result counts
     """
-    # Import the appropriate search function
-    if method == "h3":
-        from app.utils.h3_utils import find_nearby_restaurants_h3 as search_func
-    elif method == "btree":
-        from app.utils.btree_utils import find_nearby_restaurants_btree as search_func
-    elif method == "postgis":
-        from app.utils.postgis_utils import (
-            find_nearby_restaurants_postgis as search_func,
-        )
-    else:
-        # Basic search function
-        def search_func(lat, lng, radius_km):
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            try:
-                query = """
-                SELECT *, 
-                    (6371 * acos(cos(radians(%s)) * cos(radians(latitude)) * cos(radians(longitude) - 
-                    radians(%s)) + sin(radians(%s)) * sin(radians(latitude)))) AS distance 
-                FROM restaurants 
-                WHERE (6371 * acos(cos(radians(%s)) * cos(radians(latitude)) * cos(radians(longitude) - 
-                    radians(%s)) + sin(radians(%s)) * sin(radians(latitude)))) < %s 
-                ORDER BY distance;
-                """
-
-                cursor.execute(query, (lat, lng, lat, lat, lng, lat, radius_km))
-                results = cursor.fetchall()
-
-                # Convert to list of dicts
-                restaurants = []
-                for row in results:
-                    restaurant = {}
-                    for i, col in enumerate(cursor.description):
-                        restaurant[col[0]] = row[i]
-                    restaurants.append(restaurant)
-
-                return restaurants
-            finally:
-                cursor.close()
-                conn.close()
+    # Get the appropriate search function
+    search_func = get_search_function(method, target)
+
+    if include_partition_scans:
+        time.sleep(PARTITION_STATS_DELAY)
+        scans_before = get_partition_scan_counts()
 
     # Run the benchmark
     run_times = []
@@ -71,13 +62,17 @@ def benchmark_nearby_search(lat, lng, radius_km, method, num_runs=5):
         run_times.append(run_time)
         result_counts.append(len(results))
 
+        # Benchmark runs also feed the latency estimates of the auto mode
+        record_search_latency(method, lat, lng, radius_km, run_time, target=target)
+
     # Calculate statistics
     avg_time = statistics.mean(run_times)
     min_time = min(run_times)
     max_time = max(run_times)
 
-    return {
+    results = {
         "method": method,
+        "target": target,
         "num_runs": num_runs,
         "avg_time_seconds": avg_time,
         "min_time_seconds": min_time,
@@ -85,3 +80,103 @@ def benchmark_nearby_search(lat, lng, radius_km, method, num_runs=5):
         "avg_result_count": statistics.mean(result_counts),
         "run_times": run_times,
     }
+
+    plan = get_search_plan(method, lat, lng, radius_km, target)
+    if plan:
+        results["search_plan"] = plan
+
+    if include_partition_scans:
+        time.sleep(PARTITION_STATS_DELAY)
+        scans_after = get_partition_scan_counts()
+
+        # Only partitions that were actually touched are reported
+        partition_scans = {}
+        for partition, counts in scans_after.items():
+            before = scans_before.get(partition, {"seq_scan": 0, "idx_scan": 0})
+            delta = {
+                "seq_scan": counts["seq_scan"] - before["seq_scan"],
+                "idx_scan": counts["idx_scan"] - before["idx_scan"],
+            }
+            if delta["seq_scan"] or delta["idx_scan"]:
+                partition_scans[partition] = delta
+
+        results["partitions_total"] = len(scans_after)
+        results["partitions_scanned"] = len(partition_scans)
+        results["partition_scans"] = partition_scans
+
+    return results
+
+
+def _time_calls(func, num_runs):
+    """Run a function num_runs times and return its last result and avg ms."""
+    start_time = time.perf_counter()
+    for _ in range(num_runs):
+        result = func()
+    return result, (time.perf_counter() - start_time) / num_runs * 1000
+
+
+def benchmark_serialization(
+    lat, lng, radius_km, method, num_runs=5, target="restaurants"
+):
+    """
+    Benchmark how long a nearby search response takes to serialize and
+    compress, and how large it is on the wire.
+
+    The baseline is Flask's default JSON provider, which sorts keys and
+    encodes Decimals as strings. Every installed serializer and compression
+    encoding is measured on the same payload.
+
+    Args:
+        lat (float): Latitude of center point
+        lng (float): Longitude of center point
+        radius_km (float): Search radius in kilometers
+        method (str): Indexing method producing the payload
+        num_runs (int): Number of runs to average over
+        target (str): Table searched, 'restaurants' or 'users'
+
+    Returns:
+        dict: Serialization and compression times in milliseconds and sizes
+            in bytes
+    """
+    search_func = get_search_function(method, target)
+    rows = search_func(lat, lng, radius_km)
+    payload = {"count": len(rows), target: rows}
+
+    def flask_default():
+        return json.dumps(
+            payload,
+            default=DefaultJSONProvider.default,
+            sort_keys=True,
+            separators=(",", ":"),
+        ).encode("utf-8")
+
+    body, baseline_ms = _time_calls(flask_default, num_runs)
+    serializers = {
+        "flask_default": {"ms": baseline_ms, "bytes": len(body), "speedup": 1.0}
+    }
+
+    for name in SERIALIZERS:
+        body, ms = _time_calls(lambda: dumps_json(payload, name), num_runs)
+        serializers[name] = {
+            "ms": ms,
+            "bytes": len(body),
+            "speedup": baseline_ms / ms if ms else None,
+        }
+
+    compression = {}
+    for encoding in get_available_encodings():
+        compressed, ms = _time_calls(lambda: compress(body, encoding), num_runs)
+        compression[encoding] = {
+            "ms": ms,
+            "bytes": len(compressed),
+            "ratio": len(body) / len(compressed) if compressed else None,
+        }
+
+    return {
+        "method": method,
+        "target": target,
+        "num_runs": num_runs,
+        "result_count": len(rows),
+        "serializers": serializers,
+        "compression": compression,
+    }
@@ -1,6 +1,12 @@
-import math
 from psycopg2.extras import RealDictCursor
-from app.utils.db_utils import get_db_connection, execute_query
+from app.utils.db_utils import (
+    bounding_box,
+    get_db_connection,
+    execute_query,
+    get_select_list,
+)
+from app.utils.partition_utils import get_partition_filter
+from app.utils.hours_utils import open_filter
 
 
 def initialize_btree_indexes():
@@ -47,37 +53,47 @@ def initialize_btree_indexes():
         conn.close()
 
 
-def find_nearby_restaurants_btree(lat, lng, radius_km):
+def find_nearby_btree(table_name, lat, lng, radius_km, open_slot=None):
     """
-    Find restaurants using B-tree indexes by first filtering with a bounding box.
+    Find rows of a spatial table using B-tree indexes by first filtering with
+    a bounding box.
 
     Args:
+        table_name (str): 'restaurants' or 'users'
         lat (float): Latitude of center point
         lng (float): Longitude of center point
         radius_km (float): Search radius in kilometers
+        open_slot (int): Keep only restaurants open in this slot of the week
 
     Returns:
-        list: Restaurants within the radius, ordered by distance
+        list: Rows within the radius, ordered by distance
     """
-    # Calculate approximate bounding box
-    # 1 degree of latitude is approximately 111km
-    lat_range = radius_km / 111.0
-
-    # 1 degree of longitude varies with latitude
-    # At the equator it's about 111km, decreasing with increasing latitude
-    lng_range = radius_km / (111.0 * abs(math.cos(math.radians(lat))))
+    # Bounding box of the circle, which may span every longitude near the
+    # poles or wrap around the antimeridian
+    min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+    if min_lng <= max_lng:
+        lng_condition = '"Longitude" BETWEEN %s AND %s'
+    else:
+        lng_condition = '("Longitude" >= %s OR "Longitude" <= %s)'
+
+    # Restrict the search to the partitions the circle can touch
+    partition_filter, partition_params = get_partition_filter(
+        lat, lng, radius_km, table_name
+    )
+    hours_filter, hours_params = open_filter(open_slot)
 
     # Query with pre-filtering using B-tree indexes
-    query = """
-    SELECT *, 
-        (6371 * acos(cos(radians(%s)) * cos(radians(latitude)) * cos(radians(longitude) - 
-        radians(%s)) + sin(radians(%s)) * sin(radians(latitude)))) AS distance 
-    FROM restaurants 
+    query = f"""
+    SELECT {get_select_list(table_name)}, 
+        (6371 * acos(cos(radians(%s)) * cos(radians("Latitude")) * cos(radians("Longitude") - 
+        radians(%s)) + sin(radians(%s)) * sin(radians("Latitude")))) AS distance 
+    FROM {table_name} 
     WHERE 
-        latitude BETWEEN %s AND %s
-        AND longitude BETWEEN %s AND %s
-        AND (6371 * acos(cos(radians(%s)) * cos(radians(latitude)) * cos(radians(longitude) - 
-            radians(%s)) + sin(radians(%s)) * sin(radians(latitude)))) < %s 
+        "Latitude" BETWEEN %s AND %s
+        AND {lng_condition}
+        AND (6371 * acos(cos(radians(%s)) * cos(radians("Latitude")) * cos(radians("Longitude") - 
+            radians(%s)) + sin(radians(%s)) * sin(radians("Latitude")))) < %s 
+        {partition_filter}{hours_filter}
     ORDER BY distance;
     """
 
@@ -85,14 +101,37 @@ def find_nearby_restaurants_btree(lat, lng, radius_km):
         lat,
         lng,
         lat,
-        lat - lat_range,
-        lat + lat_range,
-        lng - lng_range,
-        lng + lng_range,
+        min_lat,
+        max_lat,
+        min_lng,
+        max_lng,
         lat,
         lng,
         lat,
         radius_km,
+        *partition_params,
+        *hours_params,
     )
 
-    return execute_query(query, params)
+    return execute_query(query, params, read_only=True)
+
+
+def find_nearby_restaurants_btree(lat, lng, radius_km, open_slot=None):
+    """
+    Find restaurants using B-tree indexes by first filtering with a bounding box.
+
+    Args:
+        lat (float): Latitude of center point
+        lng (float): Longitude of center point
+        radius_km (float): Search radius in kilometers
+        open_slot (int): Keep only restaurants open in this slot of the week
+
+    Returns:
+        list: Restaurants within the radius, ordered by distance
+    """
+    return find_nearby_btree("restaurants", lat, lng, radius_km, open_slot)
+
+
+def find_nearby_users_btree(lat, lng, radius_km):
+    """Find users using B-tree indexes by first filtering with a bounding box."""
+    return find_nearby_btree("users", lat, lng, radius_km)
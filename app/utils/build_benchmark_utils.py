@@ -0,0 +1,344 @@
+import io
+import os
+import time
+import random
+import statistics
+import h3
+from app.utils.db_utils import get_db_connection
+from app.utils.postgis_utils import populate_geometry_column
+from app.utils.h3_utils import H3_COLUMNS, populate_h3_columns
+
+# Indexes each indexing method adds to a spatial table, as (name suffix,
+# USING clause). The index of a table is named idx_{table}_{suffix}.
+METHOD_INDEXES = {
+    "basic": [],
+    "btree": [
+        ("latitude", 'btree ("Latitude")'),
+        ("longitude", 'btree ("Longitude")'),
+        ("lat_lng", 'btree ("Latitude", "Longitude")'),
+    ],
+    "postgis": [("geom", "GIST (geom)")],
+    "h3": [
+        (f"h3_res{resolution}", f"btree ({column})")
+        for resolution, column in H3_COLUMNS.items()
+    ],
+}
+
+# Dataset sizes measured by default, in rows
+BUILD_BENCHMARK_SIZES = [
+    int(size)
+    for size in os.environ.get("BUILD_BENCHMARK_SIZES", "10000,100000").split(",")
+    if size.strip()
+]
+
+# Single-row inserts and updates timed per method and size
+BUILD_BENCHMARK_WRITES = int(os.environ.get("BUILD_BENCHMARK_WRITES", 200))
+
+# Copies beyond the real restaurants are moved by up to this many degrees
+SYNTHETIC_JITTER_DEGREES = 0.01
+
+BENCHMARK_TABLE_PREFIX = "bench_build"
+
+
+def _load_source_rows():
+    """Read the restaurants used as the benchmark dataset."""
+    conn = get_db_connection(read_only=True)
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("""
+        SELECT "Name", "Cuisine", "Latitude", "Longitude"
+        FROM restaurants
+        WHERE "Latitude" IS NOT NULL AND "Longitude" IS NOT NULL
+        """)
+        return [
+            (name, cuisine, float(lat), float(lng))
+            for name, cuisine, lat, lng in cursor.fetchall()
+        ]
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def build_dataset(source_rows, num_rows, seed=0):
+    """
+    Build a dataset of a given size from the real restaurants.
+
+    Sizes beyond the number of restaurants repeat them with slightly moved
+    coordinates, so larger datasets keep the same spatial distribution.
+
+    Returns:
+        list: (id, name, cuisine, lat, lng) tuples
+    """
+    rng = random.Random(seed)
+    rows = []
+    for i in range(num_rows):
+        name, cuisine, lat, lng = source_rows[i % len(source_rows)]
+        if i >= len(source_rows):
+            lat = max(
+                -90.0, min(90.0, lat + rng.uniform(-1, 1) * SYNTHETIC_JITTER_DEGREES)
+            )
+            lng = max(
+                -180.0, min(180.0, lng + rng.uniform(-1, 1) * SYNTHETIC_JITTER_DEGREES)
+            )
+        rows.append((i + 1, name, cuisine, lat, lng))
+    return rows
+
+
+def _copy_text(value):
+    """Format a value for the COPY text format."""
+    if value is None:
+        return "\\N"
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
+def _bulk_load(cursor, table_name, rows):
+    """Create a benchmark table and COPY a dataset into it."""
+    cursor.execute(f"DROP TABLE IF EXISTS {table_name};")
+    cursor.execute(f"""
+    CREATE TABLE {table_name} (
+        "Restaurantid" INTEGER PRIMARY KEY,
+        "Name" TEXT,
+        "Cuisine" TEXT,
+        "Latitude" DECIMAL(15, 10),
+        "Longitude" DECIMAL(15, 10)
+    );
+    """)
+
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(_copy_text(value) for value in row) + "\n")
+    buffer.seek(0)
+
+    cursor.copy_expert(
+        f'COPY {table_name} ("Restaurantid", "Name", "Cuisine", "Latitude", '
+        f'"Longitude") FROM STDIN',
+        buffer,
+    )
+
+
+def _write_statement(method, table_name, operation):
+    """
+    Build the single-row insert or update of a method, keeping its derived
+    columns current the way the application would.
+
+    Returns:
+        tuple: (SQL, function mapping (id, lat, lng) to the parameters)
+    """
+    if method == "postgis":
+        derived_columns = ["geom"]
+        derived_values = ["ST_SetSRID(ST_MakePoint(%s, %s), 4326)"]
+
+        def derived_params(lat, lng):
+            return [lng, lat]
+
+    elif method == "h3":
+        derived_columns = list(H3_COLUMNS.values())
+        derived_values = ["%s"] * len(H3_COLUMNS)
+
+        def derived_params(lat, lng):
+            return [h3.geo_to_h3(lat, lng, resolution) for resolution in H3_COLUMNS]
+
+    else:
+        derived_columns = []
+        derived_values = []
+
+        def derived_params(lat, lng):
+            return []
+
+    if operation == "insert":
+        columns = ['"Restaurantid"', '"Name"', '"Latitude"', '"Longitude"']
+        columns += derived_columns
+        values = ["%s", "'benchmark'", "%s", "%s"] + derived_values
+        query = f"""
+        INSERT INTO {table_name} ({", ".join(columns)})
+        VALUES ({", ".join(values)})
+        """
+
+        def params(row_id, lat, lng):
+            return [row_id, lat, lng] + derived_params(lat, lng)
+
+    else:
+        assignments = ['"Latitude" = %s', '"Longitude" = %s']
+        assignments += [
+            f"{column} = {value}"
+            for column, value in zip(derived_columns, derived_values)
+        ]
+        query = f"""
+        UPDATE {table_name} SET {", ".join(assignments)}
+        WHERE "Restaurantid" = %s
+        """
+
+        def params(row_id, lat, lng):
+            return [lat, lng] + derived_params(lat, lng) + [row_id]
+
+    return query, params
+
+
+def _time_writes(conn, method, table_name, rows, num_writes, seed=0):
+    """
+    Time single-row inserts and updates, each in its own transaction.
+
+    Write amplification is reported as the WAL generated per write, which
+    grows with every index the row has to be added to.
+
+    Returns:
+        dict: Average and p95 latency of inserts and updates in milliseconds,
+            and the WAL bytes written per insert and update
+    """
+    rng = random.Random(seed)
+    cursor = conn.cursor()
+    results = {}
+
+    try:
+        for operation in ("insert", "update"):
+            query, params = _write_statement(method, table_name, operation)
+            latencies = []
+            cursor.execute("SELECT pg_current_wal_lsn()")
+            start_lsn = cursor.fetchone()[0]
+            for i in range(num_writes):
+                _, _, _, lat, lng = rows[rng.randrange(len(rows))]
+                if operation == "insert":
+                    row_id = len(rows) + i + 1
+                else:
+                    row_id = rng.randrange(len(rows)) + 1
+
+                start_time = time.time()
+                cursor.execute(query, params(row_id, lat, lng))
+                conn.commit()
+                latencies.append((time.time() - start_time) * 1000)
+
+            cursor.execute(
+                "SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), %s)", (start_lsn,)
+            )
+            wal_bytes = float(cursor.fetchone()[0])
+            conn.commit()
+
+            latencies.sort()
+            results[f"{operation}_ms"] = {
+                "avg": statistics.mean(latencies),
+                "p95": latencies[int(0.95 * (len(latencies) - 1))],
+            }
+            results[f"{operation}_wal_bytes"] = wal_bytes / num_writes
+    except Exception as e:
+        conn.rollback()
+        raise e
+    finally:
+        cursor.close()
+
+    return results
+
+
+def benchmark_method_build(method, rows, num_writes=BUILD_BENCHMARK_WRITES):
+    """
+    Measure what an indexing method costs to build, store and maintain.
+
+    Loads the dataset into a scratch table, computes the method's derived
+    columns, builds its indexes, reads their sizes and times single-row
+    writes with the indexes in place. The scratch table is dropped afterwards.
+
+    Args:
+        method (str): 'basic', 'btree', 'postgis' or 'h3'
+        rows (list): Dataset from build_dataset
+        num_writes (int): Inserts and updates to time
+
+    Returns:
+        dict: Load, derived column and index build times, table and index
+            sizes, and write latencies
+    """
+    table_name = f"{BENCHMARK_TABLE_PREFIX}_{method}"
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        start_time = time.time()
+        _bulk_load(cursor, table_name, rows)
+        conn.commit()
+        load_seconds = time.time() - start_time
+
+        start_time = time.time()
+        if method == "postgis":
+            populate_geometry_column(cursor, table_name)
+        elif method == "h3":
+            populate_h3_columns(cursor, table_name, "Restaurantid")
+        conn.commit()
+        derived_seconds = time.time() - start_time
+
+        indexes = {}
+        for suffix, using in METHOD_INDEXES[method]:
+            index_name = f"idx_{table_name}_{suffix}"
+            start_time = time.time()
+            cursor.execute(f"CREATE INDEX {index_name} ON {table_name} USING {using};")
+            conn.commit()
+            seconds = time.time() - start_time
+
+            cursor.execute("SELECT pg_relation_size(%s)", (index_name,))
+            indexes[index_name] = {"seconds": seconds, "bytes": cursor.fetchone()[0]}
+
+        cursor.execute(f"ANALYZE {table_name};")
+        cursor.execute(
+            "SELECT pg_table_size(%s), pg_relation_size(%s)",
+            (table_name, f"{table_name}_pkey"),
+        )
+        table_bytes, primary_key_bytes = cursor.fetchone()
+        conn.commit()
+
+        result = {
+            "method": method,
+            "rows": len(rows),
+            "load_seconds": load_seconds,
+            "derived_columns_seconds": derived_seconds,
+            "index_build_seconds": sum(i["seconds"] for i in indexes.values()),
+            "table_bytes": table_bytes,
+            "primary_key_bytes": primary_key_bytes,
+            "index_bytes": sum(i["bytes"] for i in indexes.values()),
+            "indexes": indexes,
+        }
+        result.update(_time_writes(conn, method, table_name, rows, num_writes))
+        return result
+    except Exception as e:
+        conn.rollback()
+        raise e
+    finally:
+        try:
+            cursor.execute(f"DROP TABLE IF EXISTS {table_name};")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+        cursor.close()
+        conn.close()
+
+
+def benchmark_index_builds(
+    methods=("basic", "btree", "postgis", "h3"),
+    sizes=BUILD_BENCHMARK_SIZES,
+    num_writes=BUILD_BENCHMARK_WRITES,
+):
+    """
+    Compare the build, storage and write costs of indexing methods across
+    dataset sizes.
+
+    Every method gets the same dataset of each size, so the results of one
+    size are directly comparable.
+
+    Args:
+        methods (tuple): Indexing methods to measure
+        sizes (list): Dataset sizes, in rows
+        num_writes (int): Inserts and updates timed per method and size
+
+    Returns:
+        list: One result per size and method, see benchmark_method_build
+    """
+    source_rows = _load_source_rows()
+    if not source_rows:
+        print("No restaurants to build the benchmark datasets from")
+        return []
+
+    report = []
+    for size in sizes:
+        rows = build_dataset(source_rows, size)
+        for method in methods:
+            print(f"Measuring {method} with {size} rows...")
+            report.append(benchmark_method_build(method, rows, num_writes))
+
+    return report
@@ -0,0 +1,377 @@
+import os
+import json
+import time
+import select
+import threading
+from app.utils.db_utils import DERIVED_COLUMNS, get_db_connection, reset_select_lists
+
+# Apply row changes of restaurants and ratings to the in-process caches as
+# they are committed, instead of waiting for TTLs or a restart
+CHANGE_FEED_ENABLED = os.environ.get("CHANGE_FEED_ENABLED", "true").lower() in (
+    "true",
+    "1",
+    "yes",
+)
+
+# NOTIFY channel the triggers publish row changes on
+CHANGE_FEED_CHANNEL = os.environ.get("CHANGE_FEED_CHANNEL", "restaurant_changes")
+
+# Changes arriving within this many seconds are applied together
+CHANGE_FEED_BATCH_DELAY = float(os.environ.get("CHANGE_FEED_BATCH_DELAY", 0.05))
+
+# Batches larger than this, e.g. from a bulk reload, reset the caches rather
+# than being applied row by row
+CHANGE_FEED_MAX_BATCH = int(os.environ.get("CHANGE_FEED_MAX_BATCH", 1000))
+
+# Longest wait between two reconnection attempts of the listener, in seconds
+CHANGE_FEED_MAX_BACKOFF = 30
+
+# Columns each trigger publishes, old and new values; the restaurants
+# trigger also publishes the partition column when the table is partitioned
+RESTAURANT_FEED_COLUMNS = ["Restaurantid", "Latitude", "Longitude"]
+RATING_FEED_COLUMNS = ["Placeid", "Rating"]
+
+_lock = threading.Lock()
+_listener = None
+_status = {
+    "connected": False,
+    "connected_at": None,
+    "last_change_at": None,
+    "changes": 0,
+    "batches": 0,
+    "resets": 0,
+    "reconnects": 0,
+}
+
+
+def _trigger_function_sql():
+    """
+    SQL of the trigger function publishing one row change. Its first
+    argument is the table name, which partitions would report as their own;
+    the others are the columns to publish.
+    """
+    return f"""
+    CREATE OR REPLACE FUNCTION notify_row_change() RETURNS trigger AS $$
+    DECLARE
+        payload jsonb := jsonb_build_object(
+            'table', TG_ARGV[0],
+            'op', TG_OP,
+            'at', extract(epoch FROM now())
+        );
+        col text;
+    BEGIN
+        IF TG_LEVEL = 'ROW' THEN
+            FOREACH col IN ARRAY TG_ARGV[1:] LOOP
+                IF TG_OP <> 'INSERT' THEN
+                    payload := payload || jsonb_build_object(
+                        'old_' || col, to_jsonb(OLD) -> col);
+                END IF;
+                IF TG_OP <> 'DELETE' THEN
+                    payload := payload || jsonb_build_object(
+                        'new_' || col, to_jsonb(NEW) -> col);
+                END IF;
+            END LOOP;
+        END IF;
+        PERFORM pg_notify('{CHANGE_FEED_CHANNEL}', payload::text);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """
+
+
+def _install_table_triggers(cursor, table_name, feed_columns):
+    """Create the row and truncate triggers of one table."""
+    cursor.execute(
+        """
+    SELECT column_name FROM information_schema.columns
+    WHERE table_name = %s AND table_schema = current_schema()
+    """,
+        (table_name,),
+    )
+    columns = [row[0] for row in cursor.fetchall()]
+    if not columns:
+        print(f"Table {table_name} doesn't exist, no change feed trigger created")
+        return
+
+    # Updates are published when a source column changes, so the indexing
+    # setups filling derived columns don't flood the channel
+    source_columns = [col for col in columns if col not in DERIVED_COLUMNS]
+    old_values = ", ".join(f'OLD."{col}"' for col in source_columns)
+    new_values = ", ".join(f'NEW."{col}"' for col in source_columns)
+    published = [table_name] + [col for col in feed_columns if col in columns]
+    arguments = ", ".join(f"'{col}'" for col in published)
+
+    for suffix in ["", "_update", "_truncate"]:
+        cursor.execute(
+            f"DROP TRIGGER IF EXISTS {table_name}_change_feed{suffix} ON {table_name}"
+        )
+
+    cursor.execute(f"""
+    CREATE TRIGGER {table_name}_change_feed
+    AFTER INSERT OR DELETE ON {table_name}
+    FOR EACH ROW EXECUTE FUNCTION notify_row_change({arguments})
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER {table_name}_change_feed_update
+    AFTER UPDATE ON {table_name}
+    FOR EACH ROW WHEN (ROW({old_values}) IS DISTINCT FROM ROW({new_values}))
+    EXECUTE FUNCTION notify_row_change({arguments})
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER {table_name}_change_feed_truncate
+    AFTER TRUNCATE ON {table_name}
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_row_change('{table_name}')
+    """)
+
+
+def install_change_feed():
+    """
+    Create the triggers publishing row changes of restaurants and ratings.
+
+    Tables recreated by a reload lose their triggers, so the loaders call
+    this again at the end. Running workers are told to reset their caches,
+    since changes made while the triggers were missing went unpublished.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(_trigger_function_sql())
+
+        restaurant_columns = list(RESTAURANT_FEED_COLUMNS)
+        cursor.execute("SELECT to_regclass('restaurant_partition_scheme')")
+        if cursor.fetchone()[0]:
+            cursor.execute("SELECT partition_column FROM restaurant_partition_scheme")
+            row = cursor.fetchone()
+            if row:
+                restaurant_columns.append(row[0])
+
+        _install_table_triggers(cursor, "restaurants", restaurant_columns)
+        _install_table_triggers(cursor, "ratings", RATING_FEED_COLUMNS)
+
+        notify_refresh(cursor, "*")
+        conn.commit()
+        print(f"Change feed triggers installed on channel {CHANGE_FEED_CHANNEL}")
+    except Exception as e:
+        conn.rollback()
+        print(f"Error installing change feed triggers: {e}")
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def notify_refresh(cursor, table_name):
+    """
+    Tell the listeners that a table was rebuilt as a whole, within the
+    transaction rebuilding it; '*' resets every cache.
+    """
+    cursor.execute(
+        "SELECT pg_notify(%s, %s)",
+        (
+            CHANGE_FEED_CHANNEL,
+            json.dumps({"table": table_name, "op": "REFRESH", "at": time.time()}),
+        ),
+    )
+
+
+def _row_changed_position(change):
+    """Check whether a restaurant change adds, removes or moves a point."""
+    return change["op"] != "UPDATE" or (
+        change.get("old_Latitude"),
+        change.get("old_Longitude"),
+    ) != (change.get("new_Latitude"), change.get("new_Longitude"))
+
+
+def _apply_row_changes(restaurants, ratings):
+    """Apply row changes of restaurants and ratings, oldest first."""
+    from app.utils import h3_utils, partition_utils, rating_utils
+    from app.utils import snapshot_utils, tile_utils
+
+    if restaurants:
+        snapshot_utils.apply_restaurant_changes(restaurants)
+        tile_utils.apply_restaurant_changes(restaurants)
+
+        moves = [change for change in restaurants if _row_changed_position(change)]
+        if moves:
+            h3_utils.apply_restaurant_changes(moves)
+            partition_utils.apply_restaurant_changes(moves)
+
+    if ratings:
+        rating_utils.apply_rating_changes(ratings)
+
+
+def apply_changes(changes):
+    """
+    Apply a batch of changes to the caches of this worker.
+
+    Row changes are applied incrementally. Truncates and rebuilds reset the
+    caches they invalidate, after the row changes published before them.
+
+    Args:
+        changes (list): Decoded notification payloads, oldest first
+    """
+    from app.utils import h3_utils, partition_utils
+
+    restaurants = []
+    ratings = []
+    for change in changes:
+        if change["op"] not in ("TRUNCATE", "REFRESH"):
+            if change["table"] == "restaurants":
+                restaurants.append(change)
+            elif change["table"] == "ratings":
+                ratings.append(change)
+            continue
+
+        _apply_row_changes(restaurants, ratings)
+        restaurants, ratings = [], []
+
+        table_name = change["table"]
+        if table_name in ("*", "restaurants", "ratings"):
+            reset_caches(table_name)
+        elif table_name == "restaurant_cell_aggregates":
+            h3_utils.reset_cell_counts()
+        elif table_name == "restaurant_partitions":
+            partition_utils.reset_partition_metadata()
+
+    _apply_row_changes(restaurants, ratings)
+
+
+def reset_caches(table_name="*"):
+    """
+    Drop the cached state of a table when its changes can't be applied
+    incrementally: after a truncate, a bulk load or a lost connection.
+
+    The snapshot overlay is kept: the changes it holds did happen, and the
+    loaders rebuild the snapshot itself.
+    """
+    from app.utils import h3_utils, partition_utils, rating_utils, tile_utils
+
+    with _lock:
+        _status["resets"] += 1
+
+    # A reload may have added or removed columns
+    reset_select_lists()
+
+    if table_name in ("*", "restaurants"):
+        h3_utils.reset_cell_counts()
+        partition_utils.reset_partition_metadata()
+        tile_utils.reset_tile_cache()
+    if table_name in ("*", "ratings"):
+        rating_utils.reset_rating_summaries()
+
+
+def _decode(notify):
+    try:
+        return json.loads(notify.payload)
+    except ValueError:
+        print(f"Ignoring malformed change notification: {notify.payload[:200]}")
+        return None
+
+
+def _listen(conn):
+    """Apply the changes published on the channel until the connection fails."""
+    while True:
+        if select.select([conn], [], [], 60) == ([], [], []):
+            # Idle; poll() detects a dropped connection
+            conn.poll()
+            continue
+
+        conn.poll()
+        # Changes committed together arrive in a burst
+        time.sleep(CHANGE_FEED_BATCH_DELAY)
+        conn.poll()
+
+        notifies = conn.notifies[:]
+        del conn.notifies[:]
+        if not notifies:
+            continue
+
+        if len(notifies) > CHANGE_FEED_MAX_BATCH:
+            print(f"{len(notifies)} changes at once, resetting the caches")
+            reset_caches()
+        else:
+            changes = [change for change in map(_decode, notifies) if change]
+            try:
+                apply_changes(changes)
+            except Exception as e:
+                print(f"Error applying changes, resetting the caches: {e}")
+                reset_caches()
+
+        with _lock:
+            _status["changes"] += len(notifies)
+            _status["batches"] += 1
+            _status["last_change_at"] = time.time()
+
+
+def _run_listener():
+    """Keep a LISTEN connection open, reconnecting with backoff."""
+    backoff = 1
+    while True:
+        conn = None
+        try:
+            # Notifications are only delivered on the primary
+            conn = get_db_connection()
+            conn.autocommit = True
+            cursor = conn.cursor()
+            cursor.execute(f"LISTEN {CHANGE_FEED_CHANNEL}")
+            cursor.close()
+
+            with _lock:
+                reconnected = _status["connected_at"] is not None
+                _status["connected"] = True
+                _status["connected_at"] = time.time()
+                if reconnected:
+                    _status["reconnects"] += 1
+
+            # Changes made while disconnected were missed
+            if reconnected:
+                reset_caches()
+            backoff = 1
+            _listen(conn)
+        except Exception as e:
+            print(f"Change feed listener disconnected: {e}")
+        finally:
+            with _lock:
+                _status["connected"] = False
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+        time.sleep(backoff)
+        backoff = min(backoff * 2, CHANGE_FEED_MAX_BACKOFF)
+
+
+def start_listener():
+    """Start the change feed listener of this worker in a background thread."""
+    global _listener
+
+    if not CHANGE_FEED_ENABLED:
+        return
+
+    with _lock:
+        if _listener is not None:
+            return
+        _listener = threading.Thread(
+            target=_run_listener, name="change-feed", daemon=True
+        )
+    _listener.start()
+
+
+def is_live():
+    """Check whether this worker currently receives changes."""
+    with _lock:
+        return _status["connected"]
+
+
+def get_change_feed_status():
+    """Report the listener's connection and the changes it applied."""
+    from app.utils.snapshot_utils import get_overlay_size
+
+    with _lock:
+        status = dict(_status)
+    status["enabled"] = CHANGE_FEED_ENABLED
+    status["channel"] = CHANGE_FEED_CHANNEL
+    status["snapshot_overlay_rows"] = get_overlay_size()
+    return status
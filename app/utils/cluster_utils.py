@@ -0,0 +1,254 @@
+import json
+import math
+import h3
+from psycopg2.extras import execute_values
+from app.utils.db_utils import get_db_connection
+
+# Supported physical orderings for the restaurants heap
+CLUSTER_METHODS = ["gist", "morton", "h3"]
+
+# Bits of precision per axis for the Morton (Z-order) key
+MORTON_BITS = 16
+
+
+def morton_key(lat, lng):
+    """
+    Compute a Morton (Z-order) key for a coordinate.
+
+    Latitude and longitude are quantized to MORTON_BITS bits each and their
+    bits are interleaved, so points that are close together on the map tend to
+    get numerically close keys.
+
+    Args:
+        lat (float): Latitude in decimal degrees
+        lng (float): Longitude in decimal degrees
+
+    Returns:
+        int: Interleaved key (2 * MORTON_BITS bits wide)
+    """
+    scale = (1 << MORTON_BITS) - 1
+    lat_q = int(round((min(max(lat, -90.0), 90.0) + 90.0) / 180.0 * scale))
+    lng_q = int(round((min(max(lng, -180.0), 180.0) + 180.0) / 360.0 * scale))
+
+    key = 0
+    for bit in range(MORTON_BITS):
+        key |= ((lng_q >> bit) & 1) << (2 * bit)
+        key |= ((lat_q >> bit) & 1) << (2 * bit + 1)
+
+    return key
+
+
+def h3_sort_key(lat, lng, resolution=10):
+    """
+    Compute a sort key from the H3 cell containing a coordinate.
+
+    H3 indexes are hierarchical, so sorting by the integer value of a fine
+    cell groups rows by their parent cells as well.
+
+    Args:
+        lat (float): Latitude in decimal degrees
+        lng (float): Longitude in decimal degrees
+        resolution (int): H3 resolution of the cell
+
+    Returns:
+        int: H3 index as an integer
+    """
+    return int(h3.geo_to_h3(lat, lng, resolution), 16)
+
+
+def _collect_heap_blocks(plan):
+    """Sum heap block counters of a plan node and all of its children."""
+    blocks = plan.get("Exact Heap Blocks", 0) + plan.get("Lossy Heap Blocks", 0)
+    for child in plan.get("Plans", []):
+        blocks += _collect_heap_blocks(child)
+    return blocks
+
+
+def measure_heap_blocks(sample_points, radius_km=5.0):
+    """
+    Measure the blocks touched by bounding-box radius queries.
+
+    Each sample point is queried with EXPLAIN (ANALYZE, BUFFERS) so the counts
+    reflect the actual execution rather than planner estimates.
+
+    Args:
+        sample_points (list): (lat, lng) tuples to use as query centers
+        radius_km (float): Search radius in kilometers
+
+    Returns:
+        dict: Per-query and total block counts
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    lat_range = radius_km / 111.0
+
+    query = """
+    EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)
+    SELECT * FROM restaurants
+    WHERE "Latitude" BETWEEN %s AND %s
+    AND "Longitude" BETWEEN %s AND %s
+    """
+
+    queries = []
+    try:
+        for lat, lng in sample_points:
+            lng_range = radius_km / (
+                111.0 * max(abs(math.cos(math.radians(lat))), 0.01)
+            )
+            cursor.execute(
+                query,
+                (lat - lat_range, lat + lat_range, lng - lng_range, lng + lng_range),
+            )
+            explain = cursor.fetchone()[0]
+            if isinstance(explain, str):
+                explain = json.loads(explain)
+
+            # Buffer counters of the root node already include its children
+            plan = explain[0]["Plan"]
+            queries.append(
+                {
+                    "center": {"lat": lat, "lng": lng},
+                    "shared_hit_blocks": plan.get("Shared Hit Blocks", 0),
+                    "shared_read_blocks": plan.get("Shared Read Blocks", 0),
+                    "heap_blocks": _collect_heap_blocks(plan),
+                }
+            )
+
+        conn.rollback()
+    finally:
+        cursor.close()
+        conn.close()
+
+    return {
+        "radius_km": radius_km,
+        "queries": queries,
+        "total_shared_hit_blocks": sum(q["shared_hit_blocks"] for q in queries),
+        "total_shared_read_blocks": sum(q["shared_read_blocks"] for q in queries),
+        "total_heap_blocks": sum(q["heap_blocks"] for q in queries),
+    }
+
+
+def get_sample_points(num_points=20):
+    """Pick restaurant coordinates spread over the table to use as query centers."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(
+            """
+        SELECT "Latitude", "Longitude" FROM restaurants
+        ORDER BY md5("Restaurantid"::text)
+        LIMIT %s
+        """,
+            (num_points,),
+        )
+        return [(float(lat), float(lng)) for lat, lng in cursor.fetchall()]
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _populate_sort_key(cursor, method):
+    """Fill the spatial_sort_key column using the requested ordering."""
+    cursor.execute("""
+    ALTER TABLE restaurants ADD COLUMN IF NOT EXISTS spatial_sort_key BIGINT;
+    """)
+
+    cursor.execute('SELECT "Restaurantid", "Latitude", "Longitude" FROM restaurants')
+    rows = cursor.fetchall()
+
+    # H3 indexes keep their highest bit clear, so both keys fit in a BIGINT
+    key_func = morton_key if method == "morton" else h3_sort_key
+
+    keys = [
+        (restaurant_id, key_func(float(lat), float(lng)))
+        for restaurant_id, lat, lng in rows
+    ]
+
+    execute_values(
+        cursor,
+        """
+    UPDATE restaurants AS r
+    SET spatial_sort_key = v.sort_key
+    FROM (VALUES %s) AS v (restaurant_id, sort_key)
+    WHERE r."Restaurantid" = v.restaurant_id
+    """,
+        keys,
+    )
+
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_restaurants_spatial_sort_key
+    ON restaurants USING btree (spatial_sort_key);
+    """)
+
+    return len(keys)
+
+
+def cluster_restaurants_table(method="morton", create_brin=False):
+    """
+    Rewrite the restaurants table in spatial order.
+
+    Args:
+        method (str): 'gist' to CLUSTER on the PostGIS index, or 'morton'/'h3'
+            to CLUSTER on a precomputed spatial sort key
+        create_brin (bool): Also create BRIN indexes that exploit the new order
+
+    Returns:
+        bool: True if the table was rewritten
+    """
+    if method not in CLUSTER_METHODS:
+        print(f"Error: Unknown clustering method '{method}'")
+        return False
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        if method == "gist":
+            cursor.execute("""
+            SELECT 1 FROM pg_indexes
+            WHERE tablename = 'restaurants' AND indexname = 'idx_restaurants_geom'
+            """)
+            if cursor.fetchone() is None:
+                print("Error: GIST index missing, run the PostGIS initialization first")
+                return False
+
+            cursor.execute("CLUSTER restaurants USING idx_restaurants_geom;")
+        else:
+            row_count = _populate_sort_key(cursor, method)
+            print(f"Computed {method} sort keys for {row_count} restaurants")
+
+            cursor.execute(
+                "CLUSTER restaurants USING idx_restaurants_spatial_sort_key;"
+            )
+
+        if create_brin:
+            # Queries filter on coordinates rather than on the sort key itself,
+            # so the BRIN summaries cover the coordinate columns whose
+            # per-block ranges become narrow once rows are stored in order.
+            cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_restaurants_lat_lng_brin
+            ON restaurants USING brin ("Latitude", "Longitude")
+            WITH (pages_per_range = 16);
+            """)
+
+            if method != "gist":
+                cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_restaurants_spatial_sort_key_brin
+                ON restaurants USING brin (spatial_sort_key)
+                WITH (pages_per_range = 16);
+                """)
+
+        cursor.execute("ANALYZE restaurants;")
+
+        conn.commit()
+        print(f"Restaurants table clustered using '{method}' ordering")
+        return True
+    except Exception as e:
+        conn.rollback()
+        print(f"Error clustering restaurants table: {e}")
+        return False
+    finally:
+        cursor.close()
+        conn.close()
@@ -0,0 +1,128 @@
+import os
+import threading
+import psycopg2.errors
+from app.utils.db_utils import QueryDeadlineExceeded, get_statement_timeout_ms
+
+# Concurrent identical searches share one backend execution. Disable to let
+# every request run its own query.
+COALESCE_SEARCHES = os.environ.get("COALESCE_SEARCHES", "true").lower() in (
+    "true",
+    "1",
+    "yes",
+)
+
+# Errors of a leader that ran out of its own time, which a follower with
+# more time left retries instead of sharing
+DEADLINE_ERRORS = (QueryDeadlineExceeded, psycopg2.errors.QueryCanceled)
+
+_lock = threading.Lock()
+_flights = {}
+_stats = {}
+
+
+class _Flight:
+    """One backend execution and the requests waiting for its result."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+def _record(method, followers):
+    """Count an execution and the requests it coalesced. Needs _lock."""
+    stats = _stats.setdefault(
+        method,
+        {
+            "executions": 0,
+            "coalesced_requests": 0,
+            "coalesced_executions": 0,
+            "max_coalesced": 0,
+        },
+    )
+    stats["executions"] += 1
+    stats["coalesced_requests"] += followers
+    if followers:
+        stats["coalesced_executions"] += 1
+    stats["max_coalesced"] = max(stats["max_coalesced"], followers)
+
+
+def coalesce(key, func, *args):
+    """
+    Run a search once for all concurrent callers with the same key.
+
+    The first caller runs the function; callers arriving while it runs wait
+    for it and get its result, or its exception. Followers get their own copy
+    of a list result, so callers can't change each other's results.
+
+    Followers wait no longer than their own request deadline. When the leader
+    fails on its deadline, a follower runs the search again as the leader of
+    a new execution, so a request with a short deadline can't fail the
+    identical requests that have more time.
+
+    Args:
+        key (tuple): Identity of the search; its second element is the
+            indexing method, under which the execution is counted
+        func (callable): Search to run
+        *args: Arguments of the search
+
+    Returns:
+        tuple: (result, True if this caller ran the search)
+
+    Raises:
+        QueryDeadlineExceeded: If the deadline of a follower passes while it
+            waits
+    """
+    if not COALESCE_SEARCHES:
+        return func(*args), True
+
+    while True:
+        with _lock:
+            flight = _flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _flights[key] = _Flight()
+            else:
+                flight.followers += 1
+
+        if leader:
+            break
+
+        timeout_ms = get_statement_timeout_ms()
+        if not flight.done.wait(None if timeout_ms is None else timeout_ms / 1000):
+            raise QueryDeadlineExceeded("Request deadline exceeded")
+        if isinstance(flight.error, DEADLINE_ERRORS):
+            continue
+        if flight.error is not None:
+            raise flight.error
+        result = flight.result
+        return (list(result) if isinstance(result, list) else result), False
+
+    try:
+        flight.result = func(*args)
+        return flight.result, True
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _lock:
+            del _flights[key]
+            _record(key[1], flight.followers)
+        flight.done.set()
+
+
+def get_coalescing_stats():
+    """Report how many requests the executions of each method coalesced."""
+    with _lock:
+        methods = {}
+        for method, stats in sorted(_stats.items()):
+            methods[method] = dict(stats)
+            methods[method]["avg_coalesced"] = (
+                stats["coalesced_requests"] / stats["executions"]
+            )
+        return {
+            "enabled": COALESCE_SEARCHES,
+            "in_flight": len(_flights),
+            "methods": methods,
+        }
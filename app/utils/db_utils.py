@@ -1,6 +1,7 @@
 import os
 import time
 import math
+import threading
 import psycopg2
 from psycopg2.extras import RealDictCursor
 
@@ -11,9 +12,85 @@ DB_NAME = os.environ.get("DB_NAME", "restaurants")
 DB_USER = os.environ.get("DB_USER", "postgres")
 DB_PASSWORD = os.environ.get("DB_PASSWORD", "postgres")
 
+# Tables with "Latitude"/"Longitude" columns that are spatially indexed, and
+# their primary key column
+SPATIAL_TABLES = {"restaurants": "Restaurantid", "users": "Userid"}
+
+# Columns computed from the CSV data by the indexing setups. Loaders reset
+# them on changed rows so they are recomputed, and the change feed doesn't
+# publish updates that only touch them.
+DERIVED_COLUMNS = [
+    "geom",
+    "h3_index_res8",
+    "h3_index_res9",
+    "h3_index_res10",
+    "spatial_sort_key",
+    "h3_partition_cell",
+    "opening_hours",
+]
+
+# Columns the queries serving API rows leave out; the opening hours bitmap
+# is only tested inside the searches
+HIDDEN_COLUMNS = ["opening_hours"]
+
+# How long each worker caches the select list of a table
+SELECT_LIST_TTL = 60
+
+# Deadline of the queries of the current thread, as a time.monotonic() value;
+# set per request by the admission control
+_query_deadline = threading.local()
+
+_select_lists_lock = threading.Lock()
+_select_lists = {}
+
+
+class QueryDeadlineExceeded(Exception):
+    """Raised when a query would start after the deadline of its request."""
+
+
+def set_query_deadline(deadline):
+    """Set the deadline of the queries run by this thread, None for no deadline."""
+    _query_deadline.value = deadline
+
+
+def get_statement_timeout_ms():
+    """
+    Get the time left until this thread's query deadline.
+
+    Returns:
+        int: Milliseconds for statement_timeout, or None without a deadline
+
+    Raises:
+        QueryDeadlineExceeded: If the deadline has passed
+    """
+    deadline = getattr(_query_deadline, "value", None)
+    if deadline is None:
+        return None
+
+    remaining_ms = int((deadline - time.monotonic()) * 1000)
+    if remaining_ms <= 0:
+        raise QueryDeadlineExceeded("Request deadline exceeded")
+    return remaining_ms
+
+
+def get_db_connection(read_only=False):
+    """
+    Create a database connection with retry logic.
+
+    Read-only connections go to a read replica when DB_REPLICA_HOSTS is set,
+    falling back to the primary if no replica is healthy and caught up.
+    Writes and index initialization always use the primary.
+    """
+    if read_only:
+        from app.utils.replica_utils import has_replicas, get_replica_connection
+
+        if has_replicas():
+            conn = get_replica_connection(
+                {"dbname": DB_NAME, "user": DB_USER, "password": DB_PASSWORD}
+            )
+            if conn is not None:
+                return conn
 
-def get_db_connection():
-    """Create a database connection with retry logic."""
     max_retries = 10
     retry_delay = 1  # seconds
 
@@ -50,15 +127,57 @@ def get_db_connection_with_retry():
     return get_db_connection()
 
 
-def execute_query(query, params=None, fetch_all=True, dict_cursor=True):
-    """Execute a database query and return results."""
-    conn = get_db_connection()
+def execute_query(
+    query, params=None, fetch_all=True, dict_cursor=True, read_only=False
+):
+    """
+    Execute a database query and return results.
+
+    Pass read_only=True for queries that may be served by a read replica.
+    Within a request with a deadline, the query's statement_timeout is the
+    time left until the deadline. Read-only queries are hedged when
+    DB_HEDGE_READS is enabled.
+    """
+    timeout_ms = get_statement_timeout_ms()
+
+    if read_only:
+        from app.utils.hedge_utils import DB_HEDGE_READS, execute_hedged
+
+        if DB_HEDGE_READS:
+            return execute_hedged(query, params, fetch_all, dict_cursor, timeout_ms)
+
+    conn = get_db_connection(read_only=read_only)
+    return run_query(conn, query, params, fetch_all, dict_cursor, timeout_ms)
+
+
+def run_query(
+    conn, query, params=None, fetch_all=True, dict_cursor=True, timeout_ms=None
+):
+    """
+    Run a query on an open connection, commit it and close the connection.
+
+    Args:
+        conn: Connection from get_db_connection
+        query (str): SQL to run
+        params: Query parameters
+        fetch_all (bool): Return all rows, or only the first one
+        dict_cursor (bool): Return rows as dicts
+        timeout_ms (int): statement_timeout of the query, None for the default
+
+    Returns:
+        list or row: Query results
+    """
+    replica_name = getattr(conn, "replica_name", None)
+    start_time = time.time()
+
     if dict_cursor:
         cursor = conn.cursor(cursor_factory=RealDictCursor)
     else:
         cursor = conn.cursor()
 
     try:
+        if timeout_ms is not None:
+            cursor.execute("SET LOCAL statement_timeout = %s", (timeout_ms,))
         cursor.execute(query, params or ())
 
         if fetch_all:
@@ -67,6 +186,12 @@ def execute_query(query, params=None, fetch_all=True, dict_cursor=True):
             result = cursor.fetchone()
 
         conn.commit()
+
+        if replica_name:
+            from app.utils.replica_utils import record_replica_latency
+
+            record_replica_latency(replica_name, time.time() - start_time)
+
         return result
     except Exception as e:
         conn.rollback()
@@ -76,6 +201,50 @@ def execute_query(query, params=None, fetch_all=True, dict_cursor=True):
         conn.close()
 
 
+def get_select_list(table_name, alias=None):
+    """
+    Get the select list of a table's columns without HIDDEN_COLUMNS.
+
+    Args:
+        table_name (str): Table selected from
+        alias (str): Alias of the table in the query, if any
+
+    Returns:
+        str: Quoted column list, or '*' if the table has no hidden column
+    """
+    with _select_lists_lock:
+        cached = _select_lists.get(table_name)
+    if cached is None or time.time() - cached[0] >= SELECT_LIST_TTL:
+        rows = execute_query(
+            """
+        SELECT column_name FROM information_schema.columns
+        WHERE table_name = %s AND table_schema = current_schema()
+        ORDER BY ordinal_position
+        """,
+            (table_name,),
+            read_only=True,
+        )
+        columns = [row["column_name"] for row in rows]
+        if not any(column in HIDDEN_COLUMNS for column in columns):
+            columns = None
+        cached = (time.time(), columns)
+        with _select_lists_lock:
+            _select_lists[table_name] = cached
+
+    prefix = f"{alias}." if alias else ""
+    if cached[1] is None:
+        return f"{prefix}*"
+    return ", ".join(
+        f'{prefix}"{column}"' for column in cached[1] if column not in HIDDEN_COLUMNS
+    )
+
+
+def reset_select_lists():
+    """Read the columns of every table again on next use."""
+    with _select_lists_lock:
+        _select_lists.clear()
+
+
 def haversine_distance(lat1, lon1, lat2, lon2):
     """
     Calculate the great circle distance between two points
@@ -95,3 +264,37 @@ def haversine_distance(lat1, lon1, lat2, lon2):
     r = 6371  # Radius of earth in kilometers
 
     return c * r
+
+
+def bounding_box(lat, lng, radius_km):
+    """
+    Get the latitude/longitude box enclosing a circle on the sphere.
+
+    The longitude half-width is exact rather than radius / (111 * cos(lat)),
+    which is too narrow at high latitudes and undefined at the poles. A
+    circle reaching over a pole spans every longitude, and a box crossing
+    the antimeridian is returned with min_lng greater than max_lng.
+
+    Returns:
+        tuple: (min_lat, max_lat, min_lng, max_lng) in degrees
+    """
+    angular = radius_km / 6371
+    lat_range = math.degrees(angular)
+    min_lat = lat - lat_range
+    max_lat = lat + lat_range
+
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90.0), min(max_lat, 90.0), -180.0, 180.0
+
+    lng_range = math.degrees(math.asin(math.sin(angular) / math.cos(math.radians(lat))))
+    if lng_range >= 180:
+        return min_lat, max_lat, -180.0, 180.0
+
+    min_lng = lng - lng_range
+    max_lng = lng + lng_range
+    if min_lng < -180:
+        min_lng += 360
+    if max_lng > 180:
+        max_lng -= 360
+
+    return min_lat, max_lat, min_lng, max_lng
@@ -0,0 +1,245 @@
+import io
+import os
+import uuid
+import datetime
+from decimal import Decimal
+import psycopg2.extensions
+from app.utils.db_utils import HIDDEN_COLUMNS, get_db_connection
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Rows fetched from the server-side cursor and written per Arrow record
+# batch or MessagePack message
+EXPORT_BATCH_ROWS = int(os.environ.get("EXPORT_BATCH_ROWS", 10000))
+
+# Tables that can be exported whole
+EXPORT_TABLES = ["restaurants", "users", "ratings"]
+
+# Derived columns left out of table exports; geometries would be sent as
+# hex-encoded EWKB, which no consumer wants, and hidden columns never leave
+# the database
+EXPORT_EXCLUDED_COLUMNS = {"geom", *HIDDEN_COLUMNS}
+
+# Media type of each export format
+EXPORT_FORMATS = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "msgpack": "application/x-msgpack",
+}
+
+# NUMERIC columns are read as floats, which Arrow and pandas store natively,
+# instead of Decimal objects
+_NUMERIC_AS_FLOAT = psycopg2.extensions.new_type(
+    psycopg2.extensions.DECIMAL.values,
+    "NUMERIC_AS_FLOAT",
+    lambda value, cursor: float(value) if value is not None else None,
+)
+
+
+def get_available_formats():
+    """List the export formats whose module is installed."""
+    installed = {"arrow": pa is not None, "msgpack": msgpack is not None}
+    return [name for name in EXPORT_FORMATS if installed[name]]
+
+
+def _plain_value(value):
+    """Convert a value to a type every export format can encode."""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+def _msgpack_default(value):
+    """Convert the values MessagePack can't encode itself."""
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    value = _plain_value(value)
+    if isinstance(value, (float, str)):
+        return value
+    raise TypeError(f"Object of type {type(value).__name__} can't be exported")
+
+
+def iter_table_batches(table_name, batch_rows=EXPORT_BATCH_ROWS):
+    """
+    Read a whole table in batches through a server-side cursor, so only one
+    batch is held in memory at a time.
+
+    Args:
+        table_name (str): One of EXPORT_TABLES
+        batch_rows (int): Rows per batch
+
+    Yields:
+        tuple: (column names, list of row tuples), at least once even for an
+            empty table
+    """
+    if table_name not in EXPORT_TABLES:
+        raise ValueError(f"Table '{table_name}' can't be exported")
+
+    conn = get_db_connection(read_only=True)
+    psycopg2.extensions.register_type(_NUMERIC_AS_FLOAT, conn)
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(
+            """
+        SELECT column_name FROM information_schema.columns
+        WHERE table_name = %s
+        ORDER BY ordinal_position
+        """,
+            (table_name,),
+        )
+        columns = [
+            row[0] for row in cursor.fetchall() if row[0] not in EXPORT_EXCLUDED_COLUMNS
+        ]
+        cursor.close()
+
+        # Named cursors stay on the server and are read batch by batch
+        cursor = conn.cursor(name=f"export_{table_name}")
+        cursor.itersize = batch_rows
+        column_list = ", ".join(f'"{column}"' for column in columns)
+        cursor.execute(f"SELECT {column_list} FROM {table_name}")
+
+        rows = cursor.fetchmany(batch_rows)
+        yield columns, rows
+        while len(rows) == batch_rows:
+            rows = cursor.fetchmany(batch_rows)
+            if rows:
+                yield columns, rows
+    finally:
+        cursor.close()
+        conn.rollback()
+        conn.close()
+
+
+def iter_row_batches(rows, batch_rows=EXPORT_BATCH_ROWS):
+    """
+    Split search results into export batches.
+
+    Args:
+        rows (list): Result dicts, all with the same keys
+        batch_rows (int): Rows per batch
+
+    Yields:
+        tuple: (column names, list of row tuples), at least once
+    """
+    columns = list(rows[0].keys()) if rows else []
+    for start in range(0, max(len(rows), 1), batch_rows):
+        yield columns, [
+            tuple(_plain_value(row[column]) for column in columns)
+            for row in rows[start : start + batch_rows]
+        ]
+
+
+def _arrow_type(values):
+    """Pick the Arrow type of a column from its first non-null value."""
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            return pa.bool_()
+        if isinstance(value, int):
+            return pa.int64()
+        if isinstance(value, float):
+            return pa.float64()
+        if isinstance(value, datetime.datetime):
+            return pa.timestamp("us")
+        if isinstance(value, datetime.date):
+            return pa.date32()
+        break
+    return pa.string()
+
+
+def _arrow_array(values, arrow_type):
+    if arrow_type == pa.string():
+        values = [None if value is None else str(value) for value in values]
+    return pa.array(values, type=arrow_type)
+
+
+def stream_arrow(batches):
+    """
+    Encode batches as an Arrow IPC stream.
+
+    The schema is taken from the first batch; a column that is empty in it is
+    exported as strings.
+
+    Yields:
+        bytes: The schema message, then one record batch per input batch
+    """
+    sink = io.BytesIO()
+    writer = None
+
+    for columns, rows in batches:
+        values = list(zip(*rows)) if rows else [[] for _ in columns]
+        if writer is None:
+            schema = pa.schema(
+                [
+                    (column, _arrow_type(column_values))
+                    for column, column_values in zip(columns, values)
+                ]
+            )
+            writer = pa.ipc.new_stream(sink, schema)
+
+        writer.write_batch(
+            pa.record_batch(
+                [
+                    _arrow_array(column_values, field.type)
+                    for column_values, field in zip(values, schema)
+                ],
+                schema=schema,
+            )
+        )
+        yield sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+
+    if writer is not None:
+        writer.close()
+        yield sink.getvalue()
+
+
+def stream_msgpack(batches):
+    """
+    Encode batches as a sequence of MessagePack objects.
+
+    The first object is {"columns": [...]}, each following one a list of
+    rows, every row a list of values in column order.
+
+    Yields:
+        bytes: One MessagePack object per message
+    """
+    packer = msgpack.Packer(default=_msgpack_default)
+    header_sent = False
+
+    for columns, rows in batches:
+        if not header_sent:
+            yield packer.pack({"columns": columns})
+            header_sent = True
+        if rows:
+            yield packer.pack([list(row) for row in rows])
+
+
+def stream_export(batches, export_format):
+    """
+    Encode export batches in the requested format.
+
+    Args:
+        batches: Iterator of (column names, row tuples), see iter_table_batches
+        export_format (str): 'arrow' or 'msgpack'
+
+    Returns:
+        iterator: Encoded chunks of the response body
+    """
+    if export_format == "arrow":
+        return stream_arrow(batches)
+    if export_format == "msgpack":
+        return stream_msgpack(batches)
+    raise ValueError(f"Unsupported export format: {export_format}")
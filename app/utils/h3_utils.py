@@ -1,7 +1,53 @@
+import os
 import h3
 import math
-from psycopg2.extras import RealDictCursor
-from app.utils.db_utils import get_db_connection, execute_query
+import time
+import threading
+from collections import Counter, OrderedDict
+from psycopg2.extras import RealDictCursor, execute_values
+from app.utils.db_utils import (
+    SPATIAL_TABLES,
+    get_db_connection,
+    execute_query,
+    get_select_list,
+)
+from app.utils.partition_utils import get_partition_filter
+from app.utils.hours_utils import open_filter
+from app.utils.changefeed_utils import notify_refresh
+
+# Resolutions with precomputed restaurant clusters, used by the map viewport
+AGGREGATE_RESOLUTIONS = list(range(3, 11))
+
+# Resolutions stored as columns. Coarser cells are looked up as ranges of the
+# res8 column, since the indexes of a cell's descendants are contiguous.
+H3_COLUMNS = {8: "h3_index_res8", 9: "h3_index_res9", 10: "h3_index_res10"}
+RANGE_RESOLUTION = 8
+
+# Relative cost of probing one cell and of fetching one row, used by the
+# planner to pick the cheapest resolution
+H3_PLANNER_CELL_COST = float(os.environ.get("H3_PLANNER_CELL_COST", 1.0))
+H3_PLANNER_ROW_COST = float(os.environ.get("H3_PLANNER_ROW_COST", 1.0))
+
+# Resolutions that would need more cells than this are not considered
+H3_PLANNER_MAX_CELLS = int(os.environ.get("H3_PLANNER_MAX_CELLS", 2000))
+
+# Without cell counts, the finest resolution covering the circle within this
+# many rings is used
+H3_PLANNER_DEFAULT_RINGS = 3
+
+# How long the per-cell restaurant counts are cached
+H3_PLANNER_STATS_TTL = float(os.environ.get("H3_PLANNER_STATS_TTL", 300))
+
+PLAN_CACHE_SIZE = 256
+
+_planner_lock = threading.Lock()
+_cell_counts = None
+_cell_counts_loaded_at = 0.0
+_plan_cache = OrderedDict()
+
+# Restaurants added or removed per cell by changes published since the
+# aggregates were last refreshed: {resolution: {cell: delta}}
+_cell_count_deltas = {}
 
 
 def get_h3_resolution_for_radius(radius_km):
@@ -43,131 +89,587 @@ def get_h3_resolution_for_radius(radius_km):
     return min(15, closest_res + 1)  # Max resolution is 15
 
 
+def populate_h3_columns(cursor, table_name, id_column):
+    """
+    Add the H3 index columns to a table and fill the rows where they are NULL.
+
+    Args:
+        cursor: Database cursor, committed by the caller
+        table_name (str): 'restaurants' or 'users'
+        id_column (str): Primary key column of the table
+
+    Returns:
+        int: Number of rows filled
+    """
+    # Check if H3 columns exist
+    cursor.execute(
+        """
+    SELECT column_name FROM information_schema.columns 
+    WHERE table_name = %s AND column_name = 'h3_index_res8'
+    """,
+        (table_name,),
+    )
+    h3_exists = cursor.fetchone() is not None
+
+    if not h3_exists:
+        # Add H3 index columns
+        cursor.execute(f"""
+        ALTER TABLE {table_name} 
+        ADD COLUMN h3_index_res8 TEXT,
+        ADD COLUMN h3_index_res9 TEXT,
+        ADD COLUMN h3_index_res10 TEXT;
+        """)
+
+    # Update H3 indexes for rows where they are NULL
+    cursor.execute(f"""
+    SELECT "{id_column}", "Latitude", "Longitude" 
+    FROM {table_name} 
+    WHERE h3_index_res8 IS NULL OR h3_index_res9 IS NULL OR h3_index_res10 IS NULL
+    """)
+    rows = cursor.fetchall()
+
+    values = [
+        (
+            row_id,
+            h3.geo_to_h3(lat, lng, 8),
+            h3.geo_to_h3(lat, lng, 9),
+            h3.geo_to_h3(lat, lng, 10),
+        )
+        for row_id, lat, lng in rows
+    ]
+
+    # Write the cells in batches instead of one UPDATE per row
+    execute_values(
+        cursor,
+        f"""
+    UPDATE {table_name} t
+    SET h3_index_res8 = v.res8, h3_index_res9 = v.res9, h3_index_res10 = v.res10
+    FROM (VALUES %s) AS v (row_id, res8, res9, res10)
+    WHERE t."{id_column}" = v.row_id
+    """,
+        values,
+        page_size=1000,
+    )
+
+    return len(rows)
+
+
 def initialize_h3_indexes():
-    """Add H3 index columns and populate with H3 indexes."""
+    """Add H3 index columns to restaurants and users and populate them."""
     conn = get_db_connection()
     cursor = conn.cursor()
 
     try:
-        # Check if H3 columns exist
-        cursor.execute("""
-        SELECT column_name FROM information_schema.columns 
-        WHERE table_name = 'restaurants' AND column_name = 'h3_index_res8'
-        """)
-        h3_exists = cursor.fetchone() is not None
-
-        if not h3_exists:
-            # Add H3 index columns
-            cursor.execute("""
-            ALTER TABLE restaurants 
-            ADD COLUMN h3_index_res8 TEXT,
-            ADD COLUMN h3_index_res9 TEXT,
-            ADD COLUMN h3_index_res10 TEXT;
-            """)
-
-        # Update H3 indexes for rows where they are NULL
-        cursor.execute("""
-        SELECT "Restaurantid", "Latitude", "Longitude" 
-        FROM restaurants 
-        WHERE h3_index_res8 IS NULL OR h3_index_res9 IS NULL OR h3_index_res10 IS NULL
-        """)
-        restaurants = cursor.fetchall()
+        for table_name, id_column in SPATIAL_TABLES.items():
+            filled = populate_h3_columns(cursor, table_name, id_column)
 
-        for restaurant in restaurants:
-            restaurant_id, lat, lng = restaurant
+            # Create B-tree indexes on H3 columns for efficient querying
+            for resolution in H3_COLUMNS:
+                cursor.execute(f"""
+                CREATE INDEX IF NOT EXISTS idx_{table_name}_h3_res{resolution} 
+                ON {table_name} USING btree (h3_index_res{resolution});
+                """)
 
-            h3_index_res8 = h3.geo_to_h3(lat, lng, 8)
-            h3_index_res9 = h3.geo_to_h3(lat, lng, 9)
-            h3_index_res10 = h3.geo_to_h3(lat, lng, 10)
+            print(f"H3 indexes created and updated for {filled} {table_name}")
+
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Error initializing H3 indexes: {e}")
+    finally:
+        cursor.close()
+        conn.close()
+
+    # Clusters depend on the H3 columns, so rebuild them afterwards
+    refresh_cell_aggregates()
 
-            cursor.execute(
-                """
-            UPDATE restaurants
-            SET h3_index_res8 = %s, h3_index_res9 = %s, h3_index_res10 = %s
-            WHERE "Restaurantid" = %s
-            """,
-                (h3_index_res8, h3_index_res9, h3_index_res10, restaurant_id),
-            )
 
-        # Create B-tree indexes on H3 columns for efficient querying
+def refresh_cell_aggregates():
+    """
+    Precompute restaurant clusters per H3 cell for every aggregate resolution.
+
+    Each cluster holds the restaurant count, centroid and most common cuisine
+    of one cell. Coarser cells are the parents of the res10 index, so all
+    resolutions are built from a single read of the table.
+
+    Returns:
+        int: Number of clusters written
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
         cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_restaurants_h3_res8 
-        ON restaurants USING btree (h3_index_res8);
+        CREATE TABLE IF NOT EXISTS restaurant_cell_aggregates (
+            resolution INTEGER NOT NULL,
+            h3_cell TEXT NOT NULL,
+            restaurant_count INTEGER NOT NULL,
+            centroid_lat DOUBLE PRECISION NOT NULL,
+            centroid_lng DOUBLE PRECISION NOT NULL,
+            top_cuisine TEXT,
+            PRIMARY KEY (resolution, h3_cell)
+        );
         """)
 
+        # Viewport reads filter on the resolution and the centroid bbox
         cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_restaurants_h3_res9 
-        ON restaurants USING btree (h3_index_res9);
+        CREATE INDEX IF NOT EXISTS idx_restaurant_cell_aggregates_viewport
+        ON restaurant_cell_aggregates (resolution, centroid_lat, centroid_lng);
         """)
 
         cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_restaurants_h3_res10 
-        ON restaurants USING btree (h3_index_res10);
+        SELECT h3_index_res10, "Latitude", "Longitude", "Cuisine"
+        FROM restaurants
+        WHERE h3_index_res10 IS NOT NULL
         """)
 
+        clusters = {}
+        for cell_res10, lat, lng, cuisine in cursor.fetchall():
+            cuisines = [c.strip() for c in (cuisine or "").split(",") if c.strip()]
+            for resolution in AGGREGATE_RESOLUTIONS:
+                cell = h3.h3_to_parent(cell_res10, resolution)
+                cluster = clusters.setdefault(
+                    (resolution, cell),
+                    {"count": 0, "lat": 0.0, "lng": 0.0, "cuisines": Counter()},
+                )
+                cluster["count"] += 1
+                cluster["lat"] += float(lat)
+                cluster["lng"] += float(lng)
+                cluster["cuisines"].update(cuisines)
+
+        rows = [
+            (
+                resolution,
+                cell,
+                cluster["count"],
+                cluster["lat"] / cluster["count"],
+                cluster["lng"] / cluster["count"],
+                (
+                    cluster["cuisines"].most_common(1)[0][0]
+                    if cluster["cuisines"]
+                    else None
+                ),
+            )
+            for (resolution, cell), cluster in clusters.items()
+        ]
+
+        # Replace all clusters in one transaction so readers never see a
+        # partially rebuilt table
+        cursor.execute("DELETE FROM restaurant_cell_aggregates")
+        execute_values(
+            cursor,
+            """
+            INSERT INTO restaurant_cell_aggregates
+                (resolution, h3_cell, restaurant_count, centroid_lat, centroid_lng,
+                 top_cuisine)
+            VALUES %s
+            """,
+            rows,
+            page_size=1000,
+        )
+
+        notify_refresh(cursor, "restaurant_cell_aggregates")
         conn.commit()
-        print(f"H3 indexes created and updated for {len(restaurants)} restaurants")
+        print(
+            f"H3 cluster aggregates refreshed: {len(rows)} clusters for resolutions "
+            f"{AGGREGATE_RESOLUTIONS[0]}-{AGGREGATE_RESOLUTIONS[-1]}"
+        )
+        return len(rows)
     except Exception as e:
         conn.rollback()
-        print(f"Error initializing H3 indexes: {e}")
+        print(f"Error refreshing H3 cluster aggregates: {e}")
+        return 0
     finally:
         cursor.close()
         conn.close()
 
 
-def find_nearby_restaurants_h3(lat, lng, radius_km):
+def get_cell_counts():
     """
-    Find restaurants near a location using H3 indexing.
+    Get the number of restaurants per H3 cell, from the cluster aggregates.
+
+    Returns:
+        dict: {resolution: {cell: count}}, or None if the aggregates have not
+            been built
+    """
+    global _cell_counts, _cell_counts_loaded_at
+
+    now = time.time()
+    with _planner_lock:
+        if _cell_counts_loaded_at and now - _cell_counts_loaded_at < (
+            H3_PLANNER_STATS_TTL
+        ):
+            return _cell_counts
+
+    try:
+        rows = execute_query(
+            """
+            SELECT resolution, h3_cell, restaurant_count
+            FROM restaurant_cell_aggregates
+            """,
+            dict_cursor=False,
+            read_only=True,
+        )
+        counts = {}
+        for resolution, cell, count in rows:
+            counts.setdefault(resolution, {})[cell] = count
+    except Exception as e:
+        print(f"H3 cell counts unavailable, planning without them: {e}")
+        counts = None
+
+    with _planner_lock:
+        if counts:
+            for resolution, deltas in _cell_count_deltas.items():
+                cells = counts.setdefault(resolution, {})
+                for cell, delta in deltas.items():
+                    cells[cell] = max(cells.get(cell, 0) + delta, 0)
+        _cell_counts = counts or None
+        _cell_counts_loaded_at = now
+        _plan_cache.clear()
+
+    return _cell_counts
+
+
+def apply_restaurant_changes(changes):
+    """
+    Adjust the cell counts for restaurants added, removed or moved, as
+    published by the change feed, without reloading them.
+
+    Args:
+        changes (list): Change feed payloads with the old and new coordinates
+    """
+    finest = AGGREGATE_RESOLUTIONS[-1]
+    with _planner_lock:
+        for change in changes:
+            for prefix, step in (("old_", -1), ("new_", 1)):
+                lat = change.get(f"{prefix}Latitude")
+                lng = change.get(f"{prefix}Longitude")
+                if lat is None or lng is None:
+                    continue
+
+                cell = h3.geo_to_h3(float(lat), float(lng), finest)
+                for resolution in AGGREGATE_RESOLUTIONS:
+                    parent = h3.h3_to_parent(cell, resolution)
+                    deltas = _cell_count_deltas.setdefault(resolution, {})
+                    deltas[parent] = deltas.get(parent, 0) + step
+                    if _cell_counts is not None:
+                        cells = _cell_counts.setdefault(resolution, {})
+                        cells[parent] = max(cells.get(parent, 0) + step, 0)
+
+        # Plans depend on the counts
+        _plan_cache.clear()
+
+
+def reset_cell_counts():
+    """Reload the cell counts from the aggregates on next use."""
+    global _cell_counts_loaded_at
+
+    with _planner_lock:
+        _cell_count_deltas.clear()
+        _cell_counts_loaded_at = 0.0
+        _plan_cache.clear()
+
+
+def _estimate_rings(lat, lng, radius_km, resolution):
+    """Estimate the number of rings around the center cell covering a circle."""
+    center = h3.geo_to_h3(lat, lng, resolution)
+
+    # Cell sizes vary over the globe, so use the edge length of the center
+    # cell rather than the resolution average
+    edge_km = math.sqrt(2 * h3.cell_area(center, unit="km^2") / (3 * math.sqrt(3)))
+
+    # Centers of neighboring hexagons are sqrt(3) edge lengths apart
+    rings = math.ceil((radius_km + edge_km) / (math.sqrt(3) * edge_km))
+    return center, rings
+
+
+def _cell_circumradius(cell):
+    """Largest distance from the center of a cell to its boundary, in km."""
+    cell_center = h3.h3_to_geo(cell)
+    return max(
+        h3.point_dist(cell_center, vertex, unit="km")
+        for vertex in h3.h3_to_geo_boundary(cell)
+    )
+
+
+def _cell_min_distance(lat, lng, cell):
+    """Lower bound of the distance from a point to any point of a cell, in km."""
+    distance = h3.point_dist((lat, lng), h3.h3_to_geo(cell), unit="km")
+    return distance - _cell_circumradius(cell)
+
+
+def _covering_rings(lat, lng, radius_km, center, rings):
+    """
+    Find the smallest ring count whose disk of cells covers a circle.
+
+    Once every cell of ring k lies outside the circle, the disk of k - 1
+    rings covers it: the circle is connected and contains the center cell, so
+    any part of it beyond ring k would have to cross ring k.
+    """
+    ring_cells = h3.k_ring_distances(center, rings + 1)
+
+    def ring_outside(k):
+        nonlocal ring_cells
+        if k >= len(ring_cells):
+            ring_cells = h3.k_ring_distances(center, k + 1)
+        return all(
+            _cell_min_distance(lat, lng, cell) > radius_km for cell in ring_cells[k]
+        )
+
+    # Grow until the next ring lies outside the circle, then drop rings that
+    # the estimate added needlessly
+    while not ring_outside(rings + 1):
+        rings += 1
+    while rings > 0 and ring_outside(rings):
+        rings -= 1
+
+    return rings
+
+
+def _cell_range(cell):
+    """Get the first and last res8 index descending from a coarser cell."""
+    first = h3.h3_to_center_child(cell, RANGE_RESOLUTION)
+
+    # Descendants share the digits of the cell; the digits of the finer
+    # resolutions run from 0 (center child) to 6
+    last = h3.string_to_h3(first)
+    for digit in range(h3.h3_get_resolution(cell) + 1, RANGE_RESOLUTION + 1):
+        last |= 6 << (3 * (15 - digit))
+
+    return first, h3.h3_to_string(last)
+
+
+def _plan_h3_search(lat, lng, radius_km, table_name="restaurants"):
+    """Plan an H3 search, returning the plan and the cells to probe."""
+    # Cell counts are only aggregated for restaurants
+    counts = get_cell_counts() if table_name == "restaurants" else None
+
+    key = (table_name, lat, lng, radius_km)
+    with _planner_lock:
+        if key in _plan_cache:
+            _plan_cache.move_to_end(key)
+            return _plan_cache[key]
+
+    candidates = []
+    for resolution in AGGREGATE_RESOLUTIONS:
+        center, rings = _estimate_rings(lat, lng, radius_km, resolution)
+        num_cells = 3 * rings * (rings + 1) + 1
+        if num_cells > H3_PLANNER_MAX_CELLS:
+            continue
+
+        candidate = {"resolution": resolution, "rings": rings, "cells": num_cells}
+        if counts:
+            resolution_counts = counts.get(resolution, {})
+            rows = sum(
+                resolution_counts.get(cell, 0) for cell in h3.k_ring(center, rings)
+            )
+            candidate["estimated_rows"] = rows
+            candidate["estimated_cost"] = (
+                num_cells * H3_PLANNER_CELL_COST + rows * H3_PLANNER_ROW_COST
+            )
+        candidates.append(candidate)
+
+    if not candidates:
+        # Very large circles are covered by the coarsest cells, whatever it costs
+        resolution = AGGREGATE_RESOLUTIONS[0]
+    elif counts:
+        resolution = min(candidates, key=lambda c: (c["estimated_cost"], c["cells"]))[
+            "resolution"
+        ]
+    else:
+        # Without counts, rows can't be estimated; prefer fine cells while
+        # the number of rings stays small
+        within = [c for c in candidates if c["rings"] <= H3_PLANNER_DEFAULT_RINGS]
+        resolution = (within or candidates[:1])[-1]["resolution"]
+
+    center, rings = _estimate_rings(lat, lng, radius_km, resolution)
+    rings = _covering_rings(lat, lng, radius_km, center, rings)
+    cells = list(h3.k_ring(center, rings))
+
+    plan = {
+        "resolution": resolution,
+        "column": H3_COLUMNS.get(resolution, H3_COLUMNS[RANGE_RESOLUTION]),
+        "lookup": "cells" if resolution in H3_COLUMNS else "ranges",
+        "rings": rings,
+        "cells": len(cells),
+        "estimated_rows": None,
+        "estimated_cost": None,
+        "candidates": candidates,
+    }
+    if counts:
+        resolution_counts = counts.get(resolution, {})
+        plan["estimated_rows"] = sum(resolution_counts.get(c, 0) for c in cells)
+        plan["estimated_cost"] = (
+            len(cells) * H3_PLANNER_CELL_COST
+            + plan["estimated_rows"] * H3_PLANNER_ROW_COST
+        )
+
+    with _planner_lock:
+        _plan_cache[key] = (plan, cells)
+        while len(_plan_cache) > PLAN_CACHE_SIZE:
+            _plan_cache.popitem(last=False)
+
+    return plan, cells
+
+
+def _plan_approximate_search(lat, lng, radius_km, table_name="restaurants"):
+    """
+    Plan an approximate H3 search, returning the plan and the cells to probe.
+
+    Only the cells of the exact plan whose center lies inside the circle are
+    probed, and rows are taken by cell membership alone. A returned row is at
+    most error_bound_km outside the circle, and every row closer than
+    radius_km - error_bound_km is returned.
+    """
+    plan, cells = _plan_h3_search(lat, lng, radius_km, table_name)
+
+    inside = [
+        cell
+        for cell in cells
+        if h3.point_dist((lat, lng), h3.h3_to_geo(cell), unit="km") <= radius_km
+    ]
+    if not inside:
+        # The circle is smaller than a cell
+        inside = [h3.geo_to_h3(lat, lng, plan["resolution"])]
+
+    error_bound = max(_cell_circumradius(cell) for cell in inside)
+    if plan["lookup"] == "ranges":
+        # Rows are matched by their res8 cell, whose descendants don't tile
+        # the coarser cell exactly
+        error_bound += _cell_circumradius(h3.geo_to_h3(lat, lng, RANGE_RESOLUTION))
+
+    plan = dict(plan, approximate=True, cells=len(inside), error_bound_km=error_bound)
+
+    counts = get_cell_counts() if table_name == "restaurants" else None
+    if counts:
+        resolution_counts = counts.get(plan["resolution"], {})
+        plan["estimated_rows"] = sum(resolution_counts.get(c, 0) for c in inside)
+        plan["estimated_cost"] = (
+            len(inside) * H3_PLANNER_CELL_COST
+            + plan["estimated_rows"] * H3_PLANNER_ROW_COST
+        )
+
+    return plan, inside
+
+
+def plan_h3_search(lat, lng, radius_km, table_name="restaurants", approximate=False):
+    """
+    Pick the H3 resolution and ring count of a nearby search.
+
+    Every resolution with precomputed cell counts is costed by the cells it
+    probes and the rows it fetches, and the cheapest one is used. The ring
+    count is then grown until the disk of cells is guaranteed to cover the
+    whole circle.
 
     Args:
         lat (float): Latitude of center point
         lng (float): Longitude of center point
         radius_km (float): Search radius in kilometers
+        table_name (str): 'restaurants' or 'users'
+        approximate (bool): Plan the approximate search, which also reports
+            its error bound
 
     Returns:
-        list: Restaurants within the radius, ordered by distance
+        dict: Chosen resolution, lookup, rings, cells, estimated rows and cost,
+            and the costed candidates
     """
-    # Determine appropriate H3 resolution based on radius
-    resolution = get_h3_resolution_for_radius(radius_km)
+    if approximate:
+        return _plan_approximate_search(lat, lng, radius_km, table_name)[0]
+
+    return _plan_h3_search(lat, lng, radius_km, table_name)[0]
 
-    # Get the H3 index for the center point
-    center_h3 = h3.geo_to_h3(lat, lng, resolution)
 
-    # Get all H3 indexes within the radius (using k-ring)
-    # Calculate number of rings needed to cover the radius
-    hex_radius = max(1, int(radius_km / (h3.edge_length(resolution, unit="km"))))
-    h3_indexes = h3.k_ring(center_h3, hex_radius)
+def find_nearby_h3(table_name, lat, lng, radius_km, approximate=False, open_slot=None):
+    """
+    Find rows of a spatial table near a location using H3 indexing.
+
+    Args:
+        table_name (str): 'restaurants' or 'users'
+        lat (float): Latitude of center point
+        lng (float): Longitude of center point
+        radius_km (float): Search radius in kilometers
+        approximate (bool): Return the rows of the cells whose center lies in
+            the circle, without the exact distance check
+        open_slot (int): Keep only restaurants open in this slot of the week
 
-    # Choose appropriate column based on resolution
-    if resolution <= 8:
-        h3_column = "h3_index_res8"
-    elif resolution == 9:
-        h3_column = "h3_index_res9"
+    Returns:
+        list: Rows within the radius, ordered by distance
+    """
+    if approximate:
+        plan, cells = _plan_approximate_search(lat, lng, radius_km, table_name)
     else:
-        h3_column = "h3_index_res10"
+        plan, cells = _plan_h3_search(lat, lng, radius_km, table_name)
 
-    # Convert h3_indexes to list for query
-    h3_index_list = list(h3_indexes)
+    if plan["lookup"] == "cells":
+        # Cells at a stored resolution are matched on their own column
+        placeholders = ", ".join(["%s"] * len(cells))
+        h3_condition = f"{plan['column']} IN ({placeholders})"
+        h3_params = cells
+    else:
+        # Coarser cells are contiguous ranges of the res8 column
+        h3_condition = (
+            "("
+            + " OR ".join([f"{plan['column']} BETWEEN %s AND %s"] * len(cells))
+            + ")"
+        )
+        h3_params = [value for cell in cells for value in _cell_range(cell)]
 
-    if not h3_index_list:
-        return []
+    # Restrict the search to the partitions the circle can touch
+    partition_filter, partition_params = get_partition_filter(
+        lat, lng, radius_km, table_name
+    )
+    hours_filter, hours_params = open_filter(open_slot)
 
-    # Create placeholders for SQL IN clause
-    placeholders = ", ".join(["%s"] * len(h3_index_list))
+    # Query rows in these cells and calculate exact distance
+    distance_filter = ""
+    distance_params = []
+    if not approximate:
+        distance_filter = """
+    AND (6371 * acos(cos(radians(%s)) * cos(radians("Latitude")) * cos(radians("Longitude") - 
+        radians(%s)) + sin(radians(%s)) * sin(radians("Latitude")))) < %s"""
+        distance_params = [lat, lng, lat, radius_km]
 
-    # Query restaurants in these cells and calculate exact distance
     query = f"""
-    SELECT *, 
+    SELECT {get_select_list(table_name)}, 
         (6371 * acos(cos(radians(%s)) * cos(radians("Latitude")) * cos(radians("Longitude") - 
         radians(%s)) + sin(radians(%s)) * sin(radians("Latitude")))) AS distance 
-    FROM restaurants 
-    WHERE {h3_column} IN ({placeholders})
-    AND (6371 * acos(cos(radians(%s)) * cos(radians("Latitude")) * cos(radians("Longitude") - 
-        radians(%s)) + sin(radians(%s)) * sin(radians("Latitude")))) < %s 
+    FROM {table_name} 
+    WHERE {h3_condition}{distance_filter}
+    {partition_filter}{hours_filter}
     ORDER BY distance;
     """
 
-    # Parameters: [lat, lng, lat, h3_index_list, lat, lng, lat, radius_km]
-    params = [lat, lng, lat] + h3_index_list + [lat, lng, lat, radius_km]
+    # Parameters: [lat, lng, lat, h3 cells, exact check, partitions, hours]
+    params = (
+        [lat, lng, lat] + h3_params + distance_params + partition_params + hours_params
+    )
+
+    return execute_query(query, params, read_only=True)
+
+
+def find_nearby_restaurants_h3(lat, lng, radius_km, open_slot=None):
+    """
+    Find restaurants near a location using H3 indexing.
+
+    Args:
+        lat (float): Latitude of center point
+        lng (float): Longitude of center point
+        radius_km (float): Search radius in kilometers
+        open_slot (int): Keep only restaurants open in this slot of the week
+
+    Returns:
+        list: Restaurants within the radius, ordered by distance
+    """
+    return find_nearby_h3("restaurants", lat, lng, radius_km, open_slot=open_slot)
+
+
+def find_nearby_restaurants_h3_approximate(lat, lng, radius_km, open_slot=None):
+    """Find restaurants by H3 cell membership, without the exact distance check."""
+    return find_nearby_h3(
+        "restaurants", lat, lng, radius_km, approximate=True, open_slot=open_slot
+    )
+
 
-    return execute_query(query, params)
+def find_nearby_users_h3(lat, lng, radius_km):
+    """Find users near a location using H3 indexing."""
+    return find_nearby_h3("users", lat, lng, radius_km)
@@ -0,0 +1,258 @@
+import os
+import time
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from app.utils.db_utils import get_db_connection, run_query
+
+# Send a second copy of slow read-only queries to another connection and
+# use whichever answers first
+DB_HEDGE_READS = os.environ.get("DB_HEDGE_READS", "false").lower() in (
+    "true",
+    "1",
+    "yes",
+)
+
+# A read is hedged once it has run longer than this percentile of the
+# recent latencies of the same query
+HEDGE_PERCENTILE = float(os.environ.get("HEDGE_PERCENTILE", 95))
+
+# Share of reads that may be hedged, and how many hedges may be saved up for
+# a burst of slow reads
+HEDGE_BUDGET = float(os.environ.get("HEDGE_BUDGET", 0.05))
+HEDGE_BUDGET_BURST = float(os.environ.get("HEDGE_BUDGET_BURST", 10))
+
+# Hedge delays never go below this, so fast queries aren't hedged on noise
+HEDGE_MIN_DELAY_MS = float(os.environ.get("HEDGE_MIN_DELAY_MS", 2))
+
+# Threads running hedged reads; each read in flight uses one or two
+HEDGE_MAX_WORKERS = int(os.environ.get("HEDGE_MAX_WORKERS", 64))
+
+# Latencies kept per query, and measurements needed before a query is hedged
+HEDGE_WINDOW = 500
+HEDGE_MIN_SAMPLES = 20
+
+# The percentile of a query is recomputed after this many new latencies
+HEDGE_RECOMPUTE_EVERY = 25
+
+# Queries tracked at once; the least recently used is forgotten beyond that
+HEDGE_MAX_QUERIES = 256
+
+_lock = threading.Lock()
+_pool = ThreadPoolExecutor(max_workers=HEDGE_MAX_WORKERS, thread_name_prefix="hedge")
+_latencies = OrderedDict()
+_tokens = HEDGE_BUDGET_BURST
+_stats = {
+    "reads": 0,
+    "hedged": 0,
+    "hedge_wins": 0,
+    "budget_exhausted": 0,
+    "losers_cancelled": 0,
+}
+
+
+def _record_latency(query, seconds):
+    """Add a latency to the window of a query and refresh its threshold."""
+    with _lock:
+        entry = _latencies.get(query)
+        if entry is None:
+            entry = _latencies[query] = {
+                "samples": deque(maxlen=HEDGE_WINDOW),
+                "threshold": None,
+                "pending": 0,
+            }
+            if len(_latencies) > HEDGE_MAX_QUERIES:
+                _latencies.popitem(last=False)
+        else:
+            _latencies.move_to_end(query)
+
+        entry["samples"].append(seconds)
+        entry["pending"] += 1
+        if entry["threshold"] is None or entry["pending"] >= HEDGE_RECOMPUTE_EVERY:
+            ordered = sorted(entry["samples"])
+            index = int(HEDGE_PERCENTILE / 100 * (len(ordered) - 1))
+            entry["threshold"] = ordered[index]
+            entry["pending"] = 0
+
+
+def get_hedge_delay(query):
+    """
+    Get how long a read of a query may run before it is hedged.
+
+    Returns:
+        float: Delay in seconds, or None while the query has too few
+            measurements to tell a slow read from a normal one
+    """
+    with _lock:
+        entry = _latencies.get(query)
+        if entry is None or len(entry["samples"]) < HEDGE_MIN_SAMPLES:
+            return None
+        return max(entry["threshold"], HEDGE_MIN_DELAY_MS / 1000)
+
+
+def _take_hedge_token():
+    """Spend one hedge of the budget, if any is left."""
+    global _tokens
+
+    with _lock:
+        if _tokens >= 1:
+            _tokens -= 1
+            _stats["hedged"] += 1
+            return True
+        _stats["budget_exhausted"] += 1
+        return False
+
+
+def _attempt(state, read_only, query, params, fetch_all, dict_cursor, timeout_ms):
+    """
+    Run one copy of a hedged read, unless it was cancelled before starting.
+
+    The copy runs on the connection in its state, if it was routed before it
+    was submitted, or on a new one.
+    """
+    conn = state.get("conn") or get_db_connection(read_only=read_only)
+    with _lock:
+        if state["cancelled"]:
+            conn.close()
+            return None
+        state["conn"] = conn
+    return run_query(conn, query, params, fetch_all, dict_cursor, timeout_ms)
+
+
+def _cancel(state):
+    """Cancel the running query of the losing copy of a read."""
+    with _lock:
+        state["cancelled"] = True
+        conn = state.get("conn")
+        _stats["losers_cancelled"] += 1
+
+    if conn is not None:
+        try:
+            conn.cancel()
+        except Exception as e:
+            print(f"Could not cancel the losing copy of a hedged read: {e}")
+
+
+def execute_hedged(
+    query, params=None, fetch_all=True, dict_cursor=True, timeout_ms=None
+):
+    """
+    Run a read-only query, hedging it if it runs unusually long.
+
+    The read starts on the usual read connection. If that is a replica and
+    the read hasn't finished after the HEDGE_PERCENTILE latency of the same
+    query, and the hedge budget allows, a copy is sent to the primary. The
+    first result wins and the other copy is cancelled. Reads served by the
+    primary, because no replica is configured or usable, aren't hedged: the
+    copy would run on the same server.
+
+    Args:
+        query (str): SQL to run
+        params: Query parameters
+        fetch_all (bool): Return all rows, or only the first one
+        dict_cursor (bool): Return rows as dicts
+        timeout_ms (int): statement_timeout of the query, None for the default
+
+    Returns:
+        list or row: Query results
+    """
+    global _tokens
+
+    start_time = time.time()
+
+    # Route the first copy before it starts, so the side of the hedge is
+    # known even if the hedge is sent before the first copy runs
+    first_conn = get_db_connection(read_only=True)
+    if getattr(first_conn, "replica_name", None) is None:
+        return run_query(first_conn, query, params, fetch_all, dict_cursor, timeout_ms)
+
+    with _lock:
+        _stats["reads"] += 1
+        _tokens = min(HEDGE_BUDGET_BURST, _tokens + HEDGE_BUDGET)
+
+    first = {"cancelled": False, "conn": first_conn}
+    first_future = _pool.submit(
+        _attempt, first, True, query, params, fetch_all, dict_cursor, timeout_ms
+    )
+
+    delay = get_hedge_delay(query)
+    done, _ = wait([first_future], timeout=delay)
+
+    # The copy gets what is left of the statement timeout
+    hedge_timeout_ms = timeout_ms
+    if not done and timeout_ms is not None:
+        hedge_timeout_ms = int(timeout_ms - (time.time() - start_time) * 1000)
+
+    if (
+        done
+        or (hedge_timeout_ms is not None and hedge_timeout_ms <= 0)
+        or not _take_hedge_token()
+    ):
+        result = first_future.result()
+        _record_latency(query, time.time() - start_time)
+        return result
+
+    # The copy goes to the primary
+    second = {"cancelled": False}
+    second_future = _pool.submit(
+        _attempt,
+        second,
+        False,
+        query,
+        params,
+        fetch_all,
+        dict_cursor,
+        hedge_timeout_ms,
+    )
+
+    copies = {first_future: first, second_future: second}
+    pending = set(copies)
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is not None:
+                error = error or future.exception()
+                continue
+
+            for loser in pending:
+                _cancel(copies[loser])
+
+            if future is second_future:
+                with _lock:
+                    _stats["hedge_wins"] += 1
+
+            # When the hedge wins, the first copy's latency is only known to
+            # exceed this; the budget keeps that bias small
+            _record_latency(query, time.time() - start_time)
+            return future.result()
+
+    raise error
+
+
+def get_hedge_stats():
+    """Report how often reads were hedged and how often the hedge won."""
+    with _lock:
+        stats = dict(_stats)
+        thresholds = sorted(
+            entry["threshold"] * 1000
+            for entry in _latencies.values()
+            if len(entry["samples"]) >= HEDGE_MIN_SAMPLES
+        )
+
+    stats.update(
+        {
+            "enabled": DB_HEDGE_READS,
+            "percentile": HEDGE_PERCENTILE,
+            "budget": HEDGE_BUDGET,
+            "hedge_rate": stats["hedged"] / stats["reads"] if stats["reads"] else 0.0,
+            "win_rate": (
+                stats["hedge_wins"] / stats["hedged"] if stats["hedged"] else 0.0
+            ),
+            "queries_tracked": len(thresholds),
+            "median_hedge_delay_ms": (
+                thresholds[len(thresholds) // 2] if thresholds else None
+            ),
+        }
+    )
+    return stats
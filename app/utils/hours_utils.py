@@ -0,0 +1,228 @@
+import os
+import re
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from psycopg2.extras import execute_values
+from app.utils.db_utils import get_db_connection
+
+# Opening hours are stored as one bit per 15-minute slot of the week,
+# Monday 00:00 first, in a bit(672) column
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+WEEK_SLOTS = 7 * SLOTS_PER_DAY
+OPENING_HOURS_COLUMN = "opening_hours"
+
+# CSV columns holding the opening hours, and the days they cover (0 is Monday)
+HOURS_COLUMNS = {
+    "Hoursweekdays": [0, 1, 2, 3, 4],
+    "Hourssaturday": [5],
+    "Hourssunday": [6],
+}
+
+# Time zone of the opening hours, used to evaluate open_now=1
+OPENING_HOURS_TIMEZONE = os.environ.get("OPENING_HOURS_TIMEZONE", "America/Mexico_City")
+
+TIME_RANGE_PATTERN = re.compile(r"^(\d{1,2}):(\d{2})-(\d{1,2}):(\d{2})$")
+
+
+def parse_hours(value):
+    """
+    Parse an opening hours string like '08:00-21:00;' into minute ranges.
+
+    Several ranges are separated by ';'. A range ending before it starts
+    runs past midnight. '00:00-00:00' means closed that day.
+
+    Args:
+        value (str): Opening hours of one day
+
+    Returns:
+        list: (start minute, end minute) tuples, the end possibly beyond
+            1440, or None if the value can't be parsed
+    """
+    if value is None:
+        return None
+
+    ranges = []
+    for part in str(value).split(";"):
+        part = part.strip()
+        if not part:
+            continue
+
+        match = TIME_RANGE_PATTERN.match(part)
+        if not match:
+            return None
+
+        start_hour, start_minute, end_hour, end_minute = map(int, match.groups())
+        start = start_hour * 60 + start_minute
+        end = end_hour * 60 + end_minute
+        if start > 24 * 60 or end > 24 * 60:
+            return None
+
+        if end < start:
+            end += 24 * 60
+        if end > start:
+            ranges.append((start, end))
+
+    return ranges
+
+
+def build_weekly_bitmap(hours):
+    """
+    Build the weekly slot bitmap of a restaurant.
+
+    A slot is open if the restaurant is open at any time within it. Ranges
+    past midnight carry over to the next day, and Sunday nights to Monday.
+
+    Args:
+        hours (dict): Opening hours string per HOURS_COLUMNS column
+
+    Returns:
+        str: WEEK_SLOTS characters '0' or '1', or None if no column could be
+            parsed
+    """
+    bits = ["0"] * WEEK_SLOTS
+    parsed = False
+
+    for column, days in HOURS_COLUMNS.items():
+        ranges = parse_hours(hours.get(column))
+        if ranges is None:
+            continue
+        parsed = True
+
+        for day in days:
+            for start, end in ranges:
+                first = day * SLOTS_PER_DAY + start // SLOT_MINUTES
+                last = day * SLOTS_PER_DAY + (end - 1) // SLOT_MINUTES
+                for slot in range(first, last + 1):
+                    bits[slot % WEEK_SLOTS] = "1"
+
+    return "".join(bits) if parsed else None
+
+
+def populate_opening_hours(cursor, table_name="restaurants"):
+    """
+    Add the opening hours bitmap column and fill the rows where it is NULL.
+
+    Args:
+        cursor: Database cursor, committed by the caller
+        table_name (str): Table with the HOURS_COLUMNS columns
+
+    Returns:
+        int: Number of rows filled
+    """
+    cursor.execute(
+        """
+    SELECT column_name FROM information_schema.columns
+    WHERE table_name = %s AND column_name = ANY(%s)
+    """,
+        (table_name, list(HOURS_COLUMNS)),
+    )
+    hours_columns = [row[0] for row in cursor.fetchall()]
+    if not hours_columns:
+        return 0
+
+    cursor.execute(f"""
+    ALTER TABLE {table_name}
+    ADD COLUMN IF NOT EXISTS {OPENING_HOURS_COLUMN} BIT({WEEK_SLOTS});
+    """)
+
+    selected = ", ".join(f'"{col}"' for col in hours_columns)
+    cursor.execute(f"""
+    SELECT "Restaurantid", {selected}
+    FROM {table_name}
+    WHERE {OPENING_HOURS_COLUMN} IS NULL
+    """)
+
+    values = []
+    for row in cursor.fetchall():
+        bitmap = build_weekly_bitmap(dict(zip(hours_columns, row[1:])))
+        if bitmap is not None:
+            values.append((row[0], bitmap))
+
+    execute_values(
+        cursor,
+        f"""
+    UPDATE {table_name} t
+    SET {OPENING_HOURS_COLUMN} = v.bitmap::bit({WEEK_SLOTS})
+    FROM (VALUES %s) AS v (restaurant_id, bitmap)
+    WHERE t."Restaurantid" = v.restaurant_id
+    """,
+        values,
+        page_size=1000,
+    )
+
+    return len(values)
+
+
+def initialize_opening_hours():
+    """Fill the opening hours bitmaps of the restaurants that have none."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        filled = populate_opening_hours(cursor)
+        conn.commit()
+        print(f"Opening hours bitmaps computed for {filled} restaurants")
+    except Exception as e:
+        conn.rollback()
+        print(f"Error computing opening hours bitmaps: {e}")
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def week_slot(moment):
+    """Get the slot of the week a datetime falls in."""
+    return (
+        moment.weekday() * SLOTS_PER_DAY
+        + (moment.hour * 60 + moment.minute) // SLOT_MINUTES
+    )
+
+
+def resolve_open_slot(request):
+    """
+    Determine the slot of the week a Flask request filters opening hours on.
+
+    ?open_now=1 uses the current time in OPENING_HOURS_TIMEZONE. ?open_at=
+    takes an ISO 8601 date and time, such as 2024-05-04T19:30; times with
+    an offset are converted to OPENING_HOURS_TIMEZONE, others are taken as
+    local to the restaurants.
+
+    Returns:
+        tuple: (slot or None when not filtering, error message or None)
+    """
+    timezone = ZoneInfo(OPENING_HOURS_TIMEZONE)
+
+    open_at = request.args.get("open_at")
+    if open_at:
+        try:
+            moment = datetime.fromisoformat(open_at)
+        except ValueError:
+            return None, "open_at must be an ISO 8601 date and time"
+        if moment.tzinfo is not None:
+            moment = moment.astimezone(timezone)
+        return week_slot(moment), None
+
+    if request.args.get("open_now") == "1":
+        return week_slot(datetime.now(timezone)), None
+
+    return None, None
+
+
+def open_filter(slot):
+    """
+    Build a WHERE clause keeping the restaurants open in a slot of the week.
+
+    The test reads one bit of each row the spatial conditions selected, so
+    the bitmap itself never leaves the database. Restaurants without known
+    hours are left out.
+
+    Args:
+        slot (int): Slot of the week, or None when not filtering
+
+    Returns:
+        tuple: (SQL fragment starting with AND, list of parameters)
+    """
+    if slot is None:
+        return "", []
+    return f" AND substring({OPENING_HOURS_COLUMN} from %s for 1) = B'1'", [slot + 1]
@@ -0,0 +1,561 @@
+import os
+import time
+import threading
+import h3
+from psycopg2.extras import execute_values
+from app.utils.db_utils import bounding_box, get_db_connection
+from app.utils.changefeed_utils import notify_refresh
+
+# Partitioning schemes and the column each one partitions on
+PARTITION_SCHEMES = {
+    "country": "Country",
+    "state": "State",
+    "h3": "h3_partition_cell",
+}
+
+# Resolution of the coarse H3 cells used by the 'h3' scheme (~60 km edges)
+PARTITION_H3_RESOLUTION = int(os.environ.get("PARTITION_H3_RESOLUTION", 3))
+
+# How long partition metadata is cached in each worker
+PARTITION_METADATA_TTL = float(os.environ.get("PARTITION_METADATA_TTL", 60))
+
+_lock = threading.Lock()
+_metadata = None
+_metadata_loaded_at = 0.0
+
+# Bounding boxes widened by restaurants published by the change feed since
+# the partition metadata was last refreshed: {partition key: [min_lat,
+# max_lat, min_lng, max_lng]}. Rows that went to the default or an unknown
+# partition suspend pruning until the next refresh.
+_extents = {}
+_pruning_suspended = False
+
+
+def fill_partition_cells(cursor, table_name="restaurants"):
+    """Compute the coarse H3 cell of rows that don't have one yet."""
+    cursor.execute(f"""
+    SELECT "Restaurantid", "Latitude", "Longitude" FROM {table_name}
+    WHERE h3_partition_cell IS NULL
+    """)
+    rows = cursor.fetchall()
+
+    if rows:
+        execute_values(
+            cursor,
+            f"""
+        UPDATE {table_name} AS r
+        SET h3_partition_cell = v.cell
+        FROM (VALUES %s) AS v (restaurant_id, cell)
+        WHERE r."Restaurantid" = v.restaurant_id
+        """,
+            [
+                (
+                    restaurant_id,
+                    h3.geo_to_h3(float(lat), float(lng), PARTITION_H3_RESOLUTION),
+                )
+                for restaurant_id, lat, lng in rows
+            ],
+        )
+
+    return len(rows)
+
+
+def _is_partitioned(cursor):
+    """Check whether the restaurants table is a partitioned table."""
+    cursor.execute("""
+    SELECT relkind = 'p' FROM pg_class
+    WHERE oid = to_regclass('restaurants')
+    """)
+    row = cursor.fetchone()
+    return bool(row and row[0])
+
+
+def _create_partition(cursor, partition_column, value, table_name="restaurants"):
+    """Create the partition holding one value of the partition column."""
+    cursor.execute("SELECT nextval('restaurant_partition_seq')")
+    partition_table = f"restaurants_p{cursor.fetchone()[0]}"
+
+    cursor.execute(
+        f"CREATE TABLE {partition_table} PARTITION OF {table_name} "
+        f"FOR VALUES IN ({cursor.mogrify('%s', (value,)).decode()});"
+    )
+    return partition_table
+
+
+def refresh_partition_metadata(cursor):
+    """Record the bounding box and row count of every partition."""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS restaurant_partitions (
+        partition_table TEXT PRIMARY KEY,
+        partition_column TEXT,
+        partition_key TEXT,
+        is_default BOOLEAN,
+        min_lat DOUBLE PRECISION,
+        max_lat DOUBLE PRECISION,
+        min_lng DOUBLE PRECISION,
+        max_lng DOUBLE PRECISION,
+        row_count BIGINT
+    );
+    """)
+    cursor.execute("TRUNCATE restaurant_partitions;")
+
+    cursor.execute("SELECT partition_column FROM restaurant_partition_scheme")
+    partition_column = cursor.fetchone()[0]
+
+    cursor.execute("""
+    SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) = 'DEFAULT'
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'restaurants'::regclass
+    """)
+    partitions = cursor.fetchall()
+
+    for partition_table, is_default in partitions:
+        cursor.execute(
+            f"""
+        INSERT INTO restaurant_partitions
+        SELECT %s, %s, MIN("{partition_column}"::text), %s,
+            MIN("Latitude"), MAX("Latitude"), MIN("Longitude"), MAX("Longitude"),
+            COUNT(*)
+        FROM {partition_table}
+        """,
+            (partition_table, partition_column, is_default),
+        )
+
+    notify_refresh(cursor, "restaurant_partitions")
+
+
+def partition_restaurants_table(scheme="h3"):
+    """
+    Convert the restaurants table into a list-partitioned table.
+
+    One partition is created per country, state or coarse H3 cell, plus a
+    default partition for values added later. Existing indexes are recreated
+    on the partitioned table, which builds them on every partition.
+
+    Args:
+        scheme (str): 'country', 'state' or 'h3'
+
+    Returns:
+        bool: True if the table was partitioned
+    """
+    if scheme not in PARTITION_SCHEMES:
+        print(f"Error: Unknown partitioning scheme '{scheme}'")
+        return False
+
+    partition_column = PARTITION_SCHEMES[scheme]
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        if _is_partitioned(cursor):
+            print("Restaurants table is already partitioned")
+            return False
+
+        if scheme == "h3":
+            cursor.execute("""
+            ALTER TABLE restaurants ADD COLUMN IF NOT EXISTS h3_partition_cell TEXT;
+            """)
+            fill_partition_cells(cursor)
+
+        # Remember the secondary indexes so they can be rebuilt afterwards
+        cursor.execute("""
+        SELECT pg_get_indexdef(i.indexrelid)
+        FROM pg_index i
+        WHERE i.indrelid = 'restaurants'::regclass AND NOT i.indisprimary
+        """)
+        index_definitions = [row[0] for row in cursor.fetchall()]
+
+        cursor.execute(f"""
+        SELECT DISTINCT "{partition_column}" FROM restaurants
+        WHERE "{partition_column}" IS NOT NULL
+        """)
+        values = [row[0] for row in cursor.fetchall()]
+
+        cursor.execute("DROP TABLE IF EXISTS restaurants_partitioned;")
+        cursor.execute(f"""
+        CREATE TABLE restaurants_partitioned (LIKE restaurants INCLUDING DEFAULTS)
+        PARTITION BY LIST ("{partition_column}");
+        """)
+
+        # Partitions are created against the final table name below
+        cursor.execute("ALTER TABLE restaurants RENAME TO restaurants_unpartitioned;")
+        cursor.execute("ALTER TABLE restaurants_partitioned RENAME TO restaurants;")
+        cursor.execute("CREATE SEQUENCE IF NOT EXISTS restaurant_partition_seq;")
+
+        for value in values:
+            _create_partition(cursor, partition_column, value)
+
+        cursor.execute("""
+        CREATE TABLE restaurants_p_default PARTITION OF restaurants DEFAULT;
+        """)
+
+        cursor.execute(
+            "INSERT INTO restaurants SELECT * FROM restaurants_unpartitioned;"
+        )
+        cursor.execute("DROP TABLE restaurants_unpartitioned;")
+
+        # A primary key would have to include the partition column, so the id
+        # gets a plain index instead
+        cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_restaurants_id
+        ON restaurants USING btree ("Restaurantid");
+        """)
+        for index_definition in index_definitions:
+            cursor.execute(index_definition)
+
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS restaurant_partition_scheme (
+            scheme TEXT,
+            partition_column TEXT
+        );
+        """)
+        cursor.execute("TRUNCATE restaurant_partition_scheme;")
+        cursor.execute(
+            "INSERT INTO restaurant_partition_scheme VALUES (%s, %s)",
+            (scheme, partition_column),
+        )
+
+        refresh_partition_metadata(cursor)
+        cursor.execute("ANALYZE restaurants;")
+
+        conn.commit()
+        print(
+            f"Restaurants table partitioned by {partition_column} "
+            f"into {len(values)} partitions plus a default partition"
+        )
+        return True
+    except Exception as e:
+        conn.rollback()
+        print(f"Error partitioning restaurants table: {e}")
+        return False
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def partition_like_restaurants(cursor, table_name):
+    """
+    Partition a plain copy of restaurants, such as the shadow table of a
+    reload, the way restaurants is partitioned, before it is renamed into
+    place. Its primary key is dropped, as a partitioned table can't have one
+    without the partition column.
+
+    Args:
+        cursor: Database cursor, committed by the caller
+        table_name (str): Copy holding the partition column
+
+    Returns:
+        bool: True if restaurants is partitioned and the copy was converted
+    """
+    if not _is_partitioned(cursor):
+        return False
+
+    cursor.execute("SELECT partition_column FROM restaurant_partition_scheme")
+    partition_column = cursor.fetchone()[0]
+
+    cursor.execute(f"""
+    SELECT DISTINCT "{partition_column}" FROM {table_name}
+    WHERE "{partition_column}" IS NOT NULL
+    """)
+    values = [row[0] for row in cursor.fetchall()]
+
+    cursor.execute(f"DROP TABLE IF EXISTS {table_name}_partitioned;")
+    cursor.execute(f"""
+    CREATE TABLE {table_name}_partitioned (LIKE {table_name} INCLUDING DEFAULTS)
+    PARTITION BY LIST ("{partition_column}");
+    """)
+    cursor.execute(f"ALTER TABLE {table_name} RENAME TO {table_name}_unpartitioned;")
+    cursor.execute(f"ALTER TABLE {table_name}_partitioned RENAME TO {table_name};")
+
+    for value in values:
+        _create_partition(cursor, partition_column, value, table_name)
+
+    # Renamed to restaurants_p_default along with the table
+    cursor.execute(f"""
+    CREATE TABLE {table_name}_p_default PARTITION OF {table_name} DEFAULT;
+    """)
+
+    cursor.execute(
+        f"INSERT INTO {table_name} SELECT * FROM {table_name}_unpartitioned;"
+    )
+    cursor.execute(f"DROP TABLE {table_name}_unpartitioned;")
+
+    return True
+
+
+def refresh_partitions():
+    """
+    Bring partitions up to date after rows were inserted or changed.
+
+    Fills missing H3 partition cells, moves rows that landed in the default
+    partition into their own new partitions, and refreshes the metadata used
+    for partition pruning. Does nothing if the table isn't partitioned.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        if not _is_partitioned(cursor):
+            return
+
+        cursor.execute(
+            "SELECT scheme, partition_column FROM restaurant_partition_scheme"
+        )
+        scheme, partition_column = cursor.fetchone()
+
+        if scheme == "h3":
+            fill_partition_cells(cursor)
+
+        cursor.execute(f"""
+        SELECT DISTINCT "{partition_column}" FROM restaurants_p_default
+        WHERE "{partition_column}" IS NOT NULL
+        """)
+        new_values = [row[0] for row in cursor.fetchall()]
+
+        for value in new_values:
+            # A partition can't be created while the default partition holds
+            # matching rows, so they are moved out and back in
+            cursor.execute(
+                f"""
+            CREATE TEMP TABLE moved_restaurants ON COMMIT DROP AS
+            SELECT * FROM restaurants_p_default WHERE "{partition_column}" = %s
+            """,
+                (value,),
+            )
+            cursor.execute(
+                f'DELETE FROM restaurants_p_default WHERE "{partition_column}" = %s',
+                (value,),
+            )
+            _create_partition(cursor, partition_column, value)
+            cursor.execute("INSERT INTO restaurants SELECT * FROM moved_restaurants;")
+            cursor.execute("DROP TABLE moved_restaurants;")
+
+        refresh_partition_metadata(cursor)
+        conn.commit()
+
+        if new_values:
+            print(f"Created {len(new_values)} new restaurant partitions")
+    except Exception as e:
+        conn.rollback()
+        print(f"Error refreshing restaurant partitions: {e}")
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def get_partition_metadata():
+    """
+    Get the cached partition metadata.
+
+    Returns:
+        dict: Partition column and partition bounding boxes, or None if the
+            restaurants table isn't partitioned
+    """
+    global _metadata, _metadata_loaded_at
+
+    with _lock:
+        if time.time() - _metadata_loaded_at < PARTITION_METADATA_TTL:
+            return _metadata
+
+    metadata = None
+    conn = get_db_connection(read_only=True)
+    cursor = conn.cursor()
+
+    try:
+        if _is_partitioned(cursor):
+            cursor.execute("""
+            SELECT partition_table, partition_column, partition_key, is_default,
+                min_lat, max_lat, min_lng, max_lng, row_count
+            FROM restaurant_partitions
+            """)
+            rows = cursor.fetchall()
+            if rows:
+                metadata = {
+                    "partition_column": rows[0][1],
+                    "partitions": [
+                        {
+                            "partition_table": row[0],
+                            "partition_key": row[2],
+                            "is_default": row[3],
+                            "min_lat": row[4],
+                            "max_lat": row[5],
+                            "min_lng": row[6],
+                            "max_lng": row[7],
+                            "row_count": row[8],
+                        }
+                        for row in rows
+                    ],
+                }
+        conn.rollback()
+    except Exception as e:
+        conn.rollback()
+        print(f"Error loading partition metadata: {e}")
+    finally:
+        cursor.close()
+        conn.close()
+
+    with _lock:
+        if metadata:
+            for partition in metadata["partitions"]:
+                extent = _extents.get(partition["partition_key"])
+                if extent:
+                    _widen(partition, extent)
+        _metadata = metadata
+        _metadata_loaded_at = time.time()
+
+    return metadata
+
+
+def _widen(partition, extent):
+    """Widen the bounding box of a partition to cover an extent."""
+    min_lat, max_lat, min_lng, max_lng = extent
+    if not partition["row_count"]:
+        partition.update(
+            min_lat=min_lat, max_lat=max_lat, min_lng=min_lng, max_lng=max_lng
+        )
+    else:
+        partition["min_lat"] = min(partition["min_lat"], min_lat)
+        partition["max_lat"] = max(partition["max_lat"], max_lat)
+        partition["min_lng"] = min(partition["min_lng"], min_lng)
+        partition["max_lng"] = max(partition["max_lng"], max_lng)
+    partition["row_count"] = max(partition["row_count"] or 0, 1)
+
+
+def apply_restaurant_changes(changes):
+    """
+    Widen the cached bounding boxes of the partitions receiving restaurants
+    published by the change feed, so pruning doesn't skip them.
+
+    Args:
+        changes (list): Change feed payloads with the new coordinates and
+            partition key
+    """
+    global _pruning_suspended
+
+    with _lock:
+        if _metadata is None:
+            return
+
+        column = _metadata["partition_column"]
+        partitions = {
+            partition["partition_key"]: partition
+            for partition in _metadata["partitions"]
+            if not partition["is_default"]
+        }
+
+        for change in changes:
+            # Removed rows can't be missed by pruning
+            if change["op"] == "DELETE":
+                continue
+
+            lat = change.get("new_Latitude")
+            lng = change.get("new_Longitude")
+            key = change.get(f"new_{column}")
+            key = None if key is None else str(key)
+            if lat is None or lng is None or key not in partitions:
+                _pruning_suspended = True
+                continue
+
+            lat, lng = float(lat), float(lng)
+            extent = _extents.get(key, [lat, lat, lng, lng])
+            _extents[key] = [
+                min(extent[0], lat),
+                max(extent[1], lat),
+                min(extent[2], lng),
+                max(extent[3], lng),
+            ]
+            _widen(partitions[key], _extents[key])
+
+
+def reset_partition_metadata():
+    """Reload the partition metadata on next use."""
+    global _metadata_loaded_at, _pruning_suspended
+
+    with _lock:
+        _extents.clear()
+        _pruning_suspended = False
+        _metadata_loaded_at = 0.0
+
+
+def get_partition_filter(lat, lng, radius_km, table_name="restaurants"):
+    """
+    Build a WHERE clause restricting a search to the partitions it can touch.
+
+    Partitions are kept if their bounding box intersects the bounding box of
+    the search circle. The partition keys are inlined as constants, so
+    Postgres prunes the other partitions at plan time.
+
+    Args:
+        lat (float): Latitude of center point
+        lng (float): Longitude of center point
+        radius_km (float): Search radius in kilometers
+        table_name (str): Table searched; only restaurants are partitioned
+
+    Returns:
+        tuple: (SQL fragment starting with AND, list of parameters), or an
+            empty fragment when the table isn't partitioned or pruning
+            can't be applied safely
+    """
+    if table_name != "restaurants":
+        return "", []
+
+    metadata = get_partition_metadata()
+    if not metadata or _pruning_suspended:
+        return "", []
+
+    min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+    if min_lng <= max_lng:
+        lng_ranges = [(min_lng, max_lng)]
+    else:
+        # The box crosses the antimeridian
+        lng_ranges = [(min_lng, 180.0), (-180.0, max_lng)]
+
+    keys = []
+    for partition in metadata["partitions"]:
+        if not partition["row_count"]:
+            continue
+
+        if partition["is_default"]:
+            # Rows in the default partition have no key to filter on
+            return "", []
+
+        if (
+            partition["min_lat"] <= max_lat
+            and partition["max_lat"] >= min_lat
+            and any(
+                partition["min_lng"] <= high and partition["max_lng"] >= low
+                for low, high in lng_ranges
+            )
+        ):
+            keys.append(partition["partition_key"])
+
+    return f' AND "{metadata["partition_column"]}" = ANY(%s)', [keys]
+
+
+def get_partition_scan_counts():
+    """
+    Get the cumulative scan counts of every restaurant partition.
+
+    Returns:
+        dict: Partition table name to {'seq_scan', 'idx_scan'}, empty if the
+            table isn't partitioned
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("""
+        SELECT s.relname, s.seq_scan, COALESCE(s.idx_scan, 0)
+        FROM pg_stat_user_tables s
+        JOIN pg_inherits i ON i.inhrelid = s.relid
+        WHERE i.inhparent = to_regclass('restaurants')
+        """)
+        return {
+            relname: {"seq_scan": seq_scan, "idx_scan": idx_scan}
+            for relname, seq_scan, idx_scan in cursor.fetchall()
+        }
+    finally:
+        cursor.close()
+        conn.close()
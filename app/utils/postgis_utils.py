@@ -1,5 +1,45 @@
 from psycopg2.extras import RealDictCursor
-from app.utils.db_utils import get_db_connection, execute_query
+from app.utils.db_utils import (
+    SPATIAL_TABLES,
+    get_db_connection,
+    execute_query,
+    get_select_list,
+)
+from app.utils.partition_utils import get_partition_filter
+from app.utils.hours_utils import open_filter
+
+
+def populate_geometry_column(cursor, table_name):
+    """
+    Add the geom column to a table and fill the rows where it is NULL.
+
+    Args:
+        cursor: Database cursor, committed by the caller
+        table_name (str): 'restaurants' or 'users'
+    """
+    # Check if geom column exists
+    cursor.execute(
+        """
+    SELECT column_name FROM information_schema.columns 
+    WHERE table_name = %s AND column_name = 'geom'
+    """,
+        (table_name,),
+    )
+    geom_exists = cursor.fetchone() is not None
+
+    if not geom_exists:
+        # Add geometry column
+        cursor.execute(f"""
+        ALTER TABLE {table_name} 
+        ADD COLUMN geom geometry(Point, 4326);
+        """)
+
+    # Update the geometry from lat/lng - using proper capitalized column names
+    cursor.execute(f"""
+    UPDATE {table_name}
+    SET geom = ST_SetSRID(ST_MakePoint("Longitude", "Latitude"), 4326)
+    WHERE geom IS NULL;
+    """)
 
 
 def initialize_postgis_indexes():
@@ -11,33 +51,15 @@ def initialize_postgis_indexes():
         # Enable PostGIS extension
         cursor.execute("CREATE EXTENSION IF NOT EXISTS postgis;")
 
-        # Check if geom column exists
-        cursor.execute("""
-        SELECT column_name FROM information_schema.columns 
-        WHERE table_name = 'restaurants' AND column_name = 'geom'
-        """)
-        geom_exists = cursor.fetchone() is not None
+        for table_name in SPATIAL_TABLES:
+            populate_geometry_column(cursor, table_name)
 
-        if not geom_exists:
-            # Add geometry column
-            cursor.execute("""
-            ALTER TABLE restaurants 
-            ADD COLUMN geom geometry(Point, 4326);
+            # Create spatial index
+            cursor.execute(f"""
+            CREATE INDEX IF NOT EXISTS idx_{table_name}_geom 
+            ON {table_name} USING GIST (geom);
             """)
 
-        # Update the geometry from lat/lng - using proper capitalized column names
-        cursor.execute("""
-        UPDATE restaurants
-        SET geom = ST_SetSRID(ST_MakePoint("Longitude", "Latitude"), 4326)
-        WHERE geom IS NULL;
-        """)
-
-        # Create spatial index
-        cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_restaurants_geom 
-        ON restaurants USING GIST (geom);
-        """)
-
         conn.commit()
         print("PostGIS extension and spatial indexes created successfully")
     except Exception as e:
@@ -48,38 +70,68 @@ def initialize_postgis_indexes():
         conn.close()
 
 
-def find_nearby_restaurants_postgis(lat, lng, radius_km):
+def find_nearby_postgis(table_name, lat, lng, radius_km, open_slot=None):
     """
-    Find restaurants using PostGIS spatial index.
+    Find rows of a spatial table using its PostGIS spatial index.
 
     Args:
+        table_name (str): 'restaurants' or 'users'
         lat (float): Latitude of center point
         lng (float): Longitude of center point
         radius_km (float): Search radius in kilometers
+        open_slot (int): Keep only restaurants open in this slot of the week
 
     Returns:
-        list: Restaurants within the radius, ordered by distance
+        list: Rows within the radius, ordered by distance
     """
-    query = """
+    # Restrict the search to the partitions the circle can touch
+    partition_filter, partition_params = get_partition_filter(
+        lat, lng, radius_km, table_name
+    )
+    hours_filter, hours_params = open_filter(open_slot)
+
+    query = f"""
     SELECT 
-        *, 
+        {get_select_list(table_name)}, 
         ST_Distance(
             geom::geography, 
             ST_SetSRID(ST_MakePoint(%s, %s), 4326)::geography
         ) / 1000 AS distance
     FROM 
-        restaurants
+        {table_name}
     WHERE 
         ST_DWithin(
             geom::geography, 
             ST_SetSRID(ST_MakePoint(%s, %s), 4326)::geography, 
             %s * 1000
         )
+        {partition_filter}{hours_filter}
     ORDER BY 
         distance;
     """
 
     # Note: PostGIS uses (longitude, latitude) order in ST_MakePoint
-    params = (lng, lat, lng, lat, radius_km)
+    params = (lng, lat, lng, lat, radius_km, *partition_params, *hours_params)
+
+    return execute_query(query, params, read_only=True)
+
+
+def find_nearby_restaurants_postgis(lat, lng, radius_km, open_slot=None):
+    """
+    Find restaurants using PostGIS spatial index.
+
+    Args:
+        lat (float): Latitude of center point
+        lng (float): Longitude of center point
+        radius_km (float): Search radius in kilometers
+        open_slot (int): Keep only restaurants open in this slot of the week
+
+    Returns:
+        list: Restaurants within the radius, ordered by distance
+    """
+    return find_nearby_postgis("restaurants", lat, lng, radius_km, open_slot)
+
 
-    return execute_query(query, params)
+def find_nearby_users_postgis(lat, lng, radius_km):
+    """Find users using their PostGIS spatial index."""
+    return find_nearby_postgis("users", lat, lng, radius_km)
@@ -0,0 +1,217 @@
+import os
+import sys
+import time
+import hmac
+import random
+import marshal
+import pstats
+import cProfile
+import threading
+from flask import g, request
+
+# Token that unlocks the /debug endpoints, sent as X-Profile-Token; the
+# endpoints are disabled while it is unset
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN", "")
+PROFILE_TOKEN_HEADER = "X-Profile-Token"
+
+# Longest sampling profile a request may ask for, in seconds
+PROFILE_MAX_SECONDS = float(os.environ.get("PROFILE_MAX_SECONDS", 60))
+
+# Time between two stack samples, in seconds
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", 0.005))
+
+# Share of requests profiled with cProfile, aggregated per route; 0 disables
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+
+# Frames a thread sits in while it waits for work; such samples are skipped
+# unless idle threads are requested
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("socket.py", "accept"),
+    ("socketserver.py", "serve_forever"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+_sampling_lock = threading.Lock()
+_request_profile_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_route_stats = {}
+
+
+def is_authorized(req):
+    """Check the profiling token of a request in constant time."""
+    token = req.headers.get(PROFILE_TOKEN_HEADER, "")
+    return bool(PROFILE_TOKEN) and hmac.compare_digest(token, PROFILE_TOKEN)
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return (
+        f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    )
+
+
+def _collapse(frame):
+    """List the frames of a stack from the root to the given leaf."""
+    stack = []
+    while frame is not None:
+        stack.append(frame)
+        frame = frame.f_back
+    return stack[::-1]
+
+
+def _is_idle(frame):
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+
+
+def sample_stacks(seconds, interval=PROFILE_INTERVAL, include_idle=False):
+    """
+    Sample the stacks of every thread of the process.
+
+    The calling thread only sleeps between samples; the sampled threads run
+    undisturbed apart from the brief moment the stacks are read.
+
+    Args:
+        seconds (float): How long to sample
+        interval (float): Time between two samples
+        include_idle (bool): Keep samples of threads waiting for work
+
+    Returns:
+        dict: Sample counts by collapsed stack ('root;...;leaf'), or None if
+            another profile is running
+    """
+    if not _sampling_lock.acquire(blocking=False):
+        return None
+
+    own_thread = threading.get_ident()
+    names = {}
+    counts = {}
+    try:
+        end_time = time.monotonic() + seconds
+        while time.monotonic() < end_time:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                if not include_idle and _is_idle(frame):
+                    continue
+
+                if thread_id not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                labels = [names.get(thread_id, str(thread_id))]
+                labels += [_frame_label(f) for f in _collapse(frame)]
+                stack = ";".join(labels)
+                counts[stack] = counts.get(stack, 0) + 1
+            time.sleep(interval)
+    finally:
+        _sampling_lock.release()
+
+    return counts
+
+
+def format_collapsed(counts):
+    """Format sample counts as collapsed stacks for flamegraph tools."""
+    lines = [
+        f"{stack} {count}"
+        for stack, count in sorted(counts.items(), key=lambda item: -item[1])
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def start_request_profile():
+    """Profile a random PROFILE_SAMPLE_RATE share of requests with cProfile."""
+    if not PROFILE_SAMPLE_RATE or random.random() >= PROFILE_SAMPLE_RATE:
+        return
+    if request.endpoint is None or request.blueprint == "debug":
+        return
+
+    # One request at a time; profilers of concurrent threads would conflict
+    if not _request_profile_lock.acquire(blocking=False):
+        return
+
+    profiler = cProfile.Profile()
+    g.request_profiler = profiler
+    profiler.enable()
+
+
+def finish_request_profile(exception=None):
+    """Add the profile of a sampled request to the stats of its route."""
+    profiler = g.pop("request_profiler", None)
+    if profiler is None:
+        return
+
+    profiler.disable()
+    _request_profile_lock.release()
+
+    with _stats_lock:
+        route = _route_stats.get(request.endpoint)
+        if route is None:
+            _route_stats[request.endpoint] = {
+                "requests": 1,
+                "stats": pstats.Stats(profiler),
+            }
+        else:
+            route["requests"] += 1
+            route["stats"].add(profiler)
+
+
+def get_route_profiles(limit=20):
+    """
+    Summarize the aggregated cProfile stats of every sampled route.
+
+    Args:
+        limit (int): Functions listed per route, by cumulative time
+
+    Returns:
+        dict: Sampled requests and top functions per route
+    """
+    with _stats_lock:
+        routes = {}
+        for endpoint, route in sorted(_route_stats.items()):
+            functions = sorted(
+                route["stats"].stats.items(), key=lambda item: -item[1][3]
+            )[:limit]
+            routes[endpoint] = {
+                "requests": route["requests"],
+                "functions": [
+                    {
+                        "function": f"{name} ({os.path.basename(filename)}:{line})",
+                        "calls": timings[1],
+                        "total_seconds": timings[2],
+                        "cumulative_seconds": timings[3],
+                    }
+                    for (filename, line, name), timings in functions
+                ],
+            }
+
+    return {"sample_rate": PROFILE_SAMPLE_RATE, "routes": routes}
+
+
+def dump_route_profile(endpoint):
+    """
+    Export the aggregated stats of one route in the pstats file format,
+    readable by pstats.Stats, snakeviz or gprof2dot.
+
+    Returns:
+        bytes: Marshalled stats, or None if the route wasn't sampled
+    """
+    with _stats_lock:
+        route = _route_stats.get(endpoint)
+        if route is None:
+            return None
+        return marshal.dumps(route["stats"].stats)
+
+
+def reset_route_profiles():
+    """Forget the aggregated stats of every route."""
+    with _stats_lock:
+        _route_stats.clear()
+
+
+def init_app(app):
+    """Profile a sample of the app's requests."""
+    app.before_request(start_request_profile)
+    app.teardown_request(finish_request_profile)
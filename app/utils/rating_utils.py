@@ -0,0 +1,103 @@
+import threading
+from collections import OrderedDict
+from app.utils.db_utils import execute_query
+
+# Restaurants whose rating count and sum are cached in each worker
+RATING_CACHE_SIZE = 10000
+
+_lock = threading.Lock()
+_summaries = OrderedDict()
+
+# Bumped by every applied change, so summaries read while a change arrived
+# aren't cached
+_generation = 0
+
+
+def get_rating_summary(restaurant_id):
+    """
+    Get the average rating and rating count of a restaurant.
+
+    Summaries are cached while the change feed is live, which keeps them
+    current as ratings are added, changed or removed, and are then read from
+    the primary. Without it, they are read from the database, possibly a
+    replica, on every call.
+
+    Args:
+        restaurant_id (int): Restaurant ID
+
+    Returns:
+        dict: avg_rating (None without ratings) and rating_count
+    """
+    from app.utils.changefeed_utils import is_live
+
+    live = is_live()
+    with _lock:
+        generation = _generation
+        if live and restaurant_id in _summaries:
+            _summaries.move_to_end(restaurant_id)
+            count, total = _summaries[restaurant_id]
+            return _summary(count, total)
+
+    ratings_query = """
+    SELECT COUNT(*) as rating_count, SUM("Rating") as rating_sum
+    FROM ratings
+    WHERE "Placeid" = %s
+    """
+    # Summaries that get cached are read from the primary: a replica behind
+    # it could miss changes the change feed already delivered, and the
+    # stale summary would stay cached
+    row = execute_query(
+        ratings_query, (restaurant_id,), fetch_all=False, read_only=not live
+    )
+    count, total = row["rating_count"], float(row["rating_sum"] or 0)
+
+    with _lock:
+        if live and generation == _generation:
+            _summaries[restaurant_id] = [count, total]
+            while len(_summaries) > RATING_CACHE_SIZE:
+                _summaries.popitem(last=False)
+
+    return _summary(count, total)
+
+
+def _summary(count, total):
+    return {
+        "avg_rating": total / count if count else None,
+        "rating_count": count,
+    }
+
+
+def apply_rating_changes(changes):
+    """
+    Update the cached summaries for ratings published by the change feed.
+
+    Args:
+        changes (list): Change feed payloads with the old and new Placeid
+            and Rating
+    """
+    global _generation
+
+    with _lock:
+        _generation += 1
+        for change in changes:
+            for prefix, step in (("old_", -1), ("new_", 1)):
+                if change["op"] == ("INSERT" if prefix == "old_" else "DELETE"):
+                    continue
+                if f"{prefix}Placeid" not in change:
+                    # The ratings table has other columns; nothing to update
+                    _summaries.clear()
+                    return
+
+                summary = _summaries.get(change[f"{prefix}Placeid"])
+                if summary is not None:
+                    summary[0] += step
+                    summary[1] += step * float(change.get(f"{prefix}Rating") or 0)
+
+
+def reset_rating_summaries():
+    """Forget every cached summary."""
+    global _generation
+
+    with _lock:
+        _generation += 1
+        _summaries.clear()
@@ -0,0 +1,250 @@
+import os
+import math
+import time
+import random
+import statistics
+import numpy as np
+from app.utils.db_utils import get_db_connection
+from app.utils.search_utils import (
+    APPROXIMATE_METHODS,
+    VALID_METHODS,
+    get_search_function,
+)
+
+# Radii of the random queries, in kilometers
+RECALL_RADII_KM = [
+    float(radius)
+    for radius in os.environ.get("RECALL_RADII_KM", "0.5,1,2,5,10,25").split(",")
+    if radius.strip()
+]
+
+# Disagreements this close to the radius, relative to it, are reported as
+# boundary cases. PostGIS measures on the WGS84 spheroid, which differs from
+# the sphere of the other methods by up to 0.5%.
+RECALL_BOUNDARY_TOLERANCE = float(os.environ.get("RECALL_BOUNDARY_TOLERANCE", 0.005))
+
+# Shares of the queries placed anywhere on the globe, and near the poles or
+# the antimeridian; the rest are placed close to a restaurant
+UNIFORM_QUERY_SHARE = 0.2
+EDGE_CASE_QUERY_SHARE = 0.1
+
+# Queries near a restaurant are moved from it by up to this many degrees
+QUERY_JITTER_DEGREES = 0.05
+
+ID_COLUMN = "Restaurantid"
+EARTH_RADIUS_KM = 6371
+
+
+def load_reference_points():
+    """
+    Load every restaurant coordinate for the brute-force reference.
+
+    Returns:
+        tuple: (ids, lats, lngs) numpy arrays
+    """
+    conn = get_db_connection(read_only=True)
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(f"""
+        SELECT "{ID_COLUMN}", "Latitude", "Longitude"
+        FROM restaurants
+        WHERE "Latitude" IS NOT NULL AND "Longitude" IS NOT NULL
+        """)
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+    return (
+        np.array([row[0] for row in rows], dtype=np.int64),
+        np.array([float(row[1]) for row in rows], dtype=np.float64),
+        np.array([float(row[2]) for row in rows], dtype=np.float64),
+    )
+
+
+def generate_queries(lats, lngs, num_queries, seed=0):
+    """
+    Generate random nearby searches.
+
+    Most queries are placed close to a restaurant, some anywhere on the globe,
+    and some near the poles and the antimeridian, where bounding boxes and
+    cell coverings are most likely to break.
+
+    Returns:
+        list: (lat, lng, radius_km) tuples
+    """
+    rng = random.Random(seed)
+    queries = []
+
+    for _ in range(num_queries):
+        radius_km = rng.choice(RECALL_RADII_KM)
+        kind = rng.random()
+
+        if kind < EDGE_CASE_QUERY_SHARE or len(lats) == 0:
+            if rng.random() < 0.5:
+                lat = rng.choice([-1, 1]) * rng.uniform(85, 90)
+                lng = rng.uniform(-180, 180)
+            else:
+                lat = rng.uniform(-80, 80)
+                lng = rng.choice([-1, 1]) * rng.uniform(179.5, 180)
+        elif kind < EDGE_CASE_QUERY_SHARE + UNIFORM_QUERY_SHARE:
+            # Uniform on the sphere rather than in latitude
+            lat = math.degrees(math.asin(rng.uniform(-1, 1)))
+            lng = rng.uniform(-180, 180)
+        else:
+            index = rng.randrange(len(lats))
+            lat = float(lats[index]) + rng.uniform(-1, 1) * QUERY_JITTER_DEGREES
+            lng = float(lngs[index]) + rng.uniform(-1, 1) * QUERY_JITTER_DEGREES
+            lat = max(-90.0, min(90.0, lat))
+            lng = (lng + 180) % 360 - 180
+
+        queries.append((lat, lng, radius_km))
+
+    return queries
+
+
+def _reference_distances(lats, lngs, lat, lng):
+    """Haversine distance from a point to every restaurant, in km."""
+    lat1 = math.radians(lat)
+    lat2 = np.radians(lats)
+    dlat = lat2 - lat1
+    dlng = np.radians(lngs - lng)
+    a = np.sin(dlat / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _summarize(method, samples, errors):
+    """Aggregate the per-query comparisons of one method."""
+    summary = {"method": method, "queries": len(samples), "errors": errors}
+    if not samples:
+        return summary
+
+    latencies = sorted(sample["seconds"] * 1000 for sample in samples)
+    summary.update(
+        {
+            "mean_recall": statistics.mean(s["recall"] for s in samples),
+            "min_recall": min(s["recall"] for s in samples),
+            "mean_precision": statistics.mean(s["precision"] for s in samples),
+            "min_precision": min(s["precision"] for s in samples),
+            "queries_with_misses": sum(1 for s in samples if s["missed"]),
+            "queries_with_extras": sum(1 for s in samples if s["extra"]),
+            "missed_rows": sum(s["missed"] for s in samples),
+            "boundary_misses": sum(s["boundary_missed"] for s in samples),
+            "extra_rows": sum(s["extra"] for s in samples),
+            "boundary_extras": sum(s["boundary_extra"] for s in samples),
+            "max_extra_distance_km": max(s["max_extra_km"] for s in samples),
+            "avg_ms": statistics.mean(latencies),
+            "p95_ms": latencies[int(0.95 * (len(latencies) - 1))],
+        }
+    )
+    return summary
+
+
+def measure_recall(methods=None, num_queries=1000, seed=0):
+    """
+    Measure the recall, precision and latency of each backend against an
+    exact brute-force search over random queries.
+
+    Recall is the share of the restaurants truly within the radius that a
+    backend returns, precision the share of the returned restaurants that are
+    truly within it. Methods with an approximate mode are also measured with
+    it, reported as '<method>_approximate' with its speedup over the exact
+    mode.
+
+    Args:
+        methods (list): Indexing methods to measure, defaults to all except
+            'auto'
+        num_queries (int): Random queries run against every method
+        seed (int): Seed of the query generator
+
+    Returns:
+        dict: Queries run and one summary per method
+    """
+    methods = methods or [method for method in VALID_METHODS if method != "auto"]
+    ids, lats, lngs = load_reference_points()
+    positions = {int(row_id): index for index, row_id in enumerate(ids)}
+    queries = generate_queries(lats, lngs, num_queries, seed)
+
+    variants = [(method, False) for method in methods]
+    variants += [(method, True) for method in methods if method in APPROXIMATE_METHODS]
+
+    samples = {variant: [] for variant in variants}
+    errors = {variant: 0 for variant in variants}
+
+    for lat, lng, radius_km in queries:
+        distances = _reference_distances(lats, lngs, lat, lng)
+        expected = set(ids[distances < radius_km].tolist())
+        boundary_low = radius_km * (1 - RECALL_BOUNDARY_TOLERANCE)
+        boundary_high = radius_km * (1 + RECALL_BOUNDARY_TOLERANCE)
+
+        for method, approximate in variants:
+            search = get_search_function(method, approximate=approximate)
+            try:
+                start_time = time.time()
+                results = search(lat, lng, radius_km)
+                seconds = time.time() - start_time
+            except Exception as e:
+                print(f"{method} failed at ({lat}, {lng}, {radius_km} km): {e}")
+                errors[(method, approximate)] += 1
+                continue
+
+            found = {int(row[ID_COLUMN]) for row in results}
+            missed = expected - found
+            extra = found - expected
+            extra_distances = [
+                float(distances[positions[row_id]])
+                for row_id in extra
+                if row_id in positions
+            ]
+
+            samples[(method, approximate)].append(
+                {
+                    "seconds": seconds,
+                    "recall": (
+                        (len(expected & found) / len(expected)) if expected else 1.0
+                    ),
+                    "precision": (len(expected & found) / len(found)) if found else 1.0,
+                    "missed": len(missed),
+                    "boundary_missed": sum(
+                        1
+                        for row_id in missed
+                        if distances[positions[row_id]] >= boundary_low
+                    ),
+                    "extra": len(extra),
+                    "boundary_extra": sum(
+                        1 for d in extra_distances if d <= boundary_high
+                    ),
+                    "max_extra_km": max(
+                        (d - radius_km for d in extra_distances), default=0.0
+                    ),
+                }
+            )
+
+    summaries = {}
+    for method, approximate in variants:
+        name = f"{method}_approximate" if approximate else method
+        summaries[name] = _summarize(
+            name, samples[(method, approximate)], errors[(method, approximate)]
+        )
+
+    # Speedup of each approximate mode over the exact search of its method
+    for method in methods:
+        name = f"{method}_approximate"
+        if (
+            name in summaries
+            and summaries[name].get("avg_ms")
+            and summaries[method].get("avg_ms")
+        ):
+            summaries[name]["speedup"] = (
+                summaries[method]["avg_ms"] / summaries[name]["avg_ms"]
+            )
+
+    return {
+        "queries": len(queries),
+        "seed": seed,
+        "radii_km": RECALL_RADII_KM,
+        "reference_rows": len(ids),
+        "boundary_tolerance": RECALL_BOUNDARY_TOLERANCE,
+        "methods": summaries,
+    }
@@ -0,0 +1,233 @@
+import os
+import time
+import threading
+import psycopg2
+import psycopg2.extensions
+
+# Read replicas as a comma-separated list of host[:port] entries, which share
+# the primary's database name and credentials, or full libpq DSNs
+DB_REPLICA_HOSTS = os.environ.get("DB_REPLICA_HOSTS", "")
+
+# 'round_robin' or 'least_latency'
+DB_REPLICA_BALANCING = os.environ.get("DB_REPLICA_BALANCING", "round_robin")
+
+# Replicas lagging further behind the primary than this are skipped
+DB_REPLICA_MAX_LAG_SECONDS = float(os.environ.get("DB_REPLICA_MAX_LAG_SECONDS", 10))
+
+# How often the replication lag of a replica is re-checked
+DB_REPLICA_LAG_CHECK_INTERVAL = float(
+    os.environ.get("DB_REPLICA_LAG_CHECK_INTERVAL", 5)
+)
+
+# How long a replica that failed to connect is left out of the rotation
+DB_REPLICA_RETRY_SECONDS = float(os.environ.get("DB_REPLICA_RETRY_SECONDS", 30))
+
+DB_REPLICA_CONNECT_TIMEOUT = int(os.environ.get("DB_REPLICA_CONNECT_TIMEOUT", 2))
+
+# Weight of the newest sample in the latency moving average
+LATENCY_SMOOTHING = 0.2
+
+
+class RoutedConnection(psycopg2.extensions.connection):
+    """Connection that remembers which replica it was opened against."""
+
+    replica_name = None
+
+
+def _parse_replicas(hosts):
+    """Parse the DB_REPLICA_HOSTS setting into replica descriptions."""
+    replicas = []
+    entries = [entry.strip() for entry in hosts.split(",") if entry.strip()]
+    for index, entry in enumerate(entries):
+        if "=" in entry or "://" in entry:
+            # DSNs may carry a password, so they are reported by position
+            replica = {"name": f"replica{index}", "dsn": entry, "params": {}}
+        else:
+            host, _, port = entry.partition(":")
+            replica = {
+                "name": entry,
+                "dsn": None,
+                "params": {"host": host, "port": port or "5432"},
+            }
+
+        replica.update(
+            {
+                "down_until": 0.0,
+                "lag_seconds": None,
+                "lag_checked_at": 0.0,
+                "latency_ewma": None,
+                "queries": 0,
+                "failures": 0,
+            }
+        )
+        replicas.append(replica)
+
+    return replicas
+
+
+_replicas = _parse_replicas(DB_REPLICA_HOSTS)
+_lock = threading.Lock()
+_next_replica = 0
+_primary_fallbacks = 0
+
+
+def has_replicas():
+    """Check whether any read replica is configured."""
+    return bool(_replicas)
+
+
+def _check_lag(conn, replica):
+    """Refresh the replication lag of a replica using an open connection."""
+    cursor = conn.cursor()
+    try:
+        # A standby that has replayed everything it received is up to date,
+        # even if the primary has been idle for a while
+        cursor.execute("""
+        SELECT CASE
+            WHEN NOT pg_is_in_recovery() THEN 0
+            WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+        END
+        """)
+        lag_seconds = float(cursor.fetchone()[0])
+        conn.rollback()
+    finally:
+        cursor.close()
+
+    with _lock:
+        replica["lag_seconds"] = lag_seconds
+        replica["lag_checked_at"] = time.time()
+
+    return lag_seconds
+
+
+def _candidate_replicas():
+    """List the replicas that are up and within the lag threshold, in order."""
+    global _next_replica
+
+    now = time.time()
+    with _lock:
+        candidates = [
+            replica
+            for replica in _replicas
+            if replica["down_until"] <= now
+            and (
+                replica["lag_seconds"] is None
+                or replica["lag_seconds"] <= DB_REPLICA_MAX_LAG_SECONDS
+                # Give lagging replicas another chance once the lag is stale
+                or now - replica["lag_checked_at"] >= DB_REPLICA_LAG_CHECK_INTERVAL
+            )
+        ]
+
+        if DB_REPLICA_BALANCING == "least_latency":
+            # Replicas without measurements sort first so they get probed
+            candidates.sort(
+                key=lambda r: -1 if r["latency_ewma"] is None else r["latency_ewma"]
+            )
+        elif candidates:
+            start = _next_replica % len(candidates)
+            candidates = candidates[start:] + candidates[:start]
+            _next_replica += 1
+
+    return candidates
+
+
+def get_replica_connection(connect_kwargs):
+    """
+    Open a connection to a healthy read replica.
+
+    Args:
+        connect_kwargs (dict): Database name and credentials shared with the
+            primary
+
+    Returns:
+        connection: Replica connection, or None if no replica is usable and
+            the caller should fall back to the primary
+    """
+    global _primary_fallbacks
+
+    for replica in _candidate_replicas():
+        try:
+            if replica["dsn"]:
+                conn = psycopg2.connect(
+                    replica["dsn"],
+                    connect_timeout=DB_REPLICA_CONNECT_TIMEOUT,
+                    connection_factory=RoutedConnection,
+                )
+            else:
+                params = dict(connect_kwargs)
+                params.update(replica["params"])
+                conn = psycopg2.connect(
+                    connect_timeout=DB_REPLICA_CONNECT_TIMEOUT,
+                    connection_factory=RoutedConnection,
+                    **params,
+                )
+        except psycopg2.OperationalError as e:
+            print(f"Replica {replica['name']} unavailable: {e}")
+            with _lock:
+                replica["failures"] += 1
+                replica["down_until"] = time.time() + DB_REPLICA_RETRY_SECONDS
+            continue
+
+        conn.replica_name = replica["name"]
+
+        try:
+            if time.time() - replica["lag_checked_at"] >= DB_REPLICA_LAG_CHECK_INTERVAL:
+                if _check_lag(conn, replica) > DB_REPLICA_MAX_LAG_SECONDS:
+                    print(
+                        f"Replica {replica['name']} is {replica['lag_seconds']:.1f}s "
+                        f"behind, skipping it"
+                    )
+                    conn.close()
+                    continue
+        except psycopg2.Error as e:
+            print(f"Replica {replica['name']} lag check failed: {e}")
+            conn.close()
+            with _lock:
+                replica["failures"] += 1
+                replica["down_until"] = time.time() + DB_REPLICA_RETRY_SECONDS
+            continue
+
+        return conn
+
+    with _lock:
+        _primary_fallbacks += 1
+
+    return None
+
+
+def record_replica_latency(replica_name, seconds):
+    """Feed a query latency into the moving average of a replica."""
+    with _lock:
+        for replica in _replicas:
+            if replica["name"] == replica_name:
+                replica["queries"] += 1
+                if replica["latency_ewma"] is None:
+                    replica["latency_ewma"] = seconds
+                else:
+                    replica["latency_ewma"] += LATENCY_SMOOTHING * (
+                        seconds - replica["latency_ewma"]
+                    )
+                break
+
+
+def get_replica_status():
+    """Report the state of every configured replica."""
+    now = time.time()
+    with _lock:
+        return {
+            "balancing": DB_REPLICA_BALANCING,
+            "max_lag_seconds": DB_REPLICA_MAX_LAG_SECONDS,
+            "primary_fallbacks": _primary_fallbacks,
+            "replicas": [
+                {
+                    "name": replica["name"],
+                    "available": replica["down_until"] <= now,
+                    "lag_seconds": replica["lag_seconds"],
+                    "latency_ewma_seconds": replica["latency_ewma"],
+                    "queries": replica["queries"],
+                    "failures": replica["failures"],
+                }
+                for replica in _replicas
+            ],
+        }
@@ -0,0 +1,287 @@
+import os
+import json
+import gzip
+import time
+import uuid
+import datetime
+from decimal import Decimal
+from flask import g, request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# JSON serializer of the responses: 'orjson', 'json' (standard library) or
+# 'auto' for orjson when it is installed
+JSON_SERIALIZER = os.environ.get("JSON_SERIALIZER", "auto")
+
+# Responses smaller than this many bytes are sent uncompressed; below about
+# one packet compression costs more time than it saves
+COMPRESSION_MIN_BYTES = int(os.environ.get("COMPRESSION_MIN_BYTES", 1024))
+
+# Encodings offered to clients, most preferred first. Encodings whose module
+# is not installed are skipped.
+COMPRESSION_ENCODINGS = [
+    encoding.strip()
+    for encoding in os.environ.get("COMPRESSION_ENCODINGS", "zstd,br,gzip").split(",")
+    if encoding.strip()
+]
+
+# Compression levels tuned for dynamic responses, where speed matters more
+# than the last few percent of size
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+ZSTD_LEVEL = 3
+
+COMPRESSIBLE_MIMETYPES = {
+    "application/json",
+    "application/geo+json",
+    "application/vnd.mapbox-vector-tile",
+}
+
+
+def _default(value):
+    """Convert the values the JSON serializers can't encode themselves."""
+    # DECIMAL columns such as "Latitude" are sent as numbers, not strings
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _dumps_orjson(obj, sort_keys=False, indent=False):
+    option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+    if sort_keys:
+        option |= orjson.OPT_SORT_KEYS
+    if indent:
+        option |= orjson.OPT_INDENT_2
+    return orjson.dumps(obj, default=_default, option=option)
+
+
+def _dumps_stdlib(obj, sort_keys=False, indent=False):
+    return json.dumps(
+        obj,
+        default=_default,
+        sort_keys=sort_keys,
+        indent=2 if indent else None,
+        separators=None if indent else (",", ":"),
+        ensure_ascii=False,
+    ).encode("utf-8")
+
+
+# Serializers by name; each one returns UTF-8 encoded bytes
+SERIALIZERS = {"json": _dumps_stdlib}
+if orjson is not None:
+    SERIALIZERS["orjson"] = _dumps_orjson
+
+
+def get_serializer_name(name=JSON_SERIALIZER):
+    """
+    Resolve the configured JSON serializer to an available one.
+
+    Args:
+        name (str): 'orjson', 'json' or 'auto'
+
+    Returns:
+        str: Name of the serializer used
+    """
+    if name == "auto":
+        return "orjson" if "orjson" in SERIALIZERS else "json"
+    if name not in SERIALIZERS:
+        print(f"Warning: JSON serializer '{name}' is not available. Using 'json'.")
+        return "json"
+    return name
+
+
+def dumps_json(obj, serializer=None, sort_keys=False, indent=False):
+    """
+    Serialize an object to JSON bytes.
+
+    Decimals become numbers, dates ISO 8601 strings.
+
+    Args:
+        obj: Object to serialize
+        serializer (str): Serializer to use, defaults to the configured one
+        sort_keys (bool): Sort the keys of every dict
+        indent (bool): Indent the output for readability
+
+    Returns:
+        bytes: UTF-8 encoded JSON
+    """
+    dumps = SERIALIZERS[serializer or get_serializer_name()]
+    return dumps(obj, sort_keys=sort_keys, indent=indent)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    JSON provider that serializes responses with the configured serializer
+    and records the time spent doing it for the Server-Timing header.
+    """
+
+    # Sorting keys is only useful for caching by content, which nothing does
+    sort_keys = False
+
+    def __init__(self, app, serializer=JSON_SERIALIZER):
+        super().__init__(app)
+        self.serializer = get_serializer_name(serializer)
+
+    def dumps(self, obj, **kwargs):
+        kwargs.setdefault("sort_keys", self.sort_keys)
+        if set(kwargs) - {"sort_keys", "indent"}:
+            # Options only the standard library understands
+            kwargs.setdefault("default", _default)
+            return json.dumps(obj, **kwargs)
+        return dumps_json(
+            obj,
+            self.serializer,
+            kwargs["sort_keys"],
+            bool(kwargs.get("indent")),
+        ).decode("utf-8")
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+
+        start_time = time.perf_counter()
+        body = dumps_json(obj, self.serializer, self.sort_keys, indent)
+        record_timing("serialize", time.perf_counter() - start_time)
+
+        return self._app.response_class(body + b"\n", mimetype=self.mimetype)
+
+
+def record_timing(metric, seconds):
+    """Add time to a metric of the current request's Server-Timing header."""
+    timings = g.setdefault("server_timings", {})
+    timings[metric] = timings.get(metric, 0.0) + seconds
+
+
+def get_available_encodings():
+    """List the configured compression encodings that are installed."""
+    installed = {"gzip": True, "br": brotli is not None, "zstd": zstandard is not None}
+    return [encoding for encoding in COMPRESSION_ENCODINGS if installed.get(encoding)]
+
+
+def negotiate_encoding(accept_encodings, encodings=None):
+    """
+    Pick the compression encoding of a response from the client's
+    Accept-Encoding header.
+
+    The encoding with the highest quality value wins; ties go to the server's
+    preference order.
+
+    Args:
+        accept_encodings: Parsed Accept-Encoding header (request.accept_encodings)
+        encodings (list): Encodings to choose from, defaults to the available ones
+
+    Returns:
+        str: Chosen encoding, or None to send the response uncompressed
+    """
+    best, best_quality = None, 0
+    for encoding in encodings or get_available_encodings():
+        quality = accept_encodings.quality(encoding)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(data, encoding):
+    """
+    Compress a response body.
+
+    Args:
+        data (bytes): Body to compress
+        encoding (str): 'gzip', 'br' or 'zstd'
+
+    Returns:
+        bytes: Compressed body
+    """
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=GZIP_LEVEL)
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def compress_response(response):
+    """
+    Compress a response in the best encoding the client accepts.
+
+    Streamed responses, responses that are already encoded and bodies below
+    COMPRESSION_MIN_BYTES are left as they are. A compressed response's ETag
+    becomes weak, since the bytes depend on the encoding.
+    """
+    if (
+        response.mimetype not in COMPRESSIBLE_MIMETYPES
+        or response.direct_passthrough
+        or response.is_streamed
+        or not 200 <= response.status_code < 300
+        or response.status_code == 206
+        or "Content-Encoding" in response.headers
+    ):
+        return response
+
+    # Caches must keep one copy per encoding, even of uncompressed responses
+    response.vary.add("Accept-Encoding")
+
+    data = response.get_data()
+    if len(data) < COMPRESSION_MIN_BYTES:
+        return response
+
+    encoding = negotiate_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    start_time = time.perf_counter()
+    compressed = compress(data, encoding)
+    record_timing("compress", time.perf_counter() - start_time)
+
+    response.set_data(compressed)
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def add_server_timing(response):
+    """Report serialization and compression time in a Server-Timing header."""
+    timings = g.get("server_timings")
+    if timings:
+        response.headers["Server-Timing"] = ", ".join(
+            f"{metric};dur={seconds * 1000:.3f}" for metric, seconds in timings.items()
+        )
+    return response
+
+
+def init_app(app):
+    """Serialize the app's JSON responses quickly and compress them."""
+    app.json = FastJSONProvider(app)
+
+    @app.after_request
+    def finish_response(response):
+        response = compress_response(response)
+        return add_server_timing(response)
+
+    print(
+        f"JSON serializer: {app.json.serializer}, compression: "
+        f"{', '.join(get_available_encodings()) or 'none'}"
+    )
@@ -0,0 +1,336 @@
+import os
+import time
+from functools import partial
+from app.utils.db_utils import execute_query, get_select_list
+from app.utils.hours_utils import open_filter
+from app.utils.partition_utils import get_partition_filter
+from app.utils.auto_utils import record_search_latency
+from app.utils.coalesce_utils import coalesce
+from app.utils.warmup_utils import log_search
+
+# Indexing methods that can serve nearby searches
+VALID_METHODS = ["basic", "btree", "postgis", "h3", "snapshot", "auto"]
+
+# Default method, used when a request doesn't pick one
+DEFAULT_INDEXING_METHOD = os.environ.get("INDEXING_METHOD", "basic")
+if DEFAULT_INDEXING_METHOD not in VALID_METHODS:
+    DEFAULT_INDEXING_METHOD = "basic"
+
+# Header that lets a request pick its backend, as an alternative to ?method=
+METHOD_HEADER = "X-Indexing-Method"
+
+# Indexing methods that can serve nearby user searches; the snapshot only
+# holds restaurants
+USER_METHODS = ["basic", "btree", "postgis", "h3", "auto"]
+
+# Indexing methods with an approximate mode, requested with ?approximate=1
+APPROXIMATE_METHODS = ["h3"]
+
+
+def find_nearby_basic(table_name, lat, lng, radius_km, open_slot=None):
+    """
+    Find rows of a spatial table with a full scan using the Haversine formula.
+
+    Args:
+        table_name (str): 'restaurants' or 'users'
+        lat (float): Latitude of center point
+        lng (float): Longitude of center point
+        radius_km (float): Search radius in kilometers
+        open_slot (int): Keep only restaurants open in this slot of the week
+
+    Returns:
+        list: Rows within the radius, ordered by distance
+    """
+    # Restrict the search to the partitions the circle can touch
+    partition_filter, partition_params = get_partition_filter(
+        lat, lng, radius_km, table_name
+    )
+    hours_filter, hours_params = open_filter(open_slot)
+
+    query = f"""
+    SELECT {get_select_list(table_name)},
+        (6371 * acos(cos(radians(%s)) * cos(radians("Latitude")) * cos(radians("Longitude") -
+        radians(%s)) + sin(radians(%s)) * sin(radians("Latitude")))) AS distance
+    FROM {table_name}
+    WHERE (6371 * acos(cos(radians(%s)) * cos(radians("Latitude")) * cos(radians("Longitude") -
+        radians(%s)) + sin(radians(%s)) * sin(radians("Latitude")))) < %s
+        {partition_filter}{hours_filter}
+    ORDER BY distance;
+    """
+
+    return execute_query(
+        query,
+        (lat, lng, lat, lat, lng, lat, radius_km, *partition_params, *hours_params),
+        read_only=True,
+    )
+
+
+def find_nearby_restaurants_basic(lat, lng, radius_km, open_slot=None):
+    """
+    Find restaurants with a full scan using the Haversine formula.
+
+    Args:
+        lat (float): Latitude of center point
+        lng (float): Longitude of center point
+        radius_km (float): Search radius in kilometers
+        open_slot (int): Keep only restaurants open in this slot of the week
+
+    Returns:
+        list: Restaurants within the radius, ordered by distance
+    """
+    return find_nearby_basic("restaurants", lat, lng, radius_km, open_slot)
+
+
+def find_nearby_users_basic(lat, lng, radius_km):
+    """Find users with a full scan using the Haversine formula."""
+    return find_nearby_basic("users", lat, lng, radius_km)
+
+
+def get_search_function(method, target="restaurants", approximate=False):
+    """
+    Get the nearby search function of an indexing method.
+
+    Args:
+        method (str): Indexing method ('basic', 'btree', 'postgis', 'h3',
+            'snapshot', 'auto')
+        target (str): Table searched, 'restaurants' or 'users'
+        approximate (bool): Use the approximate mode of the method, if it
+            has one
+
+    Returns:
+        callable: Function taking (lat, lng, radius_km); those searching
+            restaurants also take open_slot
+
+    Raises:
+        ValueError: If the method can't search users
+    """
+    if target == "users":
+        return _get_user_search_function(method)
+
+    if approximate and method in APPROXIMATE_METHODS:
+        from app.utils.h3_utils import find_nearby_restaurants_h3_approximate
+
+        return find_nearby_restaurants_h3_approximate
+    elif method == "h3":
+        from app.utils.h3_utils import find_nearby_restaurants_h3
+
+        return find_nearby_restaurants_h3
+    elif method == "btree":
+        from app.utils.btree_utils import find_nearby_restaurants_btree
+
+        return find_nearby_restaurants_btree
+    elif method == "postgis":
+        from app.utils.postgis_utils import find_nearby_restaurants_postgis
+
+        return find_nearby_restaurants_postgis
+    elif method == "snapshot":
+        from app.utils.snapshot_utils import find_nearby_restaurants_snapshot
+
+        return find_nearby_restaurants_snapshot
+    elif method == "auto":
+        from app.utils.auto_utils import find_nearby_restaurants_auto
+
+        return find_nearby_restaurants_auto
+    else:
+        return find_nearby_restaurants_basic
+
+
+def _get_user_search_function(method):
+    """Get the nearby user search function of an indexing method."""
+    if method not in USER_METHODS:
+        raise ValueError(f"Indexing method '{method}' can't search users")
+
+    if method == "h3":
+        from app.utils.h3_utils import find_nearby_users_h3
+
+        return find_nearby_users_h3
+    elif method == "btree":
+        from app.utils.btree_utils import find_nearby_users_btree
+
+        return find_nearby_users_btree
+    elif method == "postgis":
+        from app.utils.postgis_utils import find_nearby_users_postgis
+
+        return find_nearby_users_postgis
+    elif method == "auto":
+        from app.utils.auto_utils import find_nearby_users_auto
+
+        return find_nearby_users_auto
+    else:
+        return find_nearby_users_basic
+
+
+def run_search(
+    method,
+    lat,
+    lng,
+    radius_km,
+    target="restaurants",
+    approximate=False,
+    open_slot=None,
+):
+    """
+    Run a nearby search, sharing one execution among identical concurrent
+    searches so a burst of them reaches the database once.
+
+    Args:
+        method (str): Indexing method
+        lat (float): Latitude of center point
+        lng (float): Longitude of center point
+        radius_km (float): Search radius in kilometers
+        target (str): Table searched, 'restaurants' or 'users'
+        approximate (bool): Use the approximate mode of the method
+        open_slot (int): Keep only restaurants open in this slot of the week
+
+    Returns:
+        tuple: (results, True if this call ran the search itself)
+    """
+    search = get_search_function(method, target, approximate)
+    if open_slot is not None:
+        search = partial(search, open_slot=open_slot)
+
+    # Auto searches are coalesced on the backend they pick
+    if method == "auto":
+        return search(lat, lng, radius_km), True
+
+    key = (target, method, approximate, lat, lng, radius_km, open_slot)
+    return coalesce(key, search, lat, lng, radius_km)
+
+
+def get_search_plan(
+    method, lat, lng, radius_km, target="restaurants", approximate=False
+):
+    """
+    Describe how an indexing method runs a nearby search, for tuning.
+
+    Returns:
+        dict: Search plan, or None for methods without a planner
+    """
+    if method == "h3":
+        from app.utils.h3_utils import plan_h3_search
+
+        return plan_h3_search(lat, lng, radius_km, target, approximate)
+    elif method == "auto":
+        from app.utils.auto_utils import get_last_selection
+
+        # The backend picked for the search that just ran in this thread
+        return get_last_selection()
+
+    return None
+
+
+def find_nearby_restaurants(
+    lat,
+    lng,
+    radius_km,
+    method=None,
+    shadow_method=None,
+    approximate=False,
+    open_slot=None,
+):
+    """
+    Find restaurants near a location with the given indexing method.
+
+    Args:
+        lat (float): Latitude of center point
+        lng (float): Longitude of center point
+        radius_km (float): Search radius in kilometers
+        method (str): Indexing method, defaults to INDEXING_METHOD
+        shadow_method (str): Optional method to run in the background for
+            latency and result comparison
+        approximate (bool): Use the approximate mode of the method, if it
+            has one
+        open_slot (int): Keep only restaurants open in this slot of the
+            week, see hours_utils.resolve_open_slot
+
+    Returns:
+        list: Restaurants within the radius, ordered by distance
+    """
+    method = method or DEFAULT_INDEXING_METHOD
+    approximate = approximate and method in APPROXIMATE_METHODS
+    log_search(method, lat, lng, radius_km, approximate)
+
+    start_time = time.time()
+    results, executed = run_search(
+        method, lat, lng, radius_km, approximate=approximate, open_slot=open_slot
+    )
+    elapsed = time.time() - start_time
+
+    # Approximate searches would mislead the exact latency estimates and the
+    # shadow comparison, so only exact searches feed them. Searches that got
+    # the result of a concurrent identical one only waited for part of it.
+    if approximate or not executed:
+        return results
+
+    # Live traffic keeps the latency estimates of the auto mode current; auto
+    # searches record the backend they picked themselves
+    if method != "auto":
+        record_search_latency(method, lat, lng, radius_km, elapsed)
+
+    # The shadow method searches without the opening hours filter
+    if shadow_method and shadow_method != method and open_slot is None:
+        from app.utils.shadow_utils import submit_shadow_search
+
+        submit_shadow_search(
+            method, shadow_method, lat, lng, radius_km, results, elapsed
+        )
+
+    return results
+
+
+def find_nearby_users(lat, lng, radius_km, method=None):
+    """
+    Find users near a location with the given indexing method.
+
+    Args:
+        lat (float): Latitude of center point
+        lng (float): Longitude of center point
+        radius_km (float): Search radius in kilometers
+        method (str): Indexing method, defaults to INDEXING_METHOD
+
+    Returns:
+        list: Users within the radius, ordered by distance
+
+    Raises:
+        ValueError: If the method can't search users
+    """
+    method = method or DEFAULT_INDEXING_METHOD
+
+    start_time = time.time()
+    results, executed = run_search(method, lat, lng, radius_km, "users")
+    elapsed = time.time() - start_time
+
+    if executed and method != "auto":
+        record_search_latency(method, lat, lng, radius_km, elapsed, target="users")
+
+    return results
+
+
+def resolve_approximate(request, method):
+    """
+    Determine whether a Flask request asked for, and gets, an approximate search.
+
+    Returns:
+        bool: True if ?approximate=1 was given and the method has an
+            approximate mode
+    """
+    return request.args.get("approximate") == "1" and method in APPROXIMATE_METHODS
+
+
+def resolve_indexing_method(request):
+    """
+    Determine the indexing method requested by a Flask request.
+
+    The X-Indexing-Method header takes precedence over the ?method= argument.
+
+    Returns:
+        tuple: (method, error message or None)
+    """
+    method = request.headers.get(METHOD_HEADER) or request.args.get("method")
+    if not method:
+        return DEFAULT_INDEXING_METHOD, None
+
+    if method not in VALID_METHODS:
+        return None, f"Invalid indexing method '{method}'"
+
+    return method, None
@@ -0,0 +1,192 @@
+import os
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Method to mirror every search to, unless a request sets X-Shadow-Method
+SHADOW_METHOD = os.environ.get("SHADOW_METHOD")
+
+# Fraction of eligible requests that are mirrored
+SHADOW_SAMPLE_RATE = float(os.environ.get("SHADOW_SAMPLE_RATE", 1.0))
+
+# Background workers and the number of queued shadow searches before new
+# ones are dropped, so shadow traffic can never pile up behind a slow backend
+SHADOW_MAX_WORKERS = int(os.environ.get("SHADOW_MAX_WORKERS", 2))
+SHADOW_MAX_PENDING = int(os.environ.get("SHADOW_MAX_PENDING", 100))
+
+SHADOW_HEADER = "X-Shadow-Method"
+
+_executor = ThreadPoolExecutor(
+    max_workers=SHADOW_MAX_WORKERS, thread_name_prefix="shadow-search"
+)
+_lock = threading.Lock()
+_pending = 0
+_dropped = 0
+_stats = {}
+
+
+def resolve_shadow_method(request, method):
+    """
+    Determine whether a request should be mirrored, and to which method.
+
+    Args:
+        request: Flask request
+        method (str): Method serving the request
+
+    Returns:
+        str: Shadow method, or None if the request is not mirrored
+    """
+    from app.utils.search_utils import VALID_METHODS
+
+    shadow_method = request.headers.get(SHADOW_HEADER) or SHADOW_METHOD
+    if not shadow_method or shadow_method == method:
+        return None
+
+    if shadow_method not in VALID_METHODS:
+        return None
+
+    if random.random() >= SHADOW_SAMPLE_RATE:
+        return None
+
+    return shadow_method
+
+
+def _result_ids(results):
+    """Get the restaurant ids of a result list."""
+    return {row.get("Restaurantid") for row in results}
+
+
+def _record_shadow_result(key, primary_seconds, shadow_seconds, diff, error=None):
+    """Add one shadow comparison to the aggregated statistics."""
+    with _lock:
+        stats = _stats.setdefault(
+            key,
+            {
+                "primary_method": key[0],
+                "shadow_method": key[1],
+                "comparisons": 0,
+                "errors": 0,
+                "mismatches": 0,
+                "primary_total_seconds": 0.0,
+                "shadow_total_seconds": 0.0,
+                "missing_in_shadow": 0,
+                "extra_in_shadow": 0,
+                "recent_mismatches": deque(maxlen=20),
+            },
+        )
+
+        if error is not None:
+            stats["errors"] += 1
+            return
+
+        stats["comparisons"] += 1
+        stats["primary_total_seconds"] += primary_seconds
+        stats["shadow_total_seconds"] += shadow_seconds
+        stats["missing_in_shadow"] += len(diff["missing_in_shadow"])
+        stats["extra_in_shadow"] += len(diff["extra_in_shadow"])
+
+        if diff["missing_in_shadow"] or diff["extra_in_shadow"]:
+            stats["mismatches"] += 1
+            stats["recent_mismatches"].append(diff)
+
+
+def _run_shadow_search(
+    primary_method, shadow_method, lat, lng, radius_km, primary_ids, primary_seconds
+):
+    """Run the shadow search and compare it with the primary results."""
+    global _pending
+
+    from app.utils.search_utils import get_search_function
+    from app.utils.auto_utils import record_search_latency
+
+    key = (primary_method, shadow_method)
+    try:
+        start_time = time.time()
+        shadow_results = get_search_function(shadow_method)(lat, lng, radius_km)
+        shadow_seconds = time.time() - start_time
+        record_search_latency(shadow_method, lat, lng, radius_km, shadow_seconds)
+
+        shadow_ids = _result_ids(shadow_results)
+        diff = {
+            "center": {"lat": lat, "lng": lng},
+            "radius_km": radius_km,
+            "missing_in_shadow": sorted(primary_ids - shadow_ids),
+            "extra_in_shadow": sorted(shadow_ids - primary_ids),
+        }
+        _record_shadow_result(key, primary_seconds, shadow_seconds, diff)
+    except Exception as e:
+        print(f"Shadow search with {shadow_method} failed: {e}")
+        _record_shadow_result(key, primary_seconds, None, None, error=e)
+    finally:
+        with _lock:
+            _pending -= 1
+
+
+def submit_shadow_search(
+    primary_method, shadow_method, lat, lng, radius_km, primary_results, primary_seconds
+):
+    """
+    Run a shadow search in the background.
+
+    Args:
+        primary_method (str): Method that served the request
+        shadow_method (str): Method to compare against
+        lat (float): Latitude of center point
+        lng (float): Longitude of center point
+        radius_km (float): Search radius in kilometers
+        primary_results (list): Results returned to the client
+        primary_seconds (float): Latency of the primary search
+    """
+    global _pending, _dropped
+
+    with _lock:
+        if _pending >= SHADOW_MAX_PENDING:
+            _dropped += 1
+            return
+        _pending += 1
+
+    _executor.submit(
+        _run_shadow_search,
+        primary_method,
+        shadow_method,
+        lat,
+        lng,
+        radius_km,
+        _result_ids(primary_results),
+        primary_seconds,
+    )
+
+
+def get_shadow_stats():
+    """Get the aggregated shadow traffic statistics."""
+    with _lock:
+        comparisons = []
+        for stats in _stats.values():
+            count = stats["comparisons"]
+            comparisons.append(
+                {
+                    "primary_method": stats["primary_method"],
+                    "shadow_method": stats["shadow_method"],
+                    "comparisons": count,
+                    "errors": stats["errors"],
+                    "mismatches": stats["mismatches"],
+                    "mismatch_rate": stats["mismatches"] / count if count else None,
+                    "primary_avg_seconds": (
+                        stats["primary_total_seconds"] / count if count else None
+                    ),
+                    "shadow_avg_seconds": (
+                        stats["shadow_total_seconds"] / count if count else None
+                    ),
+                    "missing_in_shadow": stats["missing_in_shadow"],
+                    "extra_in_shadow": stats["extra_in_shadow"],
+                    "recent_mismatches": list(stats["recent_mismatches"]),
+                }
+            )
+
+        return {
+            "pending": _pending,
+            "dropped": _dropped,
+            "comparisons": comparisons,
+        }
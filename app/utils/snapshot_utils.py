@@ -0,0 +1,506 @@
+import os
+import json
+import math
+import mmap
+import time
+import struct
+import threading
+from decimal import Decimal
+import numpy as np
+from app.utils.db_utils import (
+    HIDDEN_COLUMNS,
+    bounding_box,
+    execute_query,
+    get_db_connection,
+    haversine_distance,
+)
+from app.utils.hours_utils import OPENING_HOURS_COLUMN
+
+# Location of the snapshot file shared by all workers
+SNAPSHOT_PATH = os.environ.get("SNAPSHOT_PATH", "/app/data/restaurants.snapshot")
+
+# Size of the grid cells of the spatial index, in degrees (~5.5 km)
+SNAPSHOT_GRID_DEGREES = float(os.environ.get("SNAPSHOT_GRID_DEGREES", 0.05))
+
+# How often workers check whether the snapshot file was replaced
+SNAPSHOT_CHECK_INTERVAL = float(os.environ.get("SNAPSHOT_CHECK_INTERVAL", 5))
+
+SNAPSHOT_MAGIC = b"RSNAP001"
+SNAPSHOT_VERSION = 2
+SNAPSHOT_ALIGNMENT = 64
+
+# Columns stored as numeric arrays rather than dictionary codes
+ID_COLUMN = "Restaurantid"
+COORDINATE_COLUMNS = ["Latitude", "Longitude"]
+
+# Columns that are never copied into the snapshot
+EXCLUDED_COLUMNS = ["geom", "TheGeomMeter", "spatial_sort_key"]
+
+_lock = threading.Lock()
+_snapshot = None
+_snapshot_checked_at = 0.0
+
+# Restaurants changed since the snapshot was written, as published by the
+# change feed: {restaurant id: row in snapshot form, or None if deleted}.
+# Searches use these rows instead of the snapshot's.
+_overlay = {}
+
+
+def _align(offset):
+    """Round an offset up to the array alignment."""
+    return (offset + SNAPSHOT_ALIGNMENT - 1) // SNAPSHOT_ALIGNMENT * SNAPSHOT_ALIGNMENT
+
+
+def _grid_shape(grid_degrees):
+    """Number of grid cells along the latitude and longitude axes."""
+    return int(math.ceil(180.0 / grid_degrees)), int(math.ceil(360.0 / grid_degrees))
+
+
+def grid_cell_keys(lats, lngs, grid_degrees):
+    """Compute the grid cell key of every coordinate."""
+    n_lat, n_lng = _grid_shape(grid_degrees)
+    lat_idx = np.clip(((lats + 90.0) / grid_degrees).astype(np.int64), 0, n_lat - 1)
+    lng_idx = np.clip(((lngs + 180.0) / grid_degrees).astype(np.int64), 0, n_lng - 1)
+    return lat_idx * n_lng + lng_idx
+
+
+def build_grid_index(lats, lngs, grid_degrees):
+    """
+    Sort coordinates by grid cell so each cell maps to one contiguous range.
+
+    Returns:
+        tuple: (row order, sorted keys of the non-empty cells, first row of
+            each cell followed by the row count)
+    """
+    cell_keys = grid_cell_keys(lats, lngs, grid_degrees)
+    order = np.argsort(cell_keys, kind="stable")
+    unique_cells, cell_starts = np.unique(cell_keys[order], return_index=True)
+    cell_starts = np.append(cell_starts, len(cell_keys)).astype(np.int64)
+    return order, unique_cells.astype(np.int64), cell_starts
+
+
+def grid_candidate_rows(cell_keys, cell_starts, grid_degrees, lat, lng, radius_km):
+    """
+    Get the row positions of every grid cell overlapping a search circle.
+
+    Args:
+        cell_keys (numpy.ndarray): Sorted keys of the non-empty cells
+        cell_starts (numpy.ndarray): First row of each cell, followed by the
+            row count
+        grid_degrees (float): Grid cell size
+        lat (float): Latitude of center point
+        lng (float): Longitude of center point
+        radius_km (float): Search radius in kilometers
+
+    Returns:
+        numpy.ndarray: Row positions, a superset of the rows in the circle
+    """
+    n_lat, n_lng = _grid_shape(grid_degrees)
+    min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+
+    lat_lo = max(0, int((min_lat + 90.0) / grid_degrees))
+    lat_hi = min(n_lat - 1, int((max_lat + 90.0) / grid_degrees))
+
+    lng_lo = max(0, int((min_lng + 180.0) / grid_degrees))
+    lng_hi = min(n_lng - 1, int((max_lng + 180.0) / grid_degrees))
+    if min_lng > max_lng:
+        # Split boxes that wrap around the antimeridian
+        lng_bands = [(lng_lo, n_lng - 1), (0, lng_hi)]
+    else:
+        lng_bands = [(lng_lo, lng_hi)]
+
+    # Within one latitude band, cells are consecutive keys and therefore one
+    # contiguous slice of rows
+    slices = []
+    for lat_idx in range(lat_lo, lat_hi + 1):
+        for lng_lo_idx, lng_hi_idx in lng_bands:
+            first = np.searchsorted(cell_keys, lat_idx * n_lng + lng_lo_idx, "left")
+            last = np.searchsorted(cell_keys, lat_idx * n_lng + lng_hi_idx, "right")
+            if first < last:
+                slices.append(np.arange(cell_starts[first], cell_starts[last]))
+
+    if not slices:
+        return np.empty(0, dtype=np.int64)
+
+    return np.concatenate(slices)
+
+
+def _snapshot_value(value):
+    """
+    Convert a column value to the type the snapshot stores it as.
+
+    Dictionaries are kept in the JSON header, so booleans, integers, floats
+    and strings come back with their type. Numeric columns become floats,
+    as the coordinates do, and anything else becomes its string form.
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+def write_snapshot(path=SNAPSHOT_PATH, grid_degrees=SNAPSHOT_GRID_DEGREES):
+    """
+    Write an immutable columnar snapshot of the restaurants table.
+
+    Rows are sorted by grid cell so every cell is a contiguous slice of the
+    arrays. Other columns are dictionary encoded with their values' types. The file is written next to
+    the target and renamed into place, so readers never see a partial file.
+
+    Args:
+        path (str): Destination of the snapshot file
+        grid_degrees (float): Grid cell size of the spatial index
+
+    Returns:
+        int: Number of restaurants written
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("SELECT * FROM restaurants")
+        columns = [desc[0] for desc in cursor.description]
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+    column_index = {col: i for i, col in enumerate(columns)}
+    ids = np.array([row[column_index[ID_COLUMN]] for row in rows], dtype=np.int64)
+    lats = np.array(
+        [float(row[column_index["Latitude"]]) for row in rows], dtype=np.float64
+    )
+    lngs = np.array(
+        [float(row[column_index["Longitude"]]) for row in rows], dtype=np.float64
+    )
+
+    order, cell_keys, cell_starts = build_grid_index(lats, lngs, grid_degrees)
+
+    arrays = {
+        "ids": ids[order],
+        "lats": lats[order],
+        "lngs": lngs[order],
+        "cell_keys": cell_keys,
+        "cell_starts": cell_starts,
+    }
+
+    dictionaries = {}
+    for col in columns:
+        if col in EXCLUDED_COLUMNS or col == ID_COLUMN or col in COORDINATE_COLUMNS:
+            continue
+
+        values = [rows[i][column_index[col]] for i in order]
+        values = [_snapshot_value(value) for value in values]
+        dictionary = sorted({value for value in values if value is not None})
+        codes = {value: code for code, value in enumerate(dictionary)}
+        dictionaries[col] = dictionary
+        arrays[f"codes:{col}"] = np.array(
+            [-1 if value is None else codes[value] for value in values],
+            dtype=np.int32,
+        )
+
+    header = {
+        "version": SNAPSHOT_VERSION,
+        "created_at": time.time(),
+        "row_count": len(rows),
+        "grid_degrees": grid_degrees,
+        "dictionaries": dictionaries,
+        "arrays": {},
+    }
+
+    # Array offsets are relative to the data section that follows the header
+    offset = 0
+    layout = []
+    for name, array in arrays.items():
+        offset = _align(offset)
+        layout.append((name, array, offset))
+        header["arrays"][name] = {
+            "dtype": array.dtype.str,
+            "offset": offset,
+            "length": len(array),
+        }
+        offset += array.nbytes
+
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = _align(len(SNAPSHOT_MAGIC) + 8 + len(header_bytes))
+
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        for name, array, array_offset in layout:
+            f.seek(data_start + array_offset)
+            f.write(np.ascontiguousarray(array).tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+
+    # Atomic swap: workers keep their mapping of the old file until they
+    # notice the new one
+    os.replace(tmp_path, path)
+    print(f"Snapshot with {len(rows)} restaurants written to {path}")
+    return len(rows)
+
+
+class RestaurantSnapshot:
+    """Read-only, memory-mapped view of a restaurant snapshot file."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            self.file_id = (stat.st_ino, stat.st_mtime_ns)
+            # The mapping stays valid after the file is replaced or closed
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mmap[: len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a restaurant snapshot")
+
+        (header_length,) = struct.unpack_from("<Q", self._mmap, len(SNAPSHOT_MAGIC))
+        header_start = len(SNAPSHOT_MAGIC) + 8
+        self.header = json.loads(
+            self._mmap[header_start : header_start + header_length].decode("utf-8")
+        )
+        if self.header.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(
+                f"{path} was written by another snapshot version; rebuild it "
+                "with scripts/build_snapshot.py"
+            )
+        data_start = _align(header_start + header_length)
+
+        # Zero-copy views over the page cache
+        self.arrays = {
+            name: np.frombuffer(
+                self._mmap,
+                dtype=np.dtype(spec["dtype"]),
+                count=spec["length"],
+                offset=data_start + spec["offset"],
+            )
+            for name, spec in self.header["arrays"].items()
+        }
+        self.dictionaries = self.header["dictionaries"]
+        self.grid_degrees = self.header["grid_degrees"]
+        self.row_count = self.header["row_count"]
+
+    def candidate_rows(self, lat, lng, radius_km):
+        """
+        Get the row positions of every grid cell overlapping a search circle.
+
+        Returns:
+            numpy.ndarray: Row positions, a superset of the rows in the circle
+        """
+        return grid_candidate_rows(
+            self.arrays["cell_keys"],
+            self.arrays["cell_starts"],
+            self.grid_degrees,
+            lat,
+            lng,
+            radius_km,
+        )
+
+    def row_dict(self, position):
+        """Decode one row of the snapshot into a dict."""
+        row = {
+            ID_COLUMN: int(self.arrays["ids"][position]),
+            "Latitude": float(self.arrays["lats"][position]),
+            "Longitude": float(self.arrays["lngs"][position]),
+        }
+        for col, dictionary in self.dictionaries.items():
+            code = self.arrays[f"codes:{col}"][position]
+            row[col] = dictionary[code] if code >= 0 else None
+        return row
+
+    def open_rows(self, rows, slot):
+        """
+        Keep the row positions of the restaurants open in a slot of the week.
+
+        Each distinct bitmap is tested once, then rows are picked by their
+        dictionary code. Restaurants without known hours are left out.
+        """
+        codes = self.arrays.get(f"codes:{OPENING_HOURS_COLUMN}")
+        if codes is None:
+            return rows[:0]
+
+        # Code -1, unknown hours, reads the trailing False
+        is_open = np.array(
+            [bitmap[slot] == "1" for bitmap in self.dictionaries[OPENING_HOURS_COLUMN]]
+            + [False]
+        )
+        return rows[is_open[codes[rows]]]
+
+    def find_nearby(self, lat, lng, radius_km, open_slot=None):
+        """
+        Find restaurants within a radius using the grid index.
+
+        Returns:
+            list: Restaurants within the radius, ordered by distance
+        """
+        rows = self.candidate_rows(lat, lng, radius_km)
+        if open_slot is not None:
+            rows = self.open_rows(rows, open_slot)
+        if len(rows) == 0:
+            return []
+
+        lat1 = math.radians(lat)
+        lat2 = np.radians(self.arrays["lats"][rows])
+        dlat = lat2 - lat1
+        dlng = np.radians(self.arrays["lngs"][rows] - lng)
+        a = (
+            np.sin(dlat / 2) ** 2
+            + math.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2) ** 2
+        )
+        distances = 2 * 6371 * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+        within = distances < radius_km
+        rows = rows[within]
+        distances = distances[within]
+        order = np.argsort(distances, kind="stable")
+
+        results = []
+        for position, distance in zip(rows[order], distances[order]):
+            row = _visible(self.row_dict(position))
+            row["distance"] = float(distance)
+            results.append(row)
+
+        return results
+
+
+def get_snapshot():
+    """
+    Get the snapshot of this worker, reopening it if the file was replaced.
+
+    Returns:
+        RestaurantSnapshot: Current snapshot
+
+    Raises:
+        FileNotFoundError: If no snapshot has been built yet
+    """
+    global _snapshot, _snapshot_checked_at
+
+    with _lock:
+        now = time.time()
+        if (
+            _snapshot is not None
+            and now - _snapshot_checked_at < SNAPSHOT_CHECK_INTERVAL
+        ):
+            return _snapshot
+
+        _snapshot_checked_at = now
+        stat = os.stat(SNAPSHOT_PATH)
+        if _snapshot is None or _snapshot.file_id != (stat.st_ino, stat.st_mtime_ns):
+            _snapshot = RestaurantSnapshot(SNAPSHOT_PATH)
+            _prune_overlay(_snapshot)
+            print(
+                f"Loaded restaurant snapshot with {_snapshot.row_count} rows "
+                f"from {SNAPSHOT_PATH}"
+            )
+
+        return _snapshot
+
+
+def find_nearby_restaurants_snapshot(lat, lng, radius_km, open_slot=None):
+    """
+    Find restaurants using the memory-mapped snapshot.
+
+    Args:
+        lat (float): Latitude of center point
+        lng (float): Longitude of center point
+        radius_km (float): Search radius in kilometers
+        open_slot (int): Keep only restaurants open in this slot of the week
+
+    Returns:
+        list: Restaurants within the radius, ordered by distance
+    """
+    snapshot = get_snapshot()
+    results = snapshot.find_nearby(lat, lng, radius_km, open_slot)
+
+    with _lock:
+        overlay = dict(_overlay)
+    if not overlay:
+        return results
+
+    results = [row for row in results if row[ID_COLUMN] not in overlay]
+    for row in overlay.values():
+        if row is None:
+            continue
+        if open_slot is not None:
+            bitmap = row.get(OPENING_HOURS_COLUMN) or ""
+            if bitmap[open_slot : open_slot + 1] != "1":
+                continue
+        distance = haversine_distance(lat, lng, row["Latitude"], row["Longitude"])
+        if distance < radius_km:
+            results.append(dict(_visible(row), distance=distance))
+
+    results.sort(key=lambda row: row["distance"])
+    return results
+
+
+def _visible(row):
+    """Leave the columns API rows don't carry out of a snapshot row."""
+    return {col: value for col, value in row.items() if col not in HIDDEN_COLUMNS}
+
+
+def _snapshot_row(row):
+    """Convert a restaurants row to the form of the rows of a snapshot."""
+    converted = {
+        ID_COLUMN: int(row[ID_COLUMN]),
+        "Latitude": float(row["Latitude"]),
+        "Longitude": float(row["Longitude"]),
+    }
+    for col, value in row.items():
+        if col in EXCLUDED_COLUMNS or col == ID_COLUMN or col in COORDINATE_COLUMNS:
+            continue
+        converted[col] = _snapshot_value(value)
+    return converted
+
+
+def _prune_overlay(snapshot):
+    """Forget the changed rows a new snapshot already holds. Needs _lock."""
+    for restaurant_id, row in list(_overlay.items()):
+        positions = np.flatnonzero(snapshot.arrays["ids"] == restaurant_id)
+        current = snapshot.row_dict(positions[0]) if len(positions) else None
+        if current == row:
+            del _overlay[restaurant_id]
+
+
+def apply_restaurant_changes(changes):
+    """
+    Record restaurants published by the change feed in the overlay, so
+    searches see them before the snapshot is rebuilt. Nothing is recorded
+    until this worker loaded a snapshot.
+
+    Args:
+        changes (list): Change feed payloads with the old and new ids
+    """
+    if _snapshot is None:
+        return
+
+    ids = {
+        change["new_Restaurantid"]
+        for change in changes
+        if change.get("new_Restaurantid") is not None
+    }
+    rows = {}
+    if ids:
+        # Read from the primary, which replicas may lag behind
+        fetched = execute_query(
+            f'SELECT * FROM restaurants WHERE "{ID_COLUMN}" = ANY(%s)', (list(ids),)
+        )
+        rows = {row[ID_COLUMN]: _snapshot_row(row) for row in fetched}
+
+    with _lock:
+        for change in changes:
+            old_id = change.get("old_Restaurantid")
+            new_id = change.get("new_Restaurantid")
+            if old_id is not None and old_id != new_id:
+                _overlay[old_id] = None
+            if new_id is not None:
+                # Rows deleted since the change are missing
+                _overlay[new_id] = rows.get(new_id)
+
+
+def get_overlay_size():
+    """Count the restaurants searches take from the overlay."""
+    with _lock:
+        return len(_overlay)
@@ -0,0 +1,344 @@
+import io
+import os
+import math
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from app.utils.db_utils import get_db_connection
+from app.utils.snapshot_utils import build_grid_index, grid_candidate_rows
+
+# Radii joined for every user, in kilometers. Each pair records the smallest
+# radius it falls within.
+JOIN_RADII_KM = sorted(
+    float(radius)
+    for radius in os.environ.get("JOIN_RADII_KM", "1,5,10").split(",")
+    if radius.strip()
+)
+
+# Nearest restaurants kept per user
+JOIN_MAX_PER_USER = int(os.environ.get("JOIN_MAX_PER_USER", 200))
+
+# Worker processes, and user partitions handed out to them. More partitions
+# than workers give finer progress reports and better load balancing.
+JOIN_WORKERS = int(os.environ.get("JOIN_WORKERS", os.cpu_count() or 1))
+JOIN_PARTITIONS = int(os.environ.get("JOIN_PARTITIONS", 0)) or JOIN_WORKERS * 4
+
+# Users whose distances are computed in one vectorized block
+JOIN_BLOCK_SIZE = 256
+
+# Pairs are sent to the database whenever this much COPY data is buffered
+JOIN_COPY_BUFFER_BYTES = 8 * 1024 * 1024
+
+JOIN_TABLE = "user_nearby_restaurants"
+EARTH_RADIUS_KM = 6371
+
+# Restaurant grid of the current worker process
+_grid = None
+
+
+def load_restaurant_grid(grid_degrees):
+    """
+    Load all restaurant coordinates into a grid index.
+
+    Args:
+        grid_degrees (float): Grid cell size
+
+    Returns:
+        dict: Restaurant ids and coordinates sorted by grid cell, with the
+            cell keys and cell start rows
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("""
+        SELECT "Restaurantid", "Latitude", "Longitude"
+        FROM restaurants
+        WHERE "Latitude" IS NOT NULL AND "Longitude" IS NOT NULL
+        """)
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    lats = np.array([float(row[1]) for row in rows], dtype=np.float64)
+    lngs = np.array([float(row[2]) for row in rows], dtype=np.float64)
+    order, cell_keys, cell_starts = build_grid_index(lats, lngs, grid_degrees)
+
+    return {
+        "grid_degrees": grid_degrees,
+        "ids": ids[order],
+        "lats": lats[order],
+        "lngs": lngs[order],
+        "cell_keys": cell_keys,
+        "cell_starts": cell_starts,
+    }
+
+
+def _init_worker(grid):
+    """Keep the restaurant grid in the worker process."""
+    global _grid
+    _grid = grid
+
+
+def _haversine_matrix(user_lats, user_lngs, lats, lngs):
+    """Distances in km between every user and every restaurant of a block."""
+    lat1 = np.radians(user_lats)[:, None]
+    lat2 = np.radians(lats)[None, :]
+    dlat = lat2 - lat1
+    dlng = np.radians(lngs[None, :] - user_lngs[:, None])
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _copy_pairs(cursor, table_name, buffer):
+    """Send the buffered pairs to the database and empty the buffer."""
+    buffer.seek(0)
+    cursor.copy_expert(
+        f"COPY {table_name} (user_id, restaurant_id, distance_km, rank, radius_km) "
+        f"FROM STDIN",
+        buffer,
+    )
+    buffer.seek(0)
+    buffer.truncate()
+
+
+def _copy_text(value):
+    """Escape a value for the COPY text format."""
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
+def _join_users(user_ids, user_lats, user_lngs, cursor, table_name):
+    """
+    Join users against the restaurant grid and COPY the pairs into a table.
+
+    Users are grouped by grid cell so the restaurants around a cell are
+    looked up once and compared with all its users in one block.
+
+    Returns:
+        int: Number of pairs written
+    """
+    radii = np.array(JOIN_RADII_KM)
+    max_radius = radii[-1]
+    grid_degrees = _grid["grid_degrees"]
+
+    # Users of a cell are at most a cell diagonal away from their mean
+    cell_margin_km = grid_degrees * 111.0 * math.sqrt(2)
+    out = io.StringIO()
+
+    order, cell_keys, cell_starts = build_grid_index(user_lats, user_lngs, grid_degrees)
+
+    pairs = 0
+    for cell_index in range(len(cell_keys)):
+        members = order[cell_starts[cell_index] : cell_starts[cell_index + 1]]
+        center_lat = float(np.mean(user_lats[members]))
+        center_lng = float(np.mean(user_lngs[members]))
+
+        candidates = grid_candidate_rows(
+            _grid["cell_keys"],
+            _grid["cell_starts"],
+            grid_degrees,
+            center_lat,
+            center_lng,
+            max_radius + cell_margin_km,
+        )
+        if len(candidates) == 0:
+            continue
+
+        cand_ids = _grid["ids"][candidates]
+        cand_lats = _grid["lats"][candidates]
+        cand_lngs = _grid["lngs"][candidates]
+
+        for block_start in range(0, len(members), JOIN_BLOCK_SIZE):
+            block = members[block_start : block_start + JOIN_BLOCK_SIZE]
+            distances = _haversine_matrix(
+                user_lats[block], user_lngs[block], cand_lats, cand_lngs
+            )
+
+            for row, user_index in enumerate(block):
+                within = np.nonzero(distances[row] <= max_radius)[0]
+                if len(within) == 0:
+                    continue
+
+                nearest = within[np.argsort(distances[row, within], kind="stable")]
+                nearest = nearest[:JOIN_MAX_PER_USER]
+                nearest_distances = distances[row, nearest]
+                nearest_radii = radii[np.searchsorted(radii, nearest_distances)]
+
+                user_id = _copy_text(user_ids[user_index])
+                for rank, (restaurant_index, distance, radius) in enumerate(
+                    zip(nearest, nearest_distances, nearest_radii), start=1
+                ):
+                    out.write(
+                        f"{user_id}\t{cand_ids[restaurant_index]}\t"
+                        f"{distance:.6f}\t{rank}\t{radius:g}\n"
+                    )
+                pairs += len(nearest)
+
+            if out.tell() >= JOIN_COPY_BUFFER_BYTES:
+                _copy_pairs(cursor, table_name, out)
+
+    if out.tell():
+        _copy_pairs(cursor, table_name, out)
+
+    return pairs
+
+
+def _join_partition(table_name, partition, num_partitions):
+    """
+    Join one partition of the users and COPY the pairs into a table.
+
+    Runs in a worker process with its own database connection.
+
+    Returns:
+        dict: Partition number, users, pairs and seconds
+    """
+    start_time = time.time()
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(
+            """
+        SELECT "Userid", "Latitude", "Longitude"
+        FROM users
+        WHERE "Latitude" IS NOT NULL AND "Longitude" IS NOT NULL
+        AND mod(abs(hashtext("Userid"::text)), %s) = %s
+        """,
+            (num_partitions, partition),
+        )
+        rows = cursor.fetchall()
+
+        pairs = 0
+        if rows:
+            user_ids = [row[0] for row in rows]
+            user_lats = np.array([float(row[1]) for row in rows], dtype=np.float64)
+            user_lngs = np.array([float(row[2]) for row in rows], dtype=np.float64)
+
+            pairs = _join_users(user_ids, user_lats, user_lngs, cursor, table_name)
+
+        conn.commit()
+        return {
+            "partition": partition,
+            "users": len(rows),
+            "pairs": pairs,
+            "seconds": time.time() - start_time,
+        }
+    except Exception as e:
+        conn.rollback()
+        raise e
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def run_spatial_join(workers=JOIN_WORKERS, num_partitions=JOIN_PARTITIONS):
+    """
+    Rebuild the user_nearby_restaurants table from all users and restaurants.
+
+    Users are split into partitions that a process pool joins in parallel
+    against a grid index of the restaurants. The pairs are loaded into a new
+    table, indexed, and swapped in with a rename, so feed reads keep working
+    while the job runs.
+
+    Args:
+        workers (int): Worker processes
+        num_partitions (int): User partitions
+
+    Returns:
+        dict: Users, pairs, seconds and throughput, or None on failure
+    """
+    start_time = time.time()
+    new_table = f"{JOIN_TABLE}_new"
+    old_table = f"{JOIN_TABLE}_old"
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(f"DROP TABLE IF EXISTS {new_table};")
+        cursor.execute(f"""
+        CREATE TABLE {new_table} (
+            user_id VARCHAR(50) NOT NULL,
+            restaurant_id INTEGER NOT NULL,
+            distance_km DOUBLE PRECISION NOT NULL,
+            rank INTEGER NOT NULL,
+            radius_km DOUBLE PRECISION NOT NULL
+        );
+        """)
+        conn.commit()
+
+        # Cells as large as the largest radius keep the candidate lookups to
+        # a few cells per user cell
+        grid = load_restaurant_grid(max(JOIN_RADII_KM[-1] / 111.0, 0.01))
+        print(
+            f"Joining users against {len(grid['ids'])} restaurants within "
+            f"{', '.join(f'{r:g}' for r in JOIN_RADII_KM)} km using {workers} "
+            f"workers and {num_partitions} partitions"
+        )
+
+        users = 0
+        pairs = 0
+        done = 0
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(grid,)
+        ) as pool:
+            futures = [
+                pool.submit(_join_partition, new_table, partition, num_partitions)
+                for partition in range(num_partitions)
+            ]
+            for future in as_completed(futures):
+                result = future.result()
+                done += 1
+                users += result["users"]
+                pairs += result["pairs"]
+                elapsed = time.time() - start_time
+                print(
+                    f"Partition {result['partition']} done "
+                    f"({done}/{num_partitions}): {users} users, {pairs} pairs, "
+                    f"{users / elapsed:.0f} users/s, {pairs / elapsed:.0f} pairs/s"
+                )
+
+        # Feeds read one user's pairs in rank order
+        cursor.execute(f"""
+        CREATE INDEX idx_{new_table}_user_rank ON {new_table} (user_id, rank);
+        """)
+        cursor.execute(f"ANALYZE {new_table};")
+        conn.commit()
+
+        cursor.execute("SET LOCAL lock_timeout = '5s';")
+        cursor.execute(f"DROP TABLE IF EXISTS {old_table};")
+        cursor.execute(f"ALTER TABLE IF EXISTS {JOIN_TABLE} RENAME TO {old_table};")
+        cursor.execute(f"ALTER TABLE {new_table} RENAME TO {JOIN_TABLE};")
+        cursor.execute(f"DROP TABLE IF EXISTS {old_table};")
+        cursor.execute(f"""
+        ALTER INDEX idx_{new_table}_user_rank RENAME TO idx_{JOIN_TABLE}_user_rank;
+        """)
+        conn.commit()
+
+        elapsed = time.time() - start_time
+        summary = {
+            "users": users,
+            "pairs": pairs,
+            "seconds": elapsed,
+            "users_per_second": users / elapsed if elapsed else None,
+            "pairs_per_second": pairs / elapsed if elapsed else None,
+        }
+        print(
+            f"Spatial join completed: {users} users, {pairs} pairs in "
+            f"{elapsed:.1f}s ({summary['users_per_second']:.0f} users/s)"
+        )
+        return summary
+    except Exception as e:
+        conn.rollback()
+        print(f"Error running spatial join: {e}")
+        try:
+            cursor.execute(f"DROP TABLE IF EXISTS {new_table};")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+        return None
+    finally:
+        cursor.close()
+        conn.close()
@@ -0,0 +1,469 @@
+import os
+import math
+import time
+import shutil
+import struct
+import hashlib
+import threading
+from collections import OrderedDict
+from app.utils.db_utils import execute_query
+
+# Number of tiles kept in memory by each worker
+TILE_CACHE_SIZE = int(os.environ.get("TILE_CACHE_SIZE", 1024))
+
+# Optional directory of a disk tile cache shared by all workers
+TILE_CACHE_DIR = os.environ.get("TILE_CACHE_DIR", "")
+
+# How often the data version is re-read to detect reloads
+TILE_VERSION_CHECK_INTERVAL = float(os.environ.get("TILE_VERSION_CHECK_INTERVAL", 5))
+
+# Browser cache lifetime of a tile, after which it is revalidated by ETag
+TILE_CACHE_MAX_AGE = int(os.environ.get("TILE_CACHE_MAX_AGE", 60))
+
+TILE_LAYER_NAME = "restaurants"
+TILE_EXTENT = 4096
+
+# Points this close outside the tile (in tile units) are kept, so symbols
+# on tile edges are not cut off
+TILE_BUFFER = 64
+
+MAX_ZOOM = 22
+
+# Restaurant columns exposed as feature properties
+TILE_PROPERTIES = {
+    "name": "Name",
+    "cuisine": "Cuisine",
+    "price": "Price",
+    "city": "City",
+}
+
+_lock = threading.Lock()
+_memory_cache = OrderedDict()
+_cache_version = None
+_version = None
+_version_checked_at = 0.0
+
+# Tiles changed by restaurants published by the change feed since the data
+# version was read, with the time of their last change: {(z, x, y): time}.
+# Tiles built while they changed are not cached.
+_tile_changes = {}
+
+# Bumped when the cached tiles are dropped without a new data version, so
+# tiles built meanwhile are not cached
+_tile_generation = 0
+
+
+def get_data_version():
+    """
+    Get a version string of the restaurant data, which changes on reload.
+
+    The version is the checksum of the restaurants CSV recorded by the
+    incremental loader, so touching the file without changing it keeps
+    cached tiles valid.
+
+    Returns:
+        str: Data version
+    """
+    global _version, _version_checked_at
+
+    now = time.time()
+    with _lock:
+        if _version is not None and now - _version_checked_at < (
+            TILE_VERSION_CHECK_INTERVAL
+        ):
+            return _version
+
+    try:
+        row = execute_query(
+            """
+            SELECT file_sha256, loaded_at::text
+            FROM data_load_state
+            WHERE table_name = 'restaurants'
+            """,
+            fetch_all=False,
+            dict_cursor=False,
+            read_only=True,
+        )
+        version = (row[0] or row[1])[:16] if row else "initial"
+    except Exception as e:
+        # Deployments loaded with init_basic have no load state
+        print(f"Could not read data version: {e}")
+        version = "initial"
+
+    with _lock:
+        _version = version
+        _version_checked_at = now
+
+    return version
+
+
+def is_valid_tile(z, x, y):
+    """Check that tile coordinates exist at their zoom level."""
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2**z and 0 <= y < 2**z
+
+
+def get_tile_encoder(method):
+    """
+    Get the name of the encoder that builds tiles for an indexing method.
+
+    PostGIS builds tiles with ST_AsMVT, every other method shares the Python
+    encoder.
+    """
+    return "postgis" if method == "postgis" else "python"
+
+
+def get_tile_etag(tile):
+    """
+    Build the ETag of a tile from its bytes.
+
+    Every worker gives the same tile the same ETag, whatever it has cached
+    or been told by the change feed.
+    """
+    return hashlib.sha1(tile).hexdigest()[:20]
+
+
+def point_tiles(lat, lng):
+    """
+    List the tiles showing a point at every zoom level, including the
+    neighbouring tiles whose buffer reaches it.
+
+    Returns:
+        list: (z, x, y) tuples
+    """
+    lat = max(min(lat, 85.0511287798), -85.0511287798)
+    buffer = TILE_BUFFER / TILE_EXTENT
+    tiles = []
+    for z in range(MAX_ZOOM + 1):
+        n = 2**z
+        world_x = (lng + 180.0) / 360.0 * n
+        world_y = (1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n
+        for x in range(math.floor(world_x - buffer), math.floor(world_x + buffer) + 1):
+            for y in range(
+                math.floor(world_y - buffer), math.floor(world_y + buffer) + 1
+            ):
+                if 0 <= x < n and 0 <= y < n:
+                    tiles.append((z, x, y))
+    return tiles
+
+
+def apply_restaurant_changes(changes):
+    """
+    Drop the cached tiles showing restaurants published by the change feed,
+    at their old and new positions.
+
+    Args:
+        changes (list): Change feed payloads with the old and new coordinates
+    """
+    changed = {}
+    for change in changes:
+        for prefix in ("old_", "new_"):
+            lat = change.get(f"{prefix}Latitude")
+            lng = change.get(f"{prefix}Longitude")
+            if lat is not None and lng is not None:
+                for tile in point_tiles(float(lat), float(lng)):
+                    changed[tile] = change["at"]
+
+    with _lock:
+        _tile_changes.update(changed)
+        for z, x, y in changed:
+            for encoder in ("postgis", "python"):
+                _memory_cache.pop((encoder, z, x, y), None)
+        version = _cache_version
+
+    if TILE_CACHE_DIR and version is not None:
+        for z, x, y in changed:
+            for encoder in ("postgis", "python"):
+                # Other workers may remove the same tile at the same time
+                try:
+                    os.remove(_disk_path(version, encoder, z, x, y))
+                except FileNotFoundError:
+                    pass
+
+
+def reset_tile_cache():
+    """Drop every cached tile of this worker."""
+    global _tile_generation
+
+    with _lock:
+        _memory_cache.clear()
+        _tile_changes.clear()
+        _tile_generation += 1
+        version = _cache_version
+
+    if TILE_CACHE_DIR and version is not None:
+        shutil.rmtree(os.path.join(TILE_CACHE_DIR, version), ignore_errors=True)
+
+
+def _tile_to_lng(x, z):
+    """Longitude of the west edge of tile column x."""
+    return x / 2**z * 360.0 - 180.0
+
+
+def _tile_to_lat(y, z):
+    """Latitude of the north edge of tile row y."""
+    return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / 2**z))))
+
+
+def _lng_lat_to_tile_units(lng, lat, z, x, y):
+    """Project a coordinate into the pixel space of a tile."""
+    n = 2**z
+    lat = max(min(lat, 85.0511287798), -85.0511287798)
+    world_x = (lng + 180.0) / 360.0 * n
+    world_y = (1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n
+    return (
+        int(round((world_x - x) * TILE_EXTENT)),
+        int(round((world_y - y) * TILE_EXTENT)),
+    )
+
+
+def _varint(value):
+    """Encode an unsigned integer as a protobuf varint."""
+    out = bytearray()
+    while True:
+        bits = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(bits | 0x80)
+        else:
+            out.append(bits)
+            return bytes(out)
+
+
+def _zigzag(value):
+    """Map a signed integer to an unsigned one for varint encoding."""
+    return (value << 1) ^ (value >> 63)
+
+
+def _field(number, wire_type, payload):
+    """Encode one protobuf field."""
+    key = _varint((number << 3) | wire_type)
+    if wire_type == 2:
+        return key + _varint(len(payload)) + payload
+    return key + payload
+
+
+def _encode_value(value):
+    """Encode a feature property as an MVT Value message."""
+    if isinstance(value, bool):
+        return _field(7, 0, _varint(int(value)))
+    if isinstance(value, int):
+        return _field(6, 0, _varint(_zigzag(value)))
+    if isinstance(value, float):
+        return _field(3, 1, struct.pack("<d", value))
+    return _field(1, 2, str(value).encode("utf-8"))
+
+
+def encode_mvt(layer_name, features, extent=TILE_EXTENT):
+    """
+    Encode point features as a Mapbox Vector Tile with one layer.
+
+    Args:
+        layer_name (str): Name of the layer
+        features (list): (feature_id, tile_x, tile_y, properties) tuples in
+            tile units
+        extent (int): Tile extent
+
+    Returns:
+        bytes: Encoded tile
+    """
+    keys = {}
+    values = {}
+    encoded_features = []
+
+    for feature_id, tile_x, tile_y, properties in features:
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            key_index = keys.setdefault(key, len(keys))
+            value_key = (type(value).__name__, value)
+            value_index = values.setdefault(value_key, len(values))
+            tags.extend([key_index, value_index])
+
+        # One MoveTo command with a single point
+        geometry = [(1 & 0x7) | (1 << 3), _zigzag(tile_x), _zigzag(tile_y)]
+
+        feature = b""
+        if feature_id is not None:
+            feature += _field(1, 0, _varint(int(feature_id)))
+        if tags:
+            feature += _field(2, 2, b"".join(_varint(tag) for tag in tags))
+        feature += _field(3, 0, _varint(1))  # GeomType POINT
+        feature += _field(4, 2, b"".join(_varint(part) for part in geometry))
+        encoded_features.append(feature)
+
+    if not encoded_features:
+        return b""
+
+    layer = _field(15, 0, _varint(2))
+    layer += _field(1, 2, layer_name.encode("utf-8"))
+    layer += b"".join(_field(2, 2, feature) for feature in encoded_features)
+    layer += b"".join(_field(3, 2, key.encode("utf-8")) for key in keys)
+    layer += b"".join(_field(4, 2, _encode_value(value)) for _, value in values.keys())
+    layer += _field(5, 0, _varint(extent))
+
+    return _field(3, 2, layer)
+
+
+def build_tile_postgis(z, x, y):
+    """Build a tile with ST_AsMVT on the PostGIS geometry column."""
+    columns = ", ".join(
+        f'"{column}" AS {name}' for name, column in TILE_PROPERTIES.items()
+    )
+    query = f"""
+    WITH mvtgeom AS (
+        SELECT
+            ST_AsMVTGeom(
+                ST_Transform(geom, 3857), ST_TileEnvelope(%s, %s, %s), %s, %s, true
+            ) AS geom,
+            "Restaurantid" AS id,
+            {columns}
+        FROM restaurants
+        WHERE geom && ST_Transform(ST_TileEnvelope(%s, %s, %s, margin => %s), 4326)
+    )
+    SELECT ST_AsMVT(mvtgeom.*, %s, %s, 'geom', 'id')
+    FROM mvtgeom
+    WHERE geom IS NOT NULL
+    """
+
+    params = (
+        z,
+        x,
+        y,
+        TILE_EXTENT,
+        TILE_BUFFER,
+        z,
+        x,
+        y,
+        TILE_BUFFER / TILE_EXTENT,
+        TILE_LAYER_NAME,
+        TILE_EXTENT,
+    )
+    row = execute_query(
+        query, params, fetch_all=False, dict_cursor=False, read_only=True
+    )
+
+    return bytes(row[0]) if row and row[0] is not None else b""
+
+
+def build_tile_python(z, x, y):
+    """Build a tile by reading the rows in its bounding box and encoding them."""
+    margin = TILE_BUFFER / TILE_EXTENT
+    min_lng = max(-180.0, _tile_to_lng(x - margin, z))
+    max_lng = min(180.0, _tile_to_lng(x + 1 + margin, z))
+    max_lat = _tile_to_lat(max(0.0, y - margin), z)
+    min_lat = _tile_to_lat(min(2**z, y + 1 + margin), z)
+
+    columns = ", ".join(f'"{column}"' for column in TILE_PROPERTIES.values())
+    query = f"""
+    SELECT "Restaurantid", "Latitude", "Longitude", {columns}
+    FROM restaurants
+    WHERE "Latitude" BETWEEN %s AND %s
+    AND "Longitude" BETWEEN %s AND %s
+    """
+
+    rows = execute_query(query, (min_lat, max_lat, min_lng, max_lng), read_only=True)
+
+    features = []
+    for row in rows:
+        tile_x, tile_y = _lng_lat_to_tile_units(
+            float(row["Longitude"]), float(row["Latitude"]), z, x, y
+        )
+        if not (
+            -TILE_BUFFER <= tile_x <= TILE_EXTENT + TILE_BUFFER
+            and -TILE_BUFFER <= tile_y <= TILE_EXTENT + TILE_BUFFER
+        ):
+            continue
+
+        properties = {name: row[column] for name, column in TILE_PROPERTIES.items()}
+        features.append((row["Restaurantid"], tile_x, tile_y, properties))
+
+    return encode_mvt(TILE_LAYER_NAME, features)
+
+
+def _disk_path(version, encoder, z, x, y):
+    """Location of a tile in the disk cache."""
+    return os.path.join(TILE_CACHE_DIR, version, encoder, str(z), str(x), f"{y}.mvt")
+
+
+def _purge_old_versions(version):
+    """Remove disk cache directories of previous data versions."""
+    if not TILE_CACHE_DIR or not os.path.isdir(TILE_CACHE_DIR):
+        return
+
+    for name in os.listdir(TILE_CACHE_DIR):
+        if name != version:
+            shutil.rmtree(os.path.join(TILE_CACHE_DIR, name), ignore_errors=True)
+
+
+def get_tile(z, x, y, encoder, version):
+    """
+    Get a tile from the memory cache, the disk cache, or by building it.
+
+    Args:
+        z (int): Zoom level
+        x (int): Tile column
+        y (int): Tile row
+        encoder (str): 'postgis' or 'python'
+        version (str): Current data version
+
+    Returns:
+        tuple: (tile bytes, cache status 'memory', 'disk' or 'miss')
+    """
+    global _cache_version
+
+    key = (encoder, z, x, y)
+    with _lock:
+        if _cache_version != version:
+            # The data was reloaded, every cached tile is stale
+            _memory_cache.clear()
+            _tile_changes.clear()
+            _cache_version = version
+            purge = True
+        else:
+            purge = False
+
+        if key in _memory_cache:
+            _memory_cache.move_to_end(key)
+            return _memory_cache[key], "memory"
+
+        # A tile changed while it was built is served but not cached
+        changed_at = (_tile_changes.get((z, x, y)), _tile_generation)
+
+    if purge:
+        _purge_old_versions(version)
+
+    tile = None
+    status = "miss"
+    path = _disk_path(version, encoder, z, x, y) if TILE_CACHE_DIR else None
+
+    if path and os.path.exists(path):
+        with open(path, "rb") as f:
+            tile = f.read()
+        status = "disk"
+
+    if tile is None:
+        if encoder == "postgis":
+            tile = build_tile_postgis(z, x, y)
+        else:
+            tile = build_tile_python(z, x, y)
+
+        with _lock:
+            unchanged = changed_at == (_tile_changes.get((z, x, y)), _tile_generation)
+
+        if path and unchanged:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+            with open(tmp_path, "wb") as f:
+                f.write(tile)
+            os.replace(tmp_path, path)
+
+    with _lock:
+        unchanged = changed_at == (_tile_changes.get((z, x, y)), _tile_generation)
+        if _cache_version == version and unchanged:
+            _memory_cache[key] = tile
+            _memory_cache.move_to_end(key)
+            while len(_memory_cache) > TILE_CACHE_SIZE:
+                _memory_cache.popitem(last=False)
+
+    return tile, status
@@ -0,0 +1,211 @@
+import os
+import h3
+import psycopg2.errors
+from app.utils.db_utils import execute_query, get_select_list, haversine_distance
+from app.utils.partition_utils import get_partition_filter
+from app.utils.h3_utils import AGGREGATE_RESOLUTIONS
+
+# From this zoom level on, the viewport returns individual restaurants
+VIEWPORT_CLUSTER_MAX_ZOOM = int(os.environ.get("VIEWPORT_CLUSTER_MAX_ZOOM", 14))
+
+# Maximum number of individual restaurants returned for one viewport
+VIEWPORT_MAX_RESTAURANTS = int(os.environ.get("VIEWPORT_MAX_RESTAURANTS", 2000))
+
+# Approximate number of clusters across the width of one 256px map tile
+VIEWPORT_CLUSTERS_PER_TILE = 8
+
+# Width of a zoom 0 map tile at the equator, in kilometers
+EARTH_CIRCUMFERENCE_KM = 40075.016686
+
+
+def parse_bbox(value):
+    """
+    Parse a bbox argument of the form min_lng,min_lat,max_lng,max_lat.
+
+    A min_lng greater than max_lng describes a viewport crossing the
+    antimeridian.
+
+    Returns:
+        tuple: (min_lng, min_lat, max_lng, max_lat)
+
+    Raises:
+        ValueError: If the bbox is malformed or out of range
+    """
+    parts = [float(part) for part in value.split(",")]
+    if len(parts) != 4:
+        raise ValueError("bbox must be min_lng,min_lat,max_lng,max_lat")
+
+    min_lng, min_lat, max_lng, max_lat = parts
+    if not (-90 <= min_lat <= max_lat <= 90):
+        raise ValueError("bbox latitudes must satisfy -90 <= min_lat <= max_lat <= 90")
+    if not (-180 <= min_lng <= 180 and -180 <= max_lng <= 180):
+        raise ValueError("bbox longitudes must be between -180 and 180")
+
+    return min_lng, min_lat, max_lng, max_lat
+
+
+def get_resolution_for_zoom(zoom):
+    """
+    Pick the H3 resolution whose cells are about as large as a cluster at a
+    map zoom level.
+
+    Args:
+        zoom (int): Web map zoom level
+
+    Returns:
+        int: H3 resolution within AGGREGATE_RESOLUTIONS
+    """
+    cluster_km = EARTH_CIRCUMFERENCE_KM / (2**zoom) / VIEWPORT_CLUSTERS_PER_TILE
+
+    # Finest resolution whose hexagons are still at least a cluster wide
+    for resolution in reversed(AGGREGATE_RESOLUTIONS):
+        if 2 * h3.edge_length(resolution, unit="km") >= cluster_km:
+            return resolution
+
+    return AGGREGATE_RESOLUTIONS[0]
+
+
+def _longitude_condition(column, min_lng, max_lng):
+    """Build the longitude filter of a bbox, which may cross the antimeridian."""
+    if min_lng <= max_lng:
+        return f"{column} BETWEEN %s AND %s", [min_lng, max_lng]
+
+    return f"({column} >= %s OR {column} <= %s)", [min_lng, max_lng]
+
+
+def _bbox_partition_filter(bbox):
+    """Get the partition filter of the circle enclosing a bbox."""
+    min_lng, min_lat, max_lng, max_lat = bbox
+    if min_lng > max_lng:
+        # Circles across the antimeridian are never pruned anyway
+        return "", []
+
+    center_lat = (min_lat + max_lat) / 2
+    center_lng = (min_lng + max_lng) / 2
+    radius_km = max(
+        haversine_distance(center_lat, center_lng, corner_lat, corner_lng)
+        for corner_lat in (min_lat, max_lat)
+        for corner_lng in (min_lng, max_lng)
+    )
+
+    return get_partition_filter(center_lat, center_lng, radius_km)
+
+
+def get_viewport_restaurants(bbox, limit=VIEWPORT_MAX_RESTAURANTS):
+    """
+    Get the individual restaurants inside a viewport.
+
+    Args:
+        bbox (tuple): (min_lng, min_lat, max_lng, max_lat)
+        limit (int): Maximum number of restaurants returned
+
+    Returns:
+        tuple: (restaurants, truncated)
+    """
+    min_lng, min_lat, max_lng, max_lat = bbox
+    lng_condition, lng_params = _longitude_condition('"Longitude"', min_lng, max_lng)
+    partition_filter, partition_params = _bbox_partition_filter(bbox)
+
+    query = f"""
+    SELECT {get_select_list("restaurants")}
+    FROM restaurants
+    WHERE "Latitude" BETWEEN %s AND %s
+    AND {lng_condition}
+    {partition_filter}
+    ORDER BY "Restaurantid"
+    LIMIT %s
+    """
+
+    # Fetch one extra row to tell whether the viewport was truncated
+    restaurants = execute_query(
+        query,
+        [min_lat, max_lat] + lng_params + partition_params + [limit + 1],
+        read_only=True,
+    )
+
+    return restaurants[:limit], len(restaurants) > limit
+
+
+def _get_h3_clusters(bbox, resolution):
+    """Read the precomputed H3 clusters whose centroid lies in a viewport."""
+    min_lng, min_lat, max_lng, max_lat = bbox
+    lng_condition, lng_params = _longitude_condition("centroid_lng", min_lng, max_lng)
+
+    query = f"""
+    SELECT h3_cell AS cell, restaurant_count AS count,
+        centroid_lat AS lat, centroid_lng AS lng, top_cuisine
+    FROM restaurant_cell_aggregates
+    WHERE resolution = %s
+    AND centroid_lat BETWEEN %s AND %s
+    AND {lng_condition}
+    """
+
+    return execute_query(
+        query, [resolution, min_lat, max_lat] + lng_params, read_only=True
+    )
+
+
+def _get_grid_clusters(bbox, resolution):
+    """
+    Cluster the restaurants of a viewport on a latitude/longitude grid.
+
+    Used when the H3 aggregates have not been built, with grid cells about as
+    large as the H3 cells of the same resolution.
+    """
+    min_lng, min_lat, max_lng, max_lat = bbox
+    lng_condition, lng_params = _longitude_condition('"Longitude"', min_lng, max_lng)
+    cell_degrees = 2 * h3.edge_length(resolution, unit="km") / 111.0
+
+    # Cuisine lists are split like the H3 aggregates split them, so a
+    # restaurant counts once for each of its cuisines
+    query = f"""
+    WITH cells AS (
+        SELECT 'grid:' || floor("Latitude" / %s) || ':' || floor("Longitude" / %s) AS cell,
+            "Latitude", "Longitude", "Cuisine"
+        FROM restaurants
+        WHERE "Latitude" BETWEEN %s AND %s
+        AND {lng_condition}
+    ),
+    cuisines AS (
+        SELECT cell, mode() WITHIN GROUP (ORDER BY btrim(cuisine)) AS top_cuisine
+        FROM cells
+        CROSS JOIN LATERAL unnest(string_to_array("Cuisine", ',')) AS cuisine
+        WHERE btrim(cuisine) <> ''
+        GROUP BY cell
+    )
+    SELECT cells.cell,
+        COUNT(*) AS count,
+        AVG("Latitude")::float AS lat,
+        AVG("Longitude")::float AS lng,
+        cuisines.top_cuisine
+    FROM cells
+    LEFT JOIN cuisines ON cuisines.cell = cells.cell
+    GROUP BY cells.cell, cuisines.top_cuisine
+    """
+
+    return execute_query(
+        query,
+        [cell_degrees, cell_degrees, min_lat, max_lat] + lng_params,
+        read_only=True,
+    )
+
+
+def get_viewport_clusters(bbox, zoom):
+    """
+    Get restaurant clusters for a zoomed-out viewport.
+
+    Args:
+        bbox (tuple): (min_lng, min_lat, max_lng, max_lat)
+        zoom (int): Web map zoom level
+
+    Returns:
+        tuple: (clusters, resolution, source) where source is 'h3_aggregates'
+            or 'grid'
+    """
+    resolution = get_resolution_for_zoom(zoom)
+
+    try:
+        return _get_h3_clusters(bbox, resolution), resolution, "h3_aggregates"
+    except psycopg2.errors.UndefinedTable:
+        # Deployments without H3 never build the aggregate table
+        return _get_grid_clusters(bbox, resolution), resolution, "grid"
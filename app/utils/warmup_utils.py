@@ -0,0 +1,338 @@
+import os
+import json
+import time
+import random
+import threading
+from collections import Counter
+from app.utils.db_utils import get_db_connection
+
+# Warm the database and the in-process caches before reporting ready
+WARMUP_ENABLED = os.environ.get("WARMUP_ENABLED", "true").lower() in (
+    "true",
+    "1",
+    "yes",
+)
+
+# Nearby searches are sampled into this JSON lines file, shared by all
+# workers, and the hottest ones are replayed by the next warm-up. Empty
+# disables the log.
+QUERY_LOG_PATH = os.environ.get("QUERY_LOG_PATH", "/app/data/query_log.jsonl")
+
+# Share of nearby searches written to the query log
+QUERY_LOG_SAMPLE_RATE = float(os.environ.get("QUERY_LOG_SAMPLE_RATE", 0.01))
+
+# The log is rotated to QUERY_LOG_PATH + '.1' beyond this size
+QUERY_LOG_MAX_BYTES = int(os.environ.get("QUERY_LOG_MAX_BYTES", 10 * 1024 * 1024))
+
+# Distinct searches replayed by the warm-up, most frequent first, out of the
+# most recent log lines
+WARMUP_REPLAY_QUERIES = int(os.environ.get("WARMUP_REPLAY_QUERIES", 200))
+WARMUP_LOG_LINES = 10000
+
+_lock = threading.Lock()
+_status = {
+    "ready": not WARMUP_ENABLED,
+    "started_at": None,
+    "finished_at": None,
+    "steps": {},
+}
+
+
+def log_search(method, lat, lng, radius_km, approximate=False):
+    """Sample a nearby search into the query log."""
+    if not QUERY_LOG_PATH or random.random() >= QUERY_LOG_SAMPLE_RATE:
+        return
+
+    line = json.dumps(
+        {
+            "method": method,
+            "lat": lat,
+            "lng": lng,
+            "radius_km": radius_km,
+            "approximate": approximate,
+        }
+    )
+    try:
+        if (
+            os.path.exists(QUERY_LOG_PATH)
+            and os.path.getsize(QUERY_LOG_PATH) > QUERY_LOG_MAX_BYTES
+        ):
+            os.replace(QUERY_LOG_PATH, QUERY_LOG_PATH + ".1")
+        # Single appended lines don't interleave between workers
+        with open(QUERY_LOG_PATH, "a") as f:
+            f.write(line + "\n")
+    except OSError as e:
+        print(f"Could not write the query log: {e}")
+
+
+def load_hot_queries(limit=WARMUP_REPLAY_QUERIES):
+    """
+    Read the most frequent recent searches from the query log.
+
+    Returns:
+        list: (method, lat, lng, radius_km, approximate) tuples, most
+            frequent first
+    """
+    lines = []
+    for path in (QUERY_LOG_PATH + ".1", QUERY_LOG_PATH):
+        if QUERY_LOG_PATH and os.path.exists(path):
+            with open(path) as f:
+                lines.extend(f.readlines()[-WARMUP_LOG_LINES:])
+
+    counts = Counter()
+    for line in lines[-WARMUP_LOG_LINES:]:
+        try:
+            entry = json.loads(line)
+            counts[
+                (
+                    entry["method"],
+                    entry["lat"],
+                    entry["lng"],
+                    entry["radius_km"],
+                    entry.get("approximate", False),
+                )
+            ] += 1
+        except (ValueError, KeyError):
+            continue
+
+    return [query for query, _ in counts.most_common(limit)]
+
+
+def _warmup_methods(method):
+    """List the backends whose data the active method reads."""
+    if method == "auto":
+        from app.utils.auto_utils import AUTO_CANDIDATE_METHODS
+
+        return AUTO_CANDIDATE_METHODS
+    return [method]
+
+
+def prewarm_relations(methods):
+    """
+    Load the restaurant table and the indexes of the given methods into
+    shared buffers.
+
+    The primary is prewarmed with pg_prewarm where the extension can be
+    created; otherwise the table is read with a sequential scan and the
+    indexes are left to the replayed queries. With read replicas, the table
+    is also scanned on one of them, as the extension can't be created on a
+    standby.
+
+    Returns:
+        dict: Relations prewarmed, with the blocks read, how, and the
+            replica scanned
+    """
+    from app.utils.build_benchmark_utils import METHOD_INDEXES
+
+    relations = ["restaurants"]
+    for method in methods:
+        relations += [
+            f"idx_restaurants_{suffix}" for suffix, _ in METHOD_INDEXES.get(method, [])
+        ]
+
+    conn = get_db_connection()
+    conn.autocommit = True
+    cursor = conn.cursor()
+
+    try:
+        # Partitions hold the rows of a partitioned table and its indexes
+        partitions_query = """
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = ANY(%s)
+        """
+        cursor.execute(partitions_query, (relations,))
+        relations += [row[0] for row in cursor.fetchall()]
+
+        try:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_prewarm")
+        except Exception as e:
+            print(f"pg_prewarm unavailable, scanning the table instead: {e}")
+            cursor.execute("SELECT count(*) FROM restaurants")
+            return {
+                "mode": "scan",
+                "relations": {"restaurants": None},
+                "replica": _scan_replica(),
+            }
+
+        # Relations missing for this method or layout are skipped
+        prewarm_query = """
+        SELECT pg_prewarm(oid) FROM pg_class
+        WHERE oid = to_regclass(%s) AND relkind IN ('r', 'i', 'm')
+        """
+        blocks = {}
+        for relation in relations:
+            try:
+                cursor.execute(prewarm_query, (relation,))
+                row = cursor.fetchone()
+                if row:
+                    blocks[relation] = row[0]
+            except Exception as e:
+                print(f"Could not prewarm {relation}: {e}")
+
+        return {
+            "mode": "pg_prewarm",
+            "relations": blocks,
+            "replica": _scan_replica(),
+        }
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _scan_replica():
+    """
+    Read the restaurant table with a sequential scan on a read replica.
+
+    Returns:
+        str: Name of the replica scanned, or None if no replica was usable or
+            the scan failed
+    """
+    from app.utils.replica_utils import has_replicas
+
+    if not has_replicas():
+        return None
+
+    try:
+        conn = get_db_connection(read_only=True)
+    except Exception as e:
+        print(f"Could not scan a replica: {e}")
+        return None
+
+    replica_name = getattr(conn, "replica_name", None)
+    cursor = conn.cursor()
+
+    try:
+        # Reads fall back to the primary, which is already warm
+        if replica_name is not None:
+            cursor.execute("SELECT count(*) FROM restaurants")
+            conn.rollback()
+        return replica_name
+    except Exception as e:
+        print(f"Could not scan replica {replica_name}: {e}")
+        return None
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def populate_caches(methods):
+    """Load the in-process data the active methods would load on first use."""
+    from app.utils.partition_utils import get_partition_filter
+    from app.utils.tile_utils import get_data_version
+
+    loaded = ["partition metadata", "data version"]
+    get_partition_filter(0.0, 0.0, 1.0)
+    get_data_version()
+
+    if "h3" in methods:
+        from app.utils.h3_utils import get_cell_counts
+
+        get_cell_counts()
+        loaded.append("h3 cell counts")
+
+    if "snapshot" in methods:
+        from app.utils.snapshot_utils import get_snapshot
+
+        get_snapshot()
+        loaded.append("snapshot")
+
+    return loaded
+
+
+def replay_hot_queries(queries):
+    """
+    Run logged searches again, warming the index pages they touch and the
+    H3 plan cache. They don't feed the latency estimates, whose cold
+    measurements would be misleading.
+
+    Returns:
+        dict: Searches replayed and failed
+    """
+    from app.utils.search_utils import VALID_METHODS, get_search_function
+
+    replayed = failed = 0
+    for method, lat, lng, radius_km, approximate in queries:
+        if method not in VALID_METHODS:
+            continue
+        try:
+            get_search_function(method, approximate=approximate)(lat, lng, radius_km)
+            replayed += 1
+        except Exception as e:
+            print(f"Warm-up search with {method} failed: {e}")
+            failed += 1
+
+    return {"replayed": replayed, "failed": failed}
+
+
+def _run_step(name, func, *args):
+    """Run one warm-up step, recording its duration and outcome."""
+    start_time = time.time()
+    try:
+        result = func(*args)
+        error = None
+    except Exception as e:
+        print(f"Warm-up step '{name}' failed: {e}")
+        result, error = None, str(e)
+
+    with _lock:
+        _status["steps"][name] = {
+            "seconds": time.time() - start_time,
+            "result": result,
+            "error": error,
+        }
+
+
+def run_warmup(method):
+    """
+    Warm up this worker for the given default indexing method.
+
+    Prewarms the table and indexes, loads the in-process caches and replays
+    the hottest logged searches. Failed steps are logged and skipped; the
+    worker is ready once all steps ran.
+    """
+    with _lock:
+        _status["started_at"] = time.time()
+
+    methods = _warmup_methods(method)
+    if "snapshot" not in methods:
+        _run_step("prewarm", prewarm_relations, methods)
+    _run_step("caches", populate_caches, methods)
+    hot_queries = load_hot_queries()
+    _run_step("replay", replay_hot_queries, hot_queries)
+
+    with _lock:
+        _status["ready"] = True
+        _status["finished_at"] = time.time()
+        seconds = _status["finished_at"] - _status["started_at"]
+    print(f"Warm-up finished in {seconds:.2f}s, replayed {len(hot_queries)} searches")
+
+
+def start_warmup(method):
+    """Warm up in a background thread, so liveness is reported meanwhile."""
+    if not WARMUP_ENABLED:
+        return
+
+    thread = threading.Thread(
+        target=run_warmup, args=(method,), name="warmup", daemon=True
+    )
+    thread.start()
+
+
+def is_ready():
+    """Check whether this worker finished warming up."""
+    with _lock:
+        return _status["ready"]
+
+
+def get_warmup_status():
+    """Report the warm-up state and the duration of each step."""
+    with _lock:
+        status = dict(_status)
+        status["steps"] = {
+            name: {"seconds": step["seconds"], "error": step["error"]}
+            for name, step in _status["steps"].items()
+        }
+    return status
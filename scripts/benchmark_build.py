@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+import sys
+import json
+from app.utils.build_benchmark_utils import (
+    BUILD_BENCHMARK_SIZES,
+    METHOD_INDEXES,
+    benchmark_index_builds,
+)
+
+
+def print_build_report(report):
+    """Print the build benchmark as one table, a row per size and method."""
+    header = (
+        f"{'rows':>9} {'method':<8} {'load s':>8} {'derive s':>8} {'index s':>8} "
+        f"{'table MB':>9} {'index MB':>9} {'insert ms':>10} {'update ms':>10} "
+        f"{'WAL/update':>10}"
+    )
+    print(header)
+    print("-" * len(header))
+    for result in report:
+        print(
+            f"{result['rows']:>9} {result['method']:<8} "
+            f"{result['load_seconds']:>8.2f} "
+            f"{result['derived_columns_seconds']:>8.2f} "
+            f"{result['index_build_seconds']:>8.2f} "
+            f"{result['table_bytes'] / 1024 ** 2:>9.1f} "
+            f"{result['index_bytes'] / 1024 ** 2:>9.1f} "
+            f"{result['insert_ms']['avg']:>10.2f} "
+            f"{result['update_ms']['avg']:>10.2f} "
+            f"{result['update_wal_bytes']:>10.0f}"
+        )
+
+
+if __name__ == "__main__":
+    # Dataset sizes can be given as a comma separated argument, and the JSON
+    # report written to a file given as second argument
+    sizes = (
+        [int(size) for size in sys.argv[1].split(",")]
+        if len(sys.argv) > 1
+        else BUILD_BENCHMARK_SIZES
+    )
+
+    report = benchmark_index_builds(tuple(METHOD_INDEXES), sizes)
+    if not report:
+        sys.exit(1)
+
+    print_build_report(report)
+
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Full report written to {sys.argv[2]}")
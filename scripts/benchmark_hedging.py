@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+import sys
+import time
+from app.utils import hedge_utils
+from app.utils.search_utils import get_search_function
+
+
+def measure_reads(search, num_reads, lat, lng, radius_km):
+    """Run the same search repeatedly and return its latencies in ms."""
+    latencies = []
+    for _ in range(num_reads):
+        start_time = time.time()
+        search(lat, lng, radius_km)
+        latencies.append((time.time() - start_time) * 1000)
+    return sorted(latencies)
+
+
+def percentile(latencies, share):
+    return latencies[int(share * (len(latencies) - 1))]
+
+
+if __name__ == "__main__":
+    # Compare the tail latency of a nearby search without and with hedged
+    # reads. Run it against a primary and a replica, for example with
+    # docker-compose.replicas.yml, while one of them is busy.
+    num_reads = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    method = sys.argv[2] if len(sys.argv) > 2 else "btree"
+    lat, lng, radius_km = 40.7128, -74.0060, 2.0
+
+    search = get_search_function(method)
+    for hedged in (False, True):
+        hedge_utils.DB_HEDGE_READS = hedged
+        latencies = measure_reads(search, num_reads, lat, lng, radius_km)
+        print(
+            f"{'hedged' if hedged else 'plain':<7} "
+            f"p50 {percentile(latencies, 0.5):8.2f} ms  "
+            f"p95 {percentile(latencies, 0.95):8.2f} ms  "
+            f"p99 {percentile(latencies, 0.99):8.2f} ms  "
+            f"max {latencies[-1]:8.2f} ms"
+        )
+
+    stats = hedge_utils.get_hedge_stats()
+    print(
+        f"{stats['hedged']} of {stats['reads']} reads hedged "
+        f"({stats['hedge_rate']:.1%}), hedge won {stats['win_rate']:.1%}, "
+        f"budget exhausted {stats['budget_exhausted']} times"
+    )
@@ -0,0 +1,6 @@
+#!/usr/bin/env python3
+from app.utils.snapshot_utils import SNAPSHOT_PATH, write_snapshot
+
+if __name__ == "__main__":
+    # Workers pick up the new file on their next check, no restart needed
+    write_snapshot(SNAPSHOT_PATH)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+import os
+import sys
+from app.utils.cluster_utils import (
+    CLUSTER_METHODS,
+    cluster_restaurants_table,
+    get_sample_points,
+    measure_heap_blocks,
+)
+
+
+def print_block_report(label, report):
+    """Print a short summary of a block measurement."""
+    print(
+        f"{label}: {len(report['queries'])} queries, "
+        f"{report['total_heap_blocks']} heap blocks, "
+        f"{report['total_shared_hit_blocks']} shared hits, "
+        f"{report['total_shared_read_blocks']} shared reads"
+    )
+
+
+def cluster_restaurants(method, create_brin=False, radius_km=5.0):
+    """Rewrite the restaurants table in spatial order and report block usage."""
+    print(f"Clustering restaurants table using '{method}' ordering...")
+
+    sample_points = get_sample_points()
+    if not sample_points:
+        print("Error: No restaurants found. Aborting clustering.")
+        return
+
+    before = measure_heap_blocks(sample_points, radius_km)
+    print_block_report("Before clustering", before)
+
+    if not cluster_restaurants_table(method, create_brin):
+        return
+
+    after = measure_heap_blocks(sample_points, radius_km)
+    print_block_report("After clustering", after)
+
+    for before_query, after_query in zip(before["queries"], after["queries"]):
+        center = before_query["center"]
+        print(
+            f"  ({center['lat']:.5f}, {center['lng']:.5f}): "
+            f"heap blocks {before_query['heap_blocks']} -> {after_query['heap_blocks']}, "
+            f"shared blocks "
+            f"{before_query['shared_hit_blocks'] + before_query['shared_read_blocks']} -> "
+            f"{after_query['shared_hit_blocks'] + after_query['shared_read_blocks']}"
+        )
+
+
+if __name__ == "__main__":
+    # Method can be given as the first argument or through CLUSTER_METHOD
+    method = sys.argv[1] if len(sys.argv) > 1 else os.environ.get("CLUSTER_METHOD")
+    method = method or "morton"
+
+    if method not in CLUSTER_METHODS:
+        print(f"Usage: cluster_restaurants.py [{'|'.join(CLUSTER_METHODS)}]")
+        sys.exit(1)
+
+    create_brin = os.environ.get("CLUSTER_CREATE_BRIN", "false").lower() in (
+        "true",
+        "1",
+        "yes",
+    )
+    radius_km = float(os.environ.get("CLUSTER_BENCHMARK_RADIUS_KM", 5.0))
+
+    cluster_restaurants(method, create_brin, radius_km)
@@ -2,6 +2,7 @@
 import os
 import csv
 from app.utils.db_utils import get_db_connection
+from app.utils.changefeed_utils import install_change_feed
 
 
 def get_csv_column_names(file_path):
@@ -16,6 +17,94 @@ def get_csv_column_names(file_path):
         return []
 
 
+def restaurant_column_definitions(restaurant_columns):
+    """Build the SQL column definitions for the restaurants table."""
+    # Determine the primary key column for restaurants
+    restaurant_pk = restaurant_columns[0]  # Assuming first column is the primary key
+
+    restaurant_columns_sql = []
+    for col in restaurant_columns:
+        # Quote the column name to preserve case
+        quoted_col = f'"{col}"'
+        if col == restaurant_pk:
+            restaurant_columns_sql.append(f"{quoted_col} INTEGER PRIMARY KEY")
+        elif col in ["Latitude", "Longitude"]:
+            # Increased precision and scale to handle larger values
+            restaurant_columns_sql.append(f"{quoted_col} DECIMAL(15, 10)")
+        elif col == "Franchise":
+            restaurant_columns_sql.append(f"{quoted_col} BOOLEAN")
+        else:
+            restaurant_columns_sql.append(
+                f"{quoted_col} TEXT"
+            )  # Using TEXT for all string columns
+
+    return restaurant_columns_sql
+
+
+def user_column_definitions(user_columns):
+    """Build the SQL column definitions for the users table."""
+    # Determine the primary key column for users
+    user_pk = user_columns[0]  # Assuming first column is the primary key
+
+    user_columns_sql = []
+    for col in user_columns:
+        # Quote the column name to preserve case
+        quoted_col = f'"{col}"'
+        if col == user_pk:
+            user_columns_sql.append(f"{quoted_col} VARCHAR(50) PRIMARY KEY")
+        elif col in ["Latitude", "Longitude"]:
+            # Increased precision and scale
+            user_columns_sql.append(f"{quoted_col} DECIMAL(15, 10)")
+        elif col == "Smoker":
+            user_columns_sql.append(f"{quoted_col} BOOLEAN")
+        elif col in ["Weight", "BirthYear"]:
+            user_columns_sql.append(f"{quoted_col} INTEGER")
+        elif col == "Height":
+            user_columns_sql.append(f"{quoted_col} FLOAT")
+        elif col in ["CuisinePreferences", "PaymentMethods"]:
+            # Use TEXT for potentially long string fields
+            user_columns_sql.append(f"{quoted_col} TEXT")
+        else:
+            user_columns_sql.append(
+                f"{quoted_col} TEXT"
+            )  # Using TEXT for all other string columns
+
+    return user_columns_sql
+
+
+def find_rating_reference_columns(rating_columns):
+    """Find the restaurant and user reference columns of the ratings CSV."""
+    restaurant_ref_col = None
+    user_ref_col = None
+    for col in rating_columns:
+        if "place" in col.lower() or "restaurant" in col.lower():
+            restaurant_ref_col = col
+        elif "user" in col.lower():
+            user_ref_col = col
+
+    return restaurant_ref_col, user_ref_col
+
+
+def rating_column_definitions(rating_columns, restaurant_ref_col, user_ref_col):
+    """Build the SQL column definitions for the ratings table."""
+    rating_columns_sql = ['"id" SERIAL PRIMARY KEY']
+    for col in rating_columns:
+        # Quote the column name to preserve case
+        quoted_col = f'"{col}"'
+        if col == restaurant_ref_col:
+            rating_columns_sql.append(f"{quoted_col} INTEGER")
+        elif col == user_ref_col:
+            rating_columns_sql.append(f"{quoted_col} VARCHAR(50)")
+        elif "rating" in col.lower():
+            rating_columns_sql.append(f"{quoted_col} INTEGER")
+        else:
+            rating_columns_sql.append(
+                f"{quoted_col} TEXT"
+            )  # Text for any other columns
+
+    return rating_columns_sql
+
+
 def init_basic_db():
     """Initialize the database with basic setup based on CSV column names."""
     print("Initializing database with basic setup...")
@@ -49,103 +138,33 @@ def init_basic_db():
         cursor.execute("DROP TABLE IF EXISTS users;")
         cursor.execute("DROP TABLE IF EXISTS restaurants;")
 
-        # Determine the primary key column for restaurants
-        restaurant_pk = restaurant_columns[
-            0
-        ]  # Assuming first column is the primary key
-
         # Create restaurants table with properly quoted column names
-        restaurant_columns_sql = []
-        for col in restaurant_columns:
-            # Quote the column name to preserve case
-            quoted_col = f'"{col}"'
-            if col == restaurant_pk:
-                restaurant_columns_sql.append(f"{quoted_col} INTEGER PRIMARY KEY")
-            elif col in ["Latitude", "Longitude"]:
-                # Increased precision and scale to handle larger values
-                restaurant_columns_sql.append(f"{quoted_col} DECIMAL(15, 10)")
-            elif col == "Franchise":
-                restaurant_columns_sql.append(f"{quoted_col} BOOLEAN")
-            else:
-                restaurant_columns_sql.append(
-                    f"{quoted_col} TEXT"
-                )  # Using TEXT for all string columns
-
         restaurants_sql = f"""
         CREATE TABLE restaurants (
-            {", ".join(restaurant_columns_sql)}
+            {", ".join(restaurant_column_definitions(restaurant_columns))}
         );
         """
         cursor.execute(restaurants_sql)
 
-        # Determine the primary key column for users
-        user_pk = user_columns[0]  # Assuming first column is the primary key
-
         # Create users table with properly quoted column names
-        user_columns_sql = []
-        for col in user_columns:
-            # Quote the column name to preserve case
-            quoted_col = f'"{col}"'
-            if col == user_pk:
-                user_columns_sql.append(f"{quoted_col} VARCHAR(50) PRIMARY KEY")
-            elif col in ["Latitude", "Longitude"]:
-                # Increased precision and scale
-                user_columns_sql.append(f"{quoted_col} DECIMAL(15, 10)")
-            elif col == "Smoker":
-                user_columns_sql.append(f"{quoted_col} BOOLEAN")
-            elif col in ["Weight", "BirthYear"]:
-                user_columns_sql.append(f"{quoted_col} INTEGER")
-            elif col == "Height":
-                user_columns_sql.append(f"{quoted_col} FLOAT")
-            elif col in ["CuisinePreferences", "PaymentMethods"]:
-                # Use TEXT for potentially long string fields
-                user_columns_sql.append(f"{quoted_col} TEXT")
-            else:
-                user_columns_sql.append(
-                    f"{quoted_col} TEXT"
-                )  # Using TEXT for all other string columns
-
         users_sql = f"""
         CREATE TABLE users (
-            {", ".join(user_columns_sql)}
+            {", ".join(user_column_definitions(user_columns))}
         );
         """
         cursor.execute(users_sql)
 
         # Create ratings table - MODIFIED: without foreign key constraints initially
-        # Find rating columns
-        restaurant_ref_col = None
-        user_ref_col = None
-        for col in rating_columns:
-            if "place" in col.lower() or "restaurant" in col.lower():
-                restaurant_ref_col = col
-            elif "user" in col.lower():
-                user_ref_col = col
+        restaurant_ref_col, user_ref_col = find_rating_reference_columns(rating_columns)
 
         if not restaurant_ref_col or not user_ref_col:
             print("Error: Could not identify foreign key columns in ratings table")
             return
 
-        # Create ratings table without foreign key constraints initially
-        rating_columns_sql = ['"id" SERIAL PRIMARY KEY']
-        for col in rating_columns:
-            # Quote the column name to preserve case
-            quoted_col = f'"{col}"'
-            if col == restaurant_ref_col:
-                rating_columns_sql.append(f"{quoted_col} INTEGER")
-            elif col == user_ref_col:
-                rating_columns_sql.append(f"{quoted_col} VARCHAR(50)")
-            elif "rating" in col.lower():
-                rating_columns_sql.append(f"{quoted_col} INTEGER")
-            else:
-                rating_columns_sql.append(
-                    f"{quoted_col} TEXT"
-                )  # Text for any other columns
-
         # Don't add foreign key constraints yet
         ratings_sql = f"""
         CREATE TABLE ratings (
-            {", ".join(rating_columns_sql)}
+            {", ".join(rating_column_definitions(rating_columns, restaurant_ref_col, user_ref_col))}
         );
         """
         cursor.execute(ratings_sql)
@@ -169,7 +188,95 @@ def init_basic_db():
         conn.close()
 
 
-def import_restaurants(conn, restaurant_columns, restaurants_csv_path):
+def convert_restaurant_row(row, restaurant_columns):
+    """Convert a restaurant CSV row into values matching the table schema."""
+    values = []
+    for col in restaurant_columns:
+        if col == "Franchise":
+            # Convert to boolean
+            franchise = row.get(col, "").lower() in (
+                "true",
+                "t",
+                "yes",
+                "y",
+                "1",
+            )
+            values.append(franchise)
+        elif col in ["Latitude", "Longitude"]:
+            # Convert to float
+            try:
+                values.append(float(row.get(col, 0) or 0))
+            except (ValueError, TypeError):
+                values.append(0.0)  # Default to 0 if conversion fails
+        elif col == restaurant_columns[0]:  # Primary key column
+            # Ensure it's an integer
+            try:
+                values.append(int(row.get(col, 0) or 0))
+            except (ValueError, TypeError):
+                values.append(0)  # Default to 0 if conversion fails
+        else:
+            values.append(row.get(col, ""))
+
+    return values
+
+
+def convert_user_row(row, user_columns):
+    """Convert a user CSV row into values matching the table schema."""
+    values = []
+    for col in user_columns:
+        if col == "Smoker":
+            # Convert to boolean
+            smoker = row.get(col, "").lower() in (
+                "true",
+                "t",
+                "yes",
+                "y",
+                "1",
+            )
+            values.append(smoker)
+        elif col in ["Latitude", "Longitude"]:
+            # Convert to float
+            try:
+                values.append(float(row.get(col, 0) or 0))
+            except (ValueError, TypeError):
+                values.append(0.0)  # Default to 0 if conversion fails
+        elif col in ["Weight", "BirthYear"]:
+            # Convert to integer
+            try:
+                values.append(int(row.get(col, 0) or 0))
+            except (ValueError, TypeError):
+                values.append(0)  # Default to 0 if conversion fails
+        elif col == "Height":
+            # Convert to float
+            try:
+                values.append(float(row.get(col, 0) or 0))
+            except (ValueError, TypeError):
+                values.append(0.0)  # Default to 0 if conversion fails
+        else:
+            values.append(row.get(col, ""))
+
+    return values
+
+
+def convert_rating_row(row, rating_columns):
+    """Convert a rating CSV row into values matching the table schema."""
+    values = []
+    for col in rating_columns:
+        if "rating" in col.lower() or "place" in col.lower():
+            # Convert to integer
+            try:
+                values.append(int(row.get(col, 0) or 0))
+            except (ValueError, TypeError):
+                values.append(0)  # Default to 0 if conversion fails
+        else:
+            values.append(row.get(col, ""))
+
+    return values
+
+
+def import_restaurants(
+    conn, restaurant_columns, restaurants_csv_path, table_name="restaurants"
+):
     """Import restaurant data with proper error handling and transaction management."""
     cursor = conn.cursor()
     try:
@@ -181,37 +288,11 @@ def import_restaurants(conn, restaurant_columns, restaurants_csv_path):
                 placeholders = ", ".join(["%s"] * len(restaurant_columns))
                 # Quote column names
                 columns = ", ".join([f'"{col}"' for col in restaurant_columns])
-                values = []
-
-                for col in restaurant_columns:
-                    if col == "Franchise":
-                        # Convert to boolean
-                        franchise = row.get(col, "").lower() in (
-                            "true",
-                            "t",
-                            "yes",
-                            "y",
-                            "1",
-                        )
-                        values.append(franchise)
-                    elif col in ["Latitude", "Longitude"]:
-                        # Convert to float
-                        try:
-                            values.append(float(row.get(col, 0) or 0))
-                        except (ValueError, TypeError):
-                            values.append(0.0)  # Default to 0 if conversion fails
-                    elif col == restaurant_columns[0]:  # Primary key column
-                        # Ensure it's an integer
-                        try:
-                            values.append(int(row.get(col, 0) or 0))
-                        except (ValueError, TypeError):
-                            values.append(0)  # Default to 0 if conversion fails
-                    else:
-                        values.append(row.get(col, ""))
+                values = convert_restaurant_row(row, restaurant_columns)
 
                 # Insert the data
                 cursor.execute(
-                    f"INSERT INTO restaurants ({columns}) VALUES ({placeholders})",
+                    f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})",
                     values,
                 )
 
@@ -224,7 +305,7 @@ def import_restaurants(conn, restaurant_columns, restaurants_csv_path):
         cursor.close()
 
 
-def import_users(conn, user_columns, users_csv_path):
+def import_users(conn, user_columns, users_csv_path, table_name="users"):
     """Import user data with proper error handling and transaction management."""
     cursor = conn.cursor()
     try:
@@ -236,43 +317,12 @@ def import_users(conn, user_columns, users_csv_path):
                 placeholders = ", ".join(["%s"] * len(user_columns))
                 # Quote column names
                 columns = ", ".join([f'"{col}"' for col in user_columns])
-                values = []
-
-                for col in user_columns:
-                    if col == "Smoker":
-                        # Convert to boolean
-                        smoker = row.get(col, "").lower() in (
-                            "true",
-                            "t",
-                            "yes",
-                            "y",
-                            "1",
-                        )
-                        values.append(smoker)
-                    elif col in ["Latitude", "Longitude"]:
-                        # Convert to float
-                        try:
-                            values.append(float(row.get(col, 0) or 0))
-                        except (ValueError, TypeError):
-                            values.append(0.0)  # Default to 0 if conversion fails
-                    elif col in ["Weight", "BirthYear"]:
-                        # Convert to integer
-                        try:
-                            values.append(int(row.get(col, 0) or 0))
-                        except (ValueError, TypeError):
-                            values.append(0)  # Default to 0 if conversion fails
-                    elif col == "Height":
-                        # Convert to float
-                        try:
-                            values.append(float(row.get(col, 0) or 0))
-                        except (ValueError, TypeError):
-                            values.append(0.0)  # Default to 0 if conversion fails
-                    else:
-                        values.append(row.get(col, ""))
+                values = convert_user_row(row, user_columns)
 
                 # Insert the data
                 cursor.execute(
-                    f"INSERT INTO users ({columns}) VALUES ({placeholders})", values
+                    f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})",
+                    values,
                 )
 
         conn.commit()
@@ -284,7 +334,9 @@ def import_users(conn, user_columns, users_csv_path):
         cursor.close()
 
 
-def import_ratings_no_validation(conn, rating_columns, ratings_csv_path):
+def import_ratings_no_validation(
+    conn, rating_columns, ratings_csv_path, table_name="ratings"
+):
     """Import rating data without foreign key validation."""
     cursor = conn.cursor()
     try:
@@ -301,21 +353,11 @@ def import_ratings_no_validation(conn, rating_columns, ratings_csv_path):
                     placeholders = ", ".join(["%s"] * len(rating_columns))
                     # Quote column names
                     columns = ", ".join([f'"{col}"' for col in rating_columns])
-                    values = []
-
-                    for col in rating_columns:
-                        if "rating" in col.lower() or "place" in col.lower():
-                            # Convert to integer
-                            try:
-                                values.append(int(row.get(col, 0) or 0))
-                            except (ValueError, TypeError):
-                                values.append(0)  # Default to 0 if conversion fails
-                        else:
-                            values.append(row.get(col, ""))
+                    values = convert_rating_row(row, rating_columns)
 
                     # Insert the data without validation
                     cursor.execute(
-                        f"INSERT INTO ratings ({columns}) VALUES ({placeholders})",
+                        f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})",
                         values,
                     )
                     success_count += 1
@@ -390,3 +432,4 @@ def import_data(
 
 if __name__ == "__main__":
     init_basic_db()
+    install_change_feed()
@@ -1,11 +1,12 @@
 #!/usr/bin/env python3
 import os
 from app.utils.db_utils import get_db_connection
-from scripts.init_basic import init_basic_db, get_csv_column_names
+from scripts.init_basic import get_csv_column_names
+from scripts.init_incremental import init_incremental_db
 
 
 def initialize_btree_indexes():
-    """Create B-tree indexes on geographic columns for restaurants."""
+    """Create B-tree indexes on geographic columns for restaurants and users."""
     print("Creating B-tree indexes...")
 
     # Get CSV column names to determine actual column names
@@ -70,6 +71,22 @@ def initialize_btree_indexes():
             ON restaurants USING btree ("{price_col}");
             ''')
 
+        # Bounding box indexes for nearby user searches
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_users_latitude 
+        ON users USING btree ("Latitude");
+        ''')
+
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_users_longitude 
+        ON users USING btree ("Longitude");
+        ''')
+
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_users_lat_lng 
+        ON users USING btree ("Latitude", "Longitude");
+        ''')
+
         conn.commit()
         print("B-tree indexes created successfully")
     except Exception as e:
@@ -82,8 +99,8 @@ def initialize_btree_indexes():
 
 def init_btree_db():
     """Initialize database with B-tree indexes."""
-    # First initialize with basic setup
-    init_basic_db()
+    # First load any CSV changes without dropping the tables
+    init_incremental_db()
 
     # Then create B-tree indexes
     initialize_btree_indexes()
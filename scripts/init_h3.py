@@ -1,14 +1,14 @@
 #!/usr/bin/env python3
 import os
 from app.utils.db_utils import get_db_connection
-from scripts.init_basic import init_basic_db
+from scripts.init_incremental import init_incremental_db
 from app.utils.h3_utils import initialize_h3_indexes
 
 
 def init_h3_db():
     """Initialize database with H3 indexes."""
-    # First initialize with basic setup
-    init_basic_db()
+    # First load any CSV changes without dropping the tables
+    init_incremental_db()
 
     # Then create H3 indexes
     initialize_h3_indexes()
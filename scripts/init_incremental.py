@@ -0,0 +1,502 @@
+#!/usr/bin/env python3
+import os
+import csv
+import time
+import hashlib
+from psycopg2.extras import execute_values
+from app.utils.db_utils import DERIVED_COLUMNS, SPATIAL_TABLES, get_db_connection
+from app.utils.partition_utils import (
+    fill_partition_cells,
+    partition_like_restaurants,
+    refresh_partition_metadata,
+    refresh_partitions,
+)
+from app.utils.changefeed_utils import install_change_feed
+from app.utils.hours_utils import initialize_opening_hours, populate_opening_hours
+from app.utils.postgis_utils import populate_geometry_column
+from app.utils.h3_utils import populate_h3_columns
+from scripts.init_basic import (
+    get_csv_column_names,
+    restaurant_column_definitions,
+    user_column_definitions,
+    find_rating_reference_columns,
+    rating_column_definitions,
+    convert_restaurant_row,
+    convert_user_row,
+    convert_rating_row,
+)
+
+# CSV file backing each table
+CSV_PATHS = {
+    "restaurants": "/app/data/Restaurants.csv",
+    "users": "/app/data/Users.csv",
+    "ratings": "/app/data/Ratings.csv",
+}
+
+
+def file_checksum(file_path):
+    """Compute the SHA-256 checksum of a file."""
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def get_table_spec(table_name):
+    """
+    Describe how a table is built from its CSV file.
+
+    Args:
+        table_name (str): One of 'restaurants', 'users' or 'ratings'
+
+    Returns:
+        dict: CSV path, columns, column definitions, key columns and row
+            converter, or None if the CSV headers cannot be read
+    """
+    csv_path = CSV_PATHS[table_name]
+    columns = get_csv_column_names(csv_path)
+    if not columns:
+        return None
+
+    if table_name == "restaurants":
+        definitions = restaurant_column_definitions(columns)
+        key_columns = [columns[0]]
+        convert = convert_restaurant_row
+    elif table_name == "users":
+        definitions = user_column_definitions(columns)
+        key_columns = [columns[0]]
+        convert = convert_user_row
+    else:
+        restaurant_ref_col, user_ref_col = find_rating_reference_columns(columns)
+        if not restaurant_ref_col or not user_ref_col:
+            print("Error: Could not identify foreign key columns in ratings table")
+            return None
+        definitions = rating_column_definitions(
+            columns, restaurant_ref_col, user_ref_col
+        )
+        # Ratings have a surrogate id, so rows are matched on user and place
+        key_columns = [user_ref_col, restaurant_ref_col]
+        convert = convert_rating_row
+
+    return {
+        "table_name": table_name,
+        "csv_path": csv_path,
+        "columns": columns,
+        "definitions": definitions,
+        "key_columns": key_columns,
+        "convert": convert,
+    }
+
+
+def read_csv_rows(spec):
+    """Read and convert every CSV row of a table spec."""
+    with open(spec["csv_path"], "r", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        return [tuple(spec["convert"](row, spec["columns"])) for row in reader]
+
+
+def ensure_load_state_table(cursor):
+    """Create the table that remembers which CSV version each table holds."""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS data_load_state (
+        table_name TEXT PRIMARY KEY,
+        file_path TEXT,
+        file_size BIGINT,
+        file_mtime DOUBLE PRECISION,
+        file_sha256 TEXT,
+        columns TEXT,
+        loaded_at TIMESTAMPTZ DEFAULT now()
+    );
+    """)
+
+
+def save_load_state(cursor, spec, file_stat, checksum):
+    """Record the CSV version that was loaded into a table."""
+    cursor.execute(
+        """
+    INSERT INTO data_load_state
+        (table_name, file_path, file_size, file_mtime, file_sha256, columns, loaded_at)
+    VALUES (%s, %s, %s, %s, %s, %s, now())
+    ON CONFLICT (table_name) DO UPDATE SET
+        file_path = EXCLUDED.file_path,
+        file_size = EXCLUDED.file_size,
+        file_mtime = EXCLUDED.file_mtime,
+        file_sha256 = EXCLUDED.file_sha256,
+        columns = EXCLUDED.columns,
+        loaded_at = EXCLUDED.loaded_at
+    """,
+        (
+            spec["table_name"],
+            spec["csv_path"],
+            file_stat.st_size,
+            file_stat.st_mtime,
+            checksum,
+            ",".join(spec["columns"]),
+        ),
+    )
+
+
+def copy_table_layout(cursor, spec, shadow_name):
+    """
+    Give a loaded shadow table the derived columns, partitioning and
+    secondary indexes of the table it replaces, so every indexing method
+    keeps working once it is swapped in.
+
+    Args:
+        cursor: Database cursor, committed by the caller
+        spec (dict): Table spec from get_table_spec
+        shadow_name (str): Shadow table holding the CSV rows
+
+    Returns:
+        tuple: (shadow index name, final index name) pairs to rename after
+            the swap, and whether the shadow table was partitioned
+    """
+    table_name = spec["table_name"]
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (table_name,))
+    if not cursor.fetchone()[0]:
+        return [], False
+
+    cursor.execute(
+        """
+    SELECT column_name FROM information_schema.columns
+    WHERE table_name = %s AND column_name = ANY(%s)
+    """,
+        (table_name, DERIVED_COLUMNS),
+    )
+    derived_columns = {row[0] for row in cursor.fetchall()}
+
+    if "geom" in derived_columns:
+        populate_geometry_column(cursor, shadow_name)
+    if "h3_index_res8" in derived_columns:
+        populate_h3_columns(cursor, shadow_name, SPATIAL_TABLES[table_name])
+    if "opening_hours" in derived_columns:
+        populate_opening_hours(cursor, shadow_name)
+    if "h3_partition_cell" in derived_columns:
+        cursor.execute(f"ALTER TABLE {shadow_name} ADD COLUMN h3_partition_cell TEXT;")
+        fill_partition_cells(cursor, shadow_name)
+    if "spatial_sort_key" in derived_columns:
+        # The clustering order isn't recorded, so keys are kept for rows that
+        # didn't move; the others stay NULL as after an upsert
+        key_match = " AND ".join(
+            f's."{col}" = t."{col}"'
+            for col in spec["key_columns"] + ["Latitude", "Longitude"]
+        )
+        cursor.execute(f"""
+        ALTER TABLE {shadow_name} ADD COLUMN spatial_sort_key BIGINT;
+        UPDATE {shadow_name} s SET spatial_sort_key = t.spatial_sort_key
+        FROM {table_name} t WHERE {key_match};
+        """)
+
+    partitioned = table_name == "restaurants" and partition_like_restaurants(
+        cursor, shadow_name
+    )
+
+    # Indexes backing constraints come with the column definitions
+    cursor.execute(
+        """
+    SELECT c.relname, i.indisunique, pg_get_indexdef(i.indexrelid)
+    FROM pg_index i
+    JOIN pg_class c ON c.oid = i.indexrelid
+    WHERE i.indrelid = to_regclass(%s)
+    AND NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conindid = i.indexrelid)
+    """,
+        (table_name,),
+    )
+    renames = []
+    for index_name, unique, definition in cursor.fetchall():
+        shadow_index = f"{index_name}_shadow"
+        unique_sql = "UNIQUE" if unique else ""
+        using = definition.split(" USING ", 1)[1]
+
+        # An index on a column the new CSV dropped is left out
+        cursor.execute("SAVEPOINT copy_index;")
+        try:
+            cursor.execute(f"""
+            CREATE {unique_sql} INDEX {shadow_index} ON {shadow_name} USING {using};
+            """)
+            cursor.execute("RELEASE SAVEPOINT copy_index;")
+            renames.append((shadow_index, index_name))
+        except Exception as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT copy_index;")
+            print(f"Index {index_name} not copied to the new {table_name}: {e}")
+
+    cursor.execute(f"ANALYZE {shadow_name};")
+    return renames, partitioned
+
+
+def rebuild_table_with_shadow(conn, spec, rows):
+    """
+    Load a table into a shadow copy and swap it in with a rename.
+
+    Readers keep using the current table while the shadow copy is loaded and
+    given the current table's derived columns, partitions and indexes; the
+    swap itself only holds an exclusive lock for the duration of the renames.
+    """
+    table_name = spec["table_name"]
+    shadow_name = f"{table_name}_shadow"
+    old_name = f"{table_name}_old"
+    columns = ", ".join([f'"{col}"' for col in spec["columns"]])
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"DROP TABLE IF EXISTS {shadow_name};")
+        cursor.execute(f"""
+        CREATE TABLE {shadow_name} (
+            {", ".join(spec["definitions"])}
+        );
+        """)
+        execute_values(
+            cursor,
+            f"INSERT INTO {shadow_name} ({columns}) VALUES %s",
+            rows,
+            page_size=1000,
+        )
+        index_renames, partitioned = copy_table_layout(cursor, spec, shadow_name)
+        conn.commit()
+
+        # Don't queue readers behind the swap for long if the table is busy
+        cursor.execute("SET LOCAL lock_timeout = '5s';")
+        cursor.execute(f"DROP TABLE IF EXISTS {old_name};")
+        cursor.execute(f"ALTER TABLE IF EXISTS {table_name} RENAME TO {old_name};")
+        cursor.execute(f"ALTER TABLE {shadow_name} RENAME TO {table_name};")
+        cursor.execute(f"DROP TABLE IF EXISTS {old_name};")
+
+        for shadow_index, index_name in index_renames:
+            cursor.execute(f'ALTER INDEX "{shadow_index}" RENAME TO "{index_name}";')
+
+        # Constraint indexes, sequences and the default partition keep their
+        # shadow names after the rename, which would collide with the next
+        # shadow build
+        cursor.execute(
+            """
+        SELECT c.relname, c.relkind
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = current_schema() AND c.relname LIKE %s
+        """,
+            (shadow_name.replace("_", "\\_") + "\\_%",),
+        )
+        for relname, relkind in cursor.fetchall():
+            new_relname = table_name + relname[len(shadow_name) :]
+            if relkind == "i":
+                cursor.execute(f'ALTER INDEX "{relname}" RENAME TO "{new_relname}";')
+            elif relkind == "S":
+                cursor.execute(f'ALTER SEQUENCE "{relname}" RENAME TO "{new_relname}";')
+            elif relkind == "r":
+                cursor.execute(f'ALTER TABLE "{relname}" RENAME TO "{new_relname}";')
+
+        if partitioned:
+            refresh_partition_metadata(cursor)
+
+        conn.commit()
+        return {"inserted": len(rows), "updated": 0, "deleted": 0}
+    except Exception as e:
+        conn.rollback()
+        raise e
+    finally:
+        cursor.close()
+
+
+def upsert_changed_rows(conn, spec, rows):
+    """
+    Apply the difference between the CSV rows and the table in one transaction.
+
+    Rows are staged in a temporary table and compared column by column, so only
+    inserted, changed and deleted rows are written. Derived columns of changed
+    rows are reset to NULL so the index initialization recomputes them.
+    """
+    table_name = spec["table_name"]
+    staging_name = f"{table_name}_staging"
+    columns = spec["columns"]
+    key_columns = spec["key_columns"]
+    value_columns = [col for col in columns if col not in key_columns]
+
+    columns_sql = ", ".join([f'"{col}"' for col in columns])
+    key_match = " AND ".join([f't."{col}" = s."{col}"' for col in key_columns])
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""
+        CREATE TEMP TABLE {staging_name} ON COMMIT DROP AS
+        SELECT {columns_sql} FROM {table_name} WITH NO DATA;
+        """)
+        execute_values(
+            cursor,
+            f"INSERT INTO {staging_name} ({columns_sql}) VALUES %s",
+            rows,
+            page_size=1000,
+        )
+
+        cursor.execute(f"""
+        DELETE FROM {table_name} t
+        WHERE NOT EXISTS (SELECT 1 FROM {staging_name} s WHERE {key_match});
+        """)
+        deleted = cursor.rowcount
+
+        updated = 0
+        if value_columns:
+            cursor.execute(
+                """
+            SELECT column_name FROM information_schema.columns
+            WHERE table_name = %s AND column_name = ANY(%s)
+            """,
+                (table_name, DERIVED_COLUMNS),
+            )
+            derived_columns = [row[0] for row in cursor.fetchall()]
+
+            assignments = [f'"{col}" = s."{col}"' for col in value_columns]
+            assignments += [f'"{col}" = NULL' for col in derived_columns]
+
+            cursor.execute(f"""
+            UPDATE {table_name} t
+            SET {", ".join(assignments)}
+            FROM {staging_name} s
+            WHERE {key_match}
+            AND ROW({", ".join([f't."{col}"' for col in value_columns])})
+                IS DISTINCT FROM ROW({", ".join([f's."{col}"' for col in value_columns])});
+            """)
+            updated = cursor.rowcount
+
+        cursor.execute(f"""
+        INSERT INTO {table_name} ({columns_sql})
+        SELECT {", ".join([f's."{col}"' for col in columns])}
+        FROM {staging_name} s
+        WHERE NOT EXISTS (SELECT 1 FROM {table_name} t WHERE {key_match});
+        """)
+        inserted = cursor.rowcount
+
+        conn.commit()
+        return {"inserted": inserted, "updated": updated, "deleted": deleted}
+    except Exception as e:
+        conn.rollback()
+        raise e
+    finally:
+        cursor.close()
+
+
+def sync_table(table_name, force=False):
+    """
+    Bring a table in line with its CSV file, doing as little work as possible.
+
+    The file size and modification time are checked first, then the checksum.
+    Unchanged files are skipped, changed files are applied as row-level
+    upserts, and a new or reshaped CSV is loaded through a shadow table swap.
+
+    Args:
+        table_name (str): One of 'restaurants', 'users' or 'ratings'
+        force (bool): Rebuild the table even if the CSV is unchanged
+
+    Returns:
+        dict: Action taken, row counts and elapsed time
+    """
+    start_time = time.time()
+    spec = get_table_spec(table_name)
+    if spec is None:
+        print(f"Error: Could not read CSV headers for {table_name}.")
+        return {"table": table_name, "action": "error"}
+
+    file_stat = os.stat(spec["csv_path"])
+    columns_key = ",".join(spec["columns"])
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        ensure_load_state_table(cursor)
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (table_name,))
+        table_exists = cursor.fetchone()[0]
+
+        cursor.execute(
+            """
+        SELECT file_size, file_mtime, file_sha256, columns
+        FROM data_load_state WHERE table_name = %s
+        """,
+            (table_name,),
+        )
+        state = cursor.fetchone()
+        conn.commit()
+
+        checksum = None
+        if not force and table_exists and state and state[3] == columns_key:
+            if state[0] == file_stat.st_size and state[1] == file_stat.st_mtime:
+                return {
+                    "table": table_name,
+                    "action": "unchanged",
+                    "seconds": time.time() - start_time,
+                }
+
+            checksum = file_checksum(spec["csv_path"])
+            if checksum == state[2]:
+                # Only the timestamp changed, remember it to skip hashing next time
+                save_load_state(cursor, spec, file_stat, checksum)
+                conn.commit()
+                return {
+                    "table": table_name,
+                    "action": "unchanged",
+                    "seconds": time.time() - start_time,
+                }
+
+        checksum = checksum or file_checksum(spec["csv_path"])
+        rows = read_csv_rows(spec)
+
+        if force or not table_exists or not state or state[3] != columns_key:
+            action = "rebuilt"
+            counts = rebuild_table_with_shadow(conn, spec, rows)
+        else:
+            action = "upserted"
+            counts = upsert_changed_rows(conn, spec, rows)
+
+        save_load_state(cursor, spec, file_stat, checksum)
+        conn.commit()
+
+        result = {"table": table_name, "action": action}
+        result.update(counts)
+        result["seconds"] = time.time() - start_time
+        return result
+    except Exception as e:
+        conn.rollback()
+        print(f"Error synchronizing {table_name}: {e}")
+        return {"table": table_name, "action": "error", "error": str(e)}
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def init_incremental_db(force=False):
+    """Load CSV changes into the database without dropping the tables."""
+    print("Synchronizing database with CSV files...")
+
+    results = []
+    for table_name in ["restaurants", "users", "ratings"]:
+        result = sync_table(table_name, force)
+        results.append(result)
+
+        if result["action"] in ("rebuilt", "upserted"):
+            print(
+                f"{table_name}: {result['action']} "
+                f"({result['inserted']} inserted, {result['updated']} updated, "
+                f"{result['deleted']} deleted) in {result['seconds']:.2f}s"
+            )
+        else:
+            print(f"{table_name}: {result['action']}")
+
+    # Parse the opening hours of new and changed restaurants
+    initialize_opening_hours()
+
+    # Move changed rows into their partitions if restaurants is partitioned
+    refresh_partitions()
+
+    # Rebuilt tables lost their change feed triggers
+    install_change_feed()
+
+    return results
+
+
+if __name__ == "__main__":
+    force_reload = os.environ.get("FORCE_RELOAD", "false").lower() in (
+        "true",
+        "1",
+        "yes",
+    )
+    init_incremental_db(force_reload)
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app.utils.db_utils import SPATIAL_TABLES, get_db_connection
+from app.utils.partition_utils import refresh_partitions
+from app.utils.postgis_utils import populate_geometry_column
+from app.utils.h3_utils import populate_h3_columns, refresh_cell_aggregates
+from app.utils.snapshot_utils import write_snapshot
+from app.utils.changefeed_utils import install_change_feed
+from app.utils.hours_utils import populate_opening_hours
+from app.utils.build_benchmark_utils import METHOD_INDEXES
+from scripts.init_incremental import ensure_load_state_table, sync_table
+
+# Sessions used to load tables and build indexes at the same time
+INIT_WORKERS = int(os.environ.get("INIT_WORKERS", 4))
+
+# Memory for each index build; the default 64MB spills large sorts to disk
+INIT_MAINTENANCE_WORK_MEM = os.environ.get("INIT_MAINTENANCE_WORK_MEM", "512MB")
+
+# Parallel workers Postgres may use inside a single B-tree build
+INIT_PARALLEL_MAINTENANCE_WORKERS = int(
+    os.environ.get("INIT_PARALLEL_MAINTENANCE_WORKERS", 2)
+)
+
+LOAD_TABLES = ["restaurants", "users", "ratings"]
+
+
+def get_index_definitions(cursor):
+    """
+    List the indexes of every indexing method on the spatial tables.
+
+    Returns:
+        list: (index name, table name, USING clause) tuples
+    """
+    indexes = [
+        (f"idx_{table_name}_{suffix}", table_name, using)
+        for table_name in SPATIAL_TABLES
+        for method in ("btree", "postgis", "h3")
+        for suffix, using in METHOD_INDEXES[method]
+    ]
+
+    # Filter columns of the restaurants CSV, if it has them
+    cursor.execute("""
+    SELECT column_name FROM information_schema.columns
+    WHERE table_name = 'restaurants'
+    """)
+    restaurant_columns = [row[0] for row in cursor.fetchall()]
+    for column in restaurant_columns:
+        if "cuisine" in column.lower():
+            indexes.append(
+                ("idx_restaurants_cuisine", "restaurants", f'btree ("{column}")')
+            )
+        elif "price" in column.lower():
+            indexes.append(
+                ("idx_restaurants_price", "restaurants", f'btree ("{column}")')
+            )
+
+    return indexes
+
+
+def _timed(timings, step, func, *args):
+    """Run one step and record how long it took."""
+    start_time = time.time()
+    try:
+        return func(*args)
+    finally:
+        timings.append((step, time.time() - start_time))
+
+
+def _set_maintenance_settings(cursor):
+    """Give index builds of this session more memory and parallel workers."""
+    cursor.execute("SET maintenance_work_mem = %s", (INIT_MAINTENANCE_WORK_MEM,))
+    cursor.execute(
+        "SET max_parallel_maintenance_workers = %s",
+        (INIT_PARALLEL_MAINTENANCE_WORKERS,),
+    )
+
+
+def _populate_derived_columns(table_name):
+    """Fill the derived columns of one table in its own session."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        populate_geometry_column(cursor, table_name)
+        filled = populate_h3_columns(cursor, table_name, SPATIAL_TABLES[table_name])
+        if table_name == "restaurants":
+            populate_opening_hours(cursor)
+        conn.commit()
+        return filled
+    except Exception as e:
+        conn.rollback()
+        raise e
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def _is_partitioned(cursor, table_name):
+    """Check whether a table is partitioned; those can't be built CONCURRENTLY."""
+    cursor.execute(
+        "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(%s)",
+        (table_name,),
+    )
+    row = cursor.fetchone()
+    return bool(row and row[0])
+
+
+def _build_indexes(indexes, concurrently):
+    """
+    Build indexes one after another in a dedicated session.
+
+    Returns:
+        list: (index name, seconds) of each index built
+    """
+    conn = get_db_connection()
+    conn.autocommit = True
+    cursor = conn.cursor()
+
+    try:
+        _set_maintenance_settings(cursor)
+        concurrently_sql = "CONCURRENTLY" if concurrently else ""
+        durations = []
+        for index_name, table_name, using in indexes:
+            start_time = time.time()
+            if concurrently:
+                # A failed concurrent build leaves an invalid index behind that
+                # IF NOT EXISTS would keep forever
+                cursor.execute(
+                    """
+                SELECT 1 FROM pg_index
+                WHERE indexrelid = to_regclass(%s) AND NOT indisvalid
+                """,
+                    (index_name,),
+                )
+                if cursor.fetchone():
+                    cursor.execute(f"DROP INDEX CONCURRENTLY {index_name};")
+
+            cursor.execute(f"""
+            CREATE INDEX {concurrently_sql} IF NOT EXISTS {index_name}
+            ON {table_name} USING {using};
+            """)
+            durations.append((index_name, time.time() - start_time))
+        return durations
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def build_indexes_in_parallel(new_tables, workers=INIT_WORKERS):
+    """
+    Build the indexes of all indexing methods in parallel sessions.
+
+    Tables rebuilt by this run have no indexes yet and get plain CREATE INDEX,
+    the fastest build, one session per index since plain builds on one table
+    don't block each other. Tables that already held data are indexed
+    CONCURRENTLY so writes keep working; concurrent builds on one table wait
+    for each other, so those run one session per table.
+
+    Args:
+        new_tables (set): Tables created by this run
+        workers (int): Sessions building indexes at the same time
+
+    Returns:
+        list: (index name, seconds) of each index built
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        indexes = get_index_definitions(cursor)
+        concurrent_tables = {
+            table_name
+            for table_name in SPATIAL_TABLES
+            if table_name not in new_tables and not _is_partitioned(cursor, table_name)
+        }
+    finally:
+        cursor.close()
+        conn.close()
+
+    batches = [
+        ([index], False) for index in indexes if index[1] not in concurrent_tables
+    ]
+    batches += [
+        ([index for index in indexes if index[1] == table_name], True)
+        for table_name in sorted(concurrent_tables)
+    ]
+
+    durations = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for result in pool.map(lambda batch: _build_indexes(*batch), batches):
+            durations += result
+
+    return durations
+
+
+def analyze_tables():
+    """Refresh planner statistics of the loaded and indexed tables."""
+    conn = get_db_connection()
+    conn.autocommit = True
+    cursor = conn.cursor()
+
+    try:
+        for table_name in LOAD_TABLES:
+            cursor.execute(f"ANALYZE {table_name};")
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def print_timings(timings, total_seconds):
+    """Print the time spent in each step and its share of the total."""
+    print("Initialization time by step:")
+    width = max(len(step) for step, _ in timings)
+    for step, seconds in timings:
+        share = seconds / total_seconds * 100 if total_seconds else 0
+        print(f"  {step.ljust(width)}  {seconds:8.2f}s  {share:5.1f}%")
+    print(f"  {'total'.ljust(width)}  {total_seconds:8.2f}s")
+
+
+def init_parallel_db(force=False, workers=INIT_WORKERS):
+    """
+    Initialize the database with every indexing method, in parallel.
+
+    Loads the three tables concurrently, fills the derived columns of each
+    spatial table in its own session, builds all indexes in parallel sessions
+    with a larger maintenance_work_mem, and runs ANALYZE at the end.
+
+    Args:
+        force (bool): Rebuild the tables even if the CSV files are unchanged
+        workers (int): Sessions used at the same time
+
+    Returns:
+        dict: Per-step and per-index timings, in seconds
+    """
+    start_time = time.time()
+    timings = []
+
+    # Shared objects are created once up front, so the parallel sessions
+    # don't race to create them
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        ensure_load_state_table(cursor)
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS postgis;")
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+    # Tables are independent, so each is synchronized in its own session
+    def load(table_name):
+        return _timed(timings, f"load {table_name}", sync_table, table_name, force)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        load_results = list(pool.map(load, LOAD_TABLES))
+
+    for result in load_results:
+        print(f"{result['table']}: {result['action']}")
+    new_tables = {
+        result["table"] for result in load_results if result["action"] == "rebuilt"
+    }
+
+    _timed(timings, "refresh partitions", refresh_partitions)
+
+    def populate(table_name):
+        return _timed(
+            timings,
+            f"derived columns {table_name}",
+            _populate_derived_columns,
+            table_name,
+        )
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(populate, SPATIAL_TABLES))
+
+    index_durations = _timed(
+        timings, "build indexes", build_indexes_in_parallel, new_tables, workers
+    )
+    _timed(timings, "analyze", analyze_tables)
+    _timed(timings, "h3 aggregates", refresh_cell_aggregates)
+    _timed(timings, "snapshot", write_snapshot)
+    _timed(timings, "change feed", install_change_feed)
+
+    total_seconds = time.time() - start_time
+    print_timings(timings, total_seconds)
+    print("Slowest indexes:")
+    for index_name, seconds in sorted(index_durations, key=lambda d: -d[1])[:5]:
+        print(f"  {index_name}: {seconds:.2f}s")
+
+    print("Parallel database initialization completed")
+    return {
+        "steps": dict(timings),
+        "indexes": dict(index_durations),
+        "total_seconds": total_seconds,
+    }
+
+
+if __name__ == "__main__":
+    force_reload = os.environ.get("FORCE_RELOAD", "false").lower() in (
+        "true",
+        "1",
+        "yes",
+    )
+    init_parallel_db(force_reload)
@@ -0,0 +1,14 @@
+#!/usr/bin/env python3
+import os
+import sys
+from app.utils.spatial_join_utils import JOIN_WORKERS, run_spatial_join
+
+if __name__ == "__main__":
+    # Workers and partitions can be given as arguments or through JOIN_WORKERS
+    # and JOIN_PARTITIONS
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else JOIN_WORKERS
+    partitions = sys.argv[2] if len(sys.argv) > 2 else os.environ.get("JOIN_PARTITIONS")
+    partitions = int(partitions) if partitions else workers * 4
+
+    if run_spatial_join(workers, partitions) is None:
+        sys.exit(1)
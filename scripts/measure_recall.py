@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+import sys
+import json
+from app.utils.recall_utils import measure_recall
+
+
+def print_recall_report(report):
+    """Print recall, precision and latency of every method as one table."""
+    print(
+        f"{report['queries']} queries against {report['reference_rows']} "
+        f"restaurants, radii {report['radii_km']} km"
+    )
+    header = (
+        f"{'method':<20} {'recall':>8} {'min':>8} {'precision':>9} {'missed':>7} "
+        f"{'boundary':>8} {'extra':>7} {'max extra km':>12} {'avg ms':>8} "
+        f"{'p95 ms':>8} {'errors':>6}"
+    )
+    print(header)
+    print("-" * len(header))
+    for name, summary in report["methods"].items():
+        if not summary["queries"]:
+            print(f"{name:<20} no successful queries, {summary['errors']} errors")
+            continue
+
+        print(
+            f"{name:<20} {summary['mean_recall']:>8.4f} {summary['min_recall']:>8.4f} "
+            f"{summary['mean_precision']:>9.4f} {summary['missed_rows']:>7} "
+            f"{summary['boundary_misses']:>8} {summary['extra_rows']:>7} "
+            f"{summary['max_extra_distance_km']:>12.3f} {summary['avg_ms']:>8.2f} "
+            f"{summary['p95_ms']:>8.2f} {summary['errors']:>6}"
+        )
+        if "speedup" in summary:
+            print(f"{'':<20} {summary['speedup']:.2f}x faster than the exact search")
+
+
+if __name__ == "__main__":
+    # Number of queries and methods can be given as arguments, and the JSON
+    # report written to a file given as third argument
+    num_queries = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    methods = sys.argv[2].split(",") if len(sys.argv) > 2 else None
+
+    report = measure_recall(methods, num_queries)
+    print_recall_report(report)
+
+    if len(sys.argv) > 3:
+        with open(sys.argv[3], "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Full report written to {sys.argv[3]}")
@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+import os
+import sys
+from app.utils.partition_utils import PARTITION_SCHEMES, partition_restaurants_table
+from app.utils.changefeed_utils import install_change_feed
+
+if __name__ == "__main__":
+    # Scheme can be given as the first argument or through PARTITION_SCHEME
+    scheme = sys.argv[1] if len(sys.argv) > 1 else os.environ.get("PARTITION_SCHEME")
+    scheme = scheme or "h3"
+
+    if scheme not in PARTITION_SCHEMES:
+        print(f"Usage: partition_restaurants.py [{'|'.join(PARTITION_SCHEMES)}]")
+        sys.exit(1)
+
+    partition_restaurants_table(scheme)
+
+    # The partitioned table replaces the old one and its triggers
+    install_change_feed()